@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class AnalyticsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'analytics'
+
+    def ready(self):
+        # Connect signal receivers
+        from . import recommendations, rollups  # noqa: F401
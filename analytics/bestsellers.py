@@ -0,0 +1,75 @@
+"""
+Bestseller sort keys on Product.
+
+``units_7d``, ``units_30d`` and ``revenue_30d`` hold the sales of the last
+7 and 30 local days (today included), so the shop sorts by popularity with
+a plain indexed ORDER BY on products instead of aggregating order items.
+
+Paying an order adds its lines to the keys of its products with one
+UPDATE, next to the daily rollups; a paid order being cancelled takes them
+off again. Sales only leave a window when ``refresh()`` recomputes the
+keys from DailyProductSales, which ``manage.py refresh_bestsellers`` does
+and should run once a day, after midnight. Rebuilding the rollups
+refreshes them too.
+"""
+import logging
+from datetime import timedelta
+
+from django.db.models import Case, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.utils import timezone
+from products.models import Product
+from .models import DailyProductSales
+
+logger = logging.getLogger(__name__)
+
+# Sort key -> days in its window
+WINDOWS = {'units_7d': 7, 'units_30d': 30, 'revenue_30d': 30}
+
+
+def add_sales(day, lines):
+    """
+    Add the ``lines`` of an order paid on ``day`` ({product id: {'units',
+    'revenue'}}, negative to take them off) to the sort keys of its products.
+    Called by analytics.rollups.add_order.
+    """
+    age = (timezone.localdate() - day).days
+    keys = [key for key, days in WINDOWS.items() if age < days]
+    if not keys or not lines:
+        return
+
+    def added(value, output_field):
+        return Case(
+            *[When(pk=product_id, then=Value(line[value])) for product_id, line in lines.items()],
+            default=Value(0), output_field=output_field,
+        )
+
+    units = added('units', IntegerField())
+    revenue = added('revenue', DecimalField(max_digits=14, decimal_places=2))
+    Product.objects.filter(pk__in=lines).update(**{
+        key: F(key) + (revenue if key == 'revenue_30d' else units) for key in keys
+    })
+
+
+def refresh():
+    """Recompute the sort keys of every product from the rollups; returns the number of products changed."""
+    today = timezone.localdate()
+    sales = {
+        row['product_id']: row
+        for row in DailyProductSales.objects.filter(date__gt=today - timedelta(days=max(WINDOWS.values())))
+        .values('product_id')
+        .annotate(
+            units_7d=Sum('units', filter=Q(date__gt=today - timedelta(days=WINDOWS['units_7d']))),
+            units_30d=Sum('units', filter=Q(date__gt=today - timedelta(days=WINDOWS['units_30d']))),
+            revenue_30d=Sum('revenue', filter=Q(date__gt=today - timedelta(days=WINDOWS['revenue_30d']))),
+        )
+        .order_by()
+    }
+    changed = []
+    for product_id, *current in Product.objects.values_list('pk', *WINDOWS).order_by():
+        row = sales.get(product_id, {})
+        keys = [row.get(key) or 0 for key in WINDOWS]
+        if keys != current:
+            changed.append(Product(pk=product_id, **dict(zip(WINDOWS, keys))))
+    Product.objects.bulk_update(changed, list(WINDOWS), batch_size=500)
+    logger.info('Refreshed bestseller sort keys of %s products', len(changed))
+    return len(changed)
@@ -0,0 +1,231 @@
+"""
+Customer cohorts, repeat purchases and lifetime value.
+
+``build()`` reads every paid order once, in keyset-paginated chunks of
+(email, paid_at, total), into NumPy arrays and does the grouping there:
+customers are numbered as their emails are first seen, local months come
+from one ``searchsorted`` against the month boundaries, and the per
+customer and per cohort figures are ``bincount``/``ufunc.at`` reductions.
+Nothing is grouped row by row in Python or in the ORM.
+
+A customer's cohort is the local month of their first paid order. The
+result is saved as a compressed .npz artifact in ANALYTICS_ARTIFACT_DIR;
+the admin page only loads the artifact, and ``build_cohorts`` (or the
+button on the page) recomputes it.
+"""
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from orders.models import Order
+from .rollups import PAID_STATUSES, customer_email
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT = 'cohorts.npz'
+CHUNK_SIZE = 20000
+
+# Orders per customer are counted up to this, the last bucket is "or more"
+FREQUENCY_BUCKETS = 10
+
+# Customers with the highest lifetime value kept in the artifact
+TOP_CUSTOMERS = 20
+
+
+def artifact_path():
+    path = Path(settings.ANALYTICS_ARTIFACT_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path / ARTIFACT
+
+
+def read_orders(chunk_size=CHUNK_SIZE):
+    """
+    Paid orders as arrays: (emails, customer, paid_at, cents).
+    ``customer`` indexes ``emails``; ``paid_at`` is in epoch seconds.
+    """
+    ids = {}
+    customers, paid_at, totals = [], [], []
+    paid = Order.objects.filter(status__in=PAID_STATUSES, paid_at__isnull=False).order_by('pk')
+    last_pk = 0
+    while True:
+        rows = list(paid.filter(pk__gt=last_pk).values_list('pk', 'customer_email', 'paid_at', 'total')[:chunk_size])
+        if not rows:
+            break
+        last_pk = rows[-1][0]
+        customers.append(np.fromiter(
+            (ids.setdefault(customer_email(row[1]), len(ids)) for row in rows), dtype=np.int64, count=len(rows),
+        ))
+        paid_at.append(np.fromiter((row[2].timestamp() for row in rows), dtype=np.float64, count=len(rows)))
+        totals.append(np.fromiter((row[3] for row in rows), dtype=np.float64, count=len(rows)))
+
+    if not customers:
+        return np.array([], dtype=str), np.array([], dtype=np.int64), np.array([]), np.array([], dtype=np.int64)
+    cents = np.rint(np.concatenate(totals) * 100).astype(np.int64)
+    return np.array(list(ids)), np.concatenate(customers), np.concatenate(paid_at), cents
+
+
+def month_starts(first, last):
+    """Epoch seconds and labels of the local months from the one of ``first`` to the one of ``last``."""
+    tz = timezone.get_default_timezone()
+    last = datetime.fromtimestamp(last, tz)
+    first = datetime.fromtimestamp(first, tz)
+    year, month = first.year, first.month
+    starts, labels = [], []
+    while (start := datetime(year, month, 1, tzinfo=tz)) <= last:
+        starts.append(start.timestamp())
+        labels.append(f'{year}-{month:02d}')
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return np.array(starts), labels
+
+
+def compute(emails, customer, paid_at, cents):
+    """The cohort arrays saved in the artifact, from the order arrays of ``read_orders``."""
+    n_customers = len(emails)
+    if not n_customers:
+        return {}
+    starts, months = month_starts(paid_at.min(), paid_at.max())
+    n_months = len(months)
+    month = np.searchsorted(starts, paid_at, side='right') - 1
+
+    # Customer dimension
+    first_paid = np.full(n_customers, np.inf)
+    np.minimum.at(first_paid, customer, paid_at)
+    last_paid = np.zeros(n_customers)
+    np.maximum.at(last_paid, customer, paid_at)
+    orders = np.bincount(customer, minlength=n_customers)
+    revenue = np.bincount(customer, weights=cents, minlength=n_customers).astype(np.int64)
+    cohort = np.searchsorted(starts, first_paid, side='right') - 1
+
+    # Cohort x months since the first order
+    order_cohort = cohort[customer]
+    cell = order_cohort * n_months + (month - order_cohort)
+    cohort_revenue = np.bincount(cell, weights=cents, minlength=n_months * n_months).reshape(n_months, n_months)
+    cohort_orders = np.bincount(cell, minlength=n_months * n_months).reshape(n_months, n_months)
+    # Active customers count each customer once per month
+    active_pairs = np.unique(customer * n_months + month)
+    active_customer = active_pairs // n_months
+    active_cell = cohort[active_customer] * n_months + (active_pairs % n_months - cohort[active_customer])
+    active = np.bincount(active_cell, minlength=n_months * n_months).reshape(n_months, n_months)
+
+    repeat = orders > 1
+    top = np.argsort(revenue)[::-1][:TOP_CUSTOMERS]
+    return {
+        'months': np.array(months),
+        'cohort_size': active[:, 0],
+        'active': active,
+        'cohort_orders': cohort_orders,
+        'cohort_revenue': cohort_revenue.astype(np.int64),
+        'frequency': np.bincount(np.minimum(orders, FREQUENCY_BUCKETS), minlength=FREQUENCY_BUCKETS + 1)[1:],
+        'days_between_orders': np.array(
+            ((last_paid[repeat] - first_paid[repeat]) / (orders[repeat] - 1)).mean() / 86400 if repeat.any() else 0.0
+        ),
+        'customers': np.array(n_customers),
+        'orders': np.array(len(customer)),
+        'revenue': np.array(int(cents.sum())),
+        'email': emails,
+        'customer_orders': orders,
+        'customer_revenue': revenue,
+        'first_paid': first_paid,
+        'last_paid': last_paid,
+        'top_email': emails[top],
+        'top_orders': orders[top],
+        'top_revenue': revenue[top],
+        'top_first_paid': first_paid[top],
+    }
+
+
+def build(chunk_size=CHUNK_SIZE):
+    """Recompute the cohorts from the orders and replace the artifact; returns the artifact path."""
+    started = time.monotonic()
+    arrays = compute(*read_orders(chunk_size))
+    arrays['built_at'] = np.array(timezone.now().isoformat())
+    arrays['seconds'] = np.array(time.monotonic() - started)
+
+    path = artifact_path()
+    # Written next to the artifact and renamed, so readers never see a partial file
+    handle, temporary = tempfile.mkstemp(dir=path.parent, suffix='.npz')
+    with os.fdopen(handle, 'wb') as output:
+        np.savez_compressed(output, **arrays)
+    os.replace(temporary, path)
+    logger.info(
+        'Built customer cohorts: %s orders, %s customers in %.1fs',
+        arrays.get('orders', 0), arrays.get('customers', 0), arrays['seconds'],
+    )
+    return path
+
+
+def load():
+    """
+    Cohort report from the artifact, or None before the first build.
+    Only the summary arrays are read; the customer dimension stays on disk
+    except for the top customers.
+    """
+    path = artifact_path()
+    if not path.exists():
+        return None
+    with np.load(path) as artifact:
+        report = {
+            'built_at': datetime.fromisoformat(str(artifact['built_at'])),
+            'seconds': float(artifact['seconds']),
+            'cohorts': [],
+        }
+        if 'months' not in artifact:
+            return report
+        months = artifact['months']
+        sizes = artifact['cohort_size']
+        active, cohort_revenue = artifact['active'], artifact['cohort_revenue']
+        customers = int(artifact['customers'])
+        frequency = artifact['frequency']
+        top_customers = [
+            {
+                'email': str(email),
+                'orders': int(count),
+                'revenue': int(cents) / 100,
+                'first_paid': datetime.fromtimestamp(first_paid, timezone.get_default_timezone()),
+            }
+            for email, count, cents, first_paid in zip(
+                artifact['top_email'], artifact['top_orders'], artifact['top_revenue'], artifact['top_first_paid'],
+            )
+        ]
+        orders = int(artifact['orders'])
+        total = int(artifact['revenue'])
+        days_between_orders = float(artifact['days_between_orders'])
+
+    ltv = np.cumsum(cohort_revenue, axis=1) / 100
+    for index, size in enumerate(sizes):
+        if not size:
+            continue
+        # Months since the first order that this cohort has lived through
+        ages = len(months) - index
+        report['cohorts'].append({
+            'month': str(months[index]),
+            'customers': int(size),
+            'retention': [round(float(value) / size * 100, 1) for value in active[index, :ages]],
+            'ltv': [round(float(value) / size, 2) for value in ltv[index, :ages]],
+        })
+    report.update({
+        'ages': list(range(len(months))),
+        'customers': customers,
+        'orders': orders,
+        'revenue': total / 100,
+        'lifetime_value': total / 100 / customers,
+        'orders_per_customer': orders / customers,
+        'repeat_rate': round((customers - int(frequency[0])) / customers * 100, 1),
+        'days_between_orders': round(days_between_orders, 1),
+        'frequency': [
+            {
+                'orders': f'{count}+' if count == FREQUENCY_BUCKETS else str(count),
+                'customers': int(customers_with),
+                'share': round(int(customers_with) / customers * 100, 1),
+            }
+            for count, customers_with in enumerate(frequency, start=1)
+        ],
+        'top_customers': top_customers,
+    })
+    return report
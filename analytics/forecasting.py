@@ -0,0 +1,200 @@
+"""
+Demand forecasts and reorder alerts.
+
+``run()`` loads the units sold per active product and day from the
+DailyProductSales rollups (one row per product and day with sales, so far
+fewer rows than the order items they add up) into a products x days
+array. It then fits simple exponential smoothing for every product at
+once, one vectorized step per day. The smoothed level is the forecast
+daily demand. Days of cover is the inventory over that demand. Products
+with less cover than REORDER_LEAD_DAYS are flagged for reorder, with a
+suggested quantity that lasts REORDER_TARGET_DAYS.
+
+Only complete days (up to yesterday) are used. The levels are saved in a
+.npz artifact in ANALYTICS_ARTIFACT_DIR, so the next run resumes from the
+day after the last one instead of refitting the whole history. Products
+flagged for the first time are emailed to ADMIN_EMAIL, and the admin page
+shows every flagged product against its current inventory.
+"""
+import logging
+import os
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.template.loader import render_to_string
+from django.utils import timezone
+from products.models import Product
+from zlato.perf import external
+from .models import DailyProductSales
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT = 'forecasts.npz'
+
+# Days of history fitted for a product the artifact does not cover yet
+HISTORY_DAYS = 90
+
+# Smoothing factor: weight of the latest day against the level so far
+ALPHA = 0.2
+
+
+def artifact_path():
+    path = Path(settings.ANALYTICS_ARTIFACT_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path / ARTIFACT
+
+
+def read_sales(product_ids, start, end):
+    """Units sold per product (rows, in the order of the sorted ``product_ids``) and day from ``start`` to ``end``."""
+    sales = np.zeros((len(product_ids), (end - start).days + 1))
+    rows = DailyProductSales.objects.filter(date__range=(start, end)).values_list('product_id', 'date', 'units')
+    chunk = []
+    for row in rows.iterator(chunk_size=5000):
+        chunk.append((row[0], row[1].toordinal(), row[2]))
+    if not chunk or not len(product_ids):
+        return sales
+    products, days, units = np.array(chunk, dtype=np.int64).T
+    index = np.minimum(np.searchsorted(product_ids, products), len(product_ids) - 1)
+    # Sales of inactive products are left out
+    known = product_ids[index] == products
+    np.add.at(sales, (index[known], days[known] - start.toordinal()), units[known])
+    return sales
+
+
+def smooth(sales, level, first_day):
+    """
+    Exponential smoothing of each row of ``sales``, starting from ``level``
+    at column ``first_day`` (per row); earlier columns are skipped.
+    """
+    level = level.copy()
+    for day in range(sales.shape[1]):
+        fitted = day >= first_day
+        level[fitted] = ALPHA * sales[fitted, day] + (1 - ALPHA) * level[fitted]
+    return level
+
+
+def _previous():
+    path = artifact_path()
+    if not path.exists():
+        return None
+    with np.load(path) as artifact:
+        return {name: artifact[name] for name in artifact.files}
+
+
+def cover(demand, inventory):
+    """Days the inventory lasts at the forecast demand; infinite without demand."""
+    return np.divide(inventory, demand, out=np.full(len(demand), np.inf), where=demand > 0.01)
+
+
+def run(full=False, notify=True, today=None):
+    """
+    Update the forecasts through the day before ``today`` (the local date
+    by default) and save the artifact. ``full`` refits the whole history
+    instead of resuming from the last run. Returns the ids of the products
+    newly flagged for reorder.
+    """
+    end = (today or timezone.localdate()) - timedelta(days=1)
+    window_start = end - timedelta(days=HISTORY_DAYS - 1)
+    products = np.array(
+        Product.objects.filter(is_active=True).order_by('pk').values_list('pk', 'inventory'), dtype=np.int64,
+    ).reshape(-1, 2)
+    product_ids, inventory = products[:, 0], products[:, 1]
+
+    level = np.zeros(len(product_ids))
+    first_day = np.zeros(len(product_ids), dtype=np.int64)
+    previous = None if full else _previous()
+    if (
+        previous is not None and len(previous['product_ids'])
+        and date.fromisoformat(str(previous['through'])) >= window_start
+    ):
+        through = date.fromisoformat(str(previous['through']))
+        index = np.minimum(np.searchsorted(previous['product_ids'], product_ids), len(previous['product_ids']) - 1)
+        known = previous['product_ids'][index] == product_ids
+        level[known] = previous['level'][index[known]]
+        # Known products resume the day after the last run
+        first_day[known] = (through - window_start).days + 1
+    else:
+        previous = None
+
+    start = window_start + timedelta(days=int(first_day.min()) if len(first_day) else HISTORY_DAYS)
+    if start <= end:
+        sales = read_sales(product_ids, start, end)
+        level = smooth(sales, level, first_day - (start - window_start).days)
+
+    days_of_cover = cover(level, inventory)
+    reorder = days_of_cover < settings.REORDER_LEAD_DAYS
+    flagged_before = previous['product_ids'][previous['reorder']] if previous is not None else np.array([])
+    new_alerts = product_ids[reorder & ~np.isin(product_ids, flagged_before)]
+
+    path = artifact_path()
+    handle, temporary = tempfile.mkstemp(dir=path.parent, suffix='.npz')
+    with os.fdopen(handle, 'wb') as output:
+        np.savez_compressed(
+            output,
+            product_ids=product_ids,
+            level=level,
+            reorder=reorder,
+            through=np.array(end.isoformat()),
+            built_at=np.array(timezone.now().isoformat()),
+        )
+    os.replace(temporary, path)
+    logger.info(
+        'Forecast demand of %s products through %s: %s to reorder, %s new',
+        len(product_ids), end, int(reorder.sum()), len(new_alerts),
+    )
+    if notify and len(new_alerts):
+        send_reorder_alert(alerts(new_alerts.tolist()))
+    return new_alerts.tolist()
+
+
+def alerts(product_ids=None):
+    """
+    Products flagged for reorder by the last run (or ``product_ids`` of
+    them), with their forecast against the current inventory, least cover
+    first. None before the first run.
+    """
+    forecasts = _previous()
+    if forecasts is None:
+        return None
+    flagged = forecasts['reorder']
+    if product_ids is not None:
+        flagged &= np.isin(forecasts['product_ids'], product_ids)
+    demand = dict(zip(forecasts['product_ids'][flagged].tolist(), forecasts['level'][flagged].tolist()))
+    rows = []
+    for product in Product.objects.filter(pk__in=demand).only('pk', 'name', 'slug', 'inventory'):
+        daily = demand[product.pk]
+        rows.append({
+            'product': product,
+            'demand': round(daily, 2),
+            'days_of_cover': round(product.inventory / daily, 1),
+            'quantity': max(int(np.ceil(daily * settings.REORDER_TARGET_DAYS)) - product.inventory, 0),
+        })
+    rows.sort(key=lambda row: row['days_of_cover'])
+    return {'through': date.fromisoformat(str(forecasts['through'])), 'products': rows}
+
+
+def send_reorder_alert(report):
+    """Email the products of ``report`` (from ``alerts()``) to ADMIN_EMAIL."""
+    try:
+        context = {
+            'report': report,
+            'lead_days': settings.REORDER_LEAD_DAYS,
+            'target_days': settings.REORDER_TARGET_DAYS,
+        }
+        email = EmailMultiAlternatives(
+            subject=f'ZLATO reorder alert: {len(report["products"])} products running low',
+            body=render_to_string('analytics/emails/reorder_alert.txt', context),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[settings.ADMIN_EMAIL],
+        )
+        with external('smtp'):
+            email.send(fail_silently=False)
+        logger.info('Reorder alert sent for %s products', len(report['products']))
+        return True
+    except Exception as e:
+        logger.error('Failed to send reorder alert: %s', e)
+        return False
@@ -0,0 +1,32 @@
+"""
+Analytics builds started from the admin.
+
+The cohort and forecast buttons would otherwise read every paid order inside
+the admin request. ``start()`` runs the management command in a process of
+its own instead, and the page shows the new artifact once it is written.
+Each command starts at most once per JOB_COOLDOWN_SECONDS (tracked in the
+default cache), so repeated clicks do not pile up processes.
+"""
+import logging
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+JOB_COOLDOWN_SECONDS = 5 * 60
+
+
+def start(command, *args):
+    """Start ``manage.py <command> <args>`` in the background; False if it was started recently."""
+    if not cache.add(f'analytics:job:{command}', True, JOB_COOLDOWN_SECONDS):
+        return False
+    # A new session, so the build outlives the worker; its output goes to the shop's log
+    subprocess.Popen(
+        [sys.executable, str(settings.BASE_DIR / 'manage.py'), command, *args],
+        stdin=subprocess.DEVNULL, start_new_session=True,
+    )
+    logger.info('Started manage.py %s in the background', command)
+    return True
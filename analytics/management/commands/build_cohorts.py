@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from analytics.cohorts import CHUNK_SIZE, build
+
+
+class Command(BaseCommand):
+    help = 'Recompute the customer cohorts, repeat purchases and lifetime value artifact'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Orders read per query')
+
+    def handle(self, *args, **options):
+        path = build(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Built the customer cohorts: {path}'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from analytics.forecasting import run
+
+
+class Command(BaseCommand):
+    help = 'Update the demand forecasts and email new reorder alerts; run daily'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Refit the whole history instead of resuming')
+        parser.add_argument('--no-email', action='store_true', help='Flag reorders in the admin only')
+
+    def handle(self, *args, **options):
+        new_alerts = run(full=options['full'], notify=not options['no_email'])
+        self.stdout.write(self.style.SUCCESS(f'Updated the demand forecasts: {len(new_alerts)} new reorder alerts'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from analytics.recommendations import CHUNK_SIZE, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the "frequently bought together" recommendations from the paid orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Order items read per query')
+
+    def handle(self, *args, **options):
+        written = rebuild(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the recommendations: {written} rows'))
@@ -0,0 +1,17 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from analytics.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales rollups from the orders, for backfills'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat, help='First day, YYYY-MM-DD')
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat, help='Last day, YYYY-MM-DD')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        written = rebuild(options['date_from'], options['date_to'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the sales rollups: {written} rows'))
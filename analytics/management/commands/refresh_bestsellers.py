@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from analytics.bestsellers import refresh
+
+
+class Command(BaseCommand):
+    help = 'Recompute the bestseller sort keys of the products from the sales rollups; run daily'
+
+    def handle(self, *args, **options):
+        changed = refresh()
+        self.stdout.write(self.style.SUCCESS(f'Refreshed the bestseller sort keys: {changed} products changed'))
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('orders', '0002_order_status_created_idx'),
+        ('products', '0004_stockmovement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('gross', models.DecimalField(decimal_places=2, default=0, help_text='Subtotals', max_digits=14)),
+                ('discounts', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('shipping', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, help_text='Order totals', max_digits=14)),
+                ('cancelled', models.IntegerField(default=0, help_text='Orders created this day that are cancelled')),
+            ],
+            options={
+                'verbose_name': 'Daily Sales',
+                'verbose_name_plural': 'Daily Sales',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyCitySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('city', models.CharField(max_length=100)),
+                ('orders', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'city'), name='daily_city_sales_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyCodeSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('orders', models.IntegerField(default=0)),
+                ('gross', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('discounts', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('discount_code', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='orders.discountcode')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'discount_code'), name='daily_code_sales_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'product'), name='daily_product_sales_unique')],
+            },
+        ),
+    ]
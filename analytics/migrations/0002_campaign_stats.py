@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('orders', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Customer Sales',
+                'verbose_name_plural': 'Customer Sales',
+            },
+        ),
+        migrations.AddField(
+            model_name='dailycodesales',
+            name='applied',
+            field=models.IntegerField(default=0, help_text='Checkouts the code was applied to'),
+        ),
+        migrations.AddField(
+            model_name='dailycodesales',
+            name='new_customers',
+            field=models.IntegerField(default=0, help_text="Orders that were the customer's first paid order"),
+        ),
+    ]
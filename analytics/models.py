@@ -0,0 +1,149 @@
+from django.db import models
+
+
+class DailySales(models.Model):
+    """
+    Paid orders per day (by the local date they were paid).
+    Maintained by analytics.rollups; rebuild with ``rebuild_rollups``.
+    """
+    COUNTERS = ['orders', 'units', 'gross', 'discounts', 'shipping', 'revenue', 'cancelled']
+
+    date = models.DateField(unique=True)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    gross = models.DecimalField(max_digits=14, decimal_places=2, default=0, help_text="Subtotals")
+    discounts = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    shipping = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, help_text="Order totals")
+    cancelled = models.IntegerField(default=0, help_text="Orders created this day that are cancelled")
+
+    class Meta:
+        ordering = ['-date']
+        verbose_name = "Daily Sales"
+        verbose_name_plural = "Daily Sales"
+
+    def __str__(self):
+        return f"{self.date}: {self.orders} orders, {self.revenue} BGN"
+
+
+class DailyProductSales(models.Model):
+    """Units and line revenue (before order discounts) per product and day."""
+    COUNTERS = ['units', 'revenue']
+
+    date = models.DateField()
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='+')
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='daily_product_sales_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.product_id}: {self.units} units"
+
+
+class DailyCitySales(models.Model):
+    """Paid orders per shipping city and day."""
+    COUNTERS = ['orders', 'revenue']
+
+    date = models.DateField()
+    city = models.CharField(max_length=100)
+    orders = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'city'], name='daily_city_sales_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.city}: {self.orders} orders"
+
+
+class DailyCodeSales(models.Model):
+    """
+    Paid orders per discount code and day, and how often the code was
+    applied in a checkout that day.
+    """
+    COUNTERS = ['orders', 'new_customers', 'gross', 'discounts', 'revenue', 'applied']
+
+    date = models.DateField()
+    discount_code = models.ForeignKey('orders.DiscountCode', on_delete=models.CASCADE, related_name='+')
+    orders = models.IntegerField(default=0)
+    new_customers = models.IntegerField(default=0, help_text="Orders that were the customer's first paid order")
+    gross = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    discounts = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    applied = models.IntegerField(default=0, help_text="Checkouts the code was applied to")
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'discount_code'], name='daily_code_sales_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.discount_code_id}: {self.orders} orders"
+
+
+class CustomerSales(models.Model):
+    """
+    Paid orders per customer email (lowercased), to tell first orders from
+    repeat ones.
+    """
+    COUNTERS = ['orders', 'revenue']
+
+    email = models.EmailField(unique=True)
+    orders = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Customer Sales"
+        verbose_name_plural = "Customer Sales"
+
+    def __str__(self):
+        return f"{self.email}: {self.orders} orders"
+
+
+class ProductPair(models.Model):
+    """
+    Paid orders containing both products, stored in both directions; the
+    row of a product with itself counts the paid orders containing it.
+    The sparse co-occurrence matrix behind Recommendation, maintained by
+    analytics.recommendations.
+    """
+    COUNTERS = ['orders']
+
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='+')
+    orders = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'other'], name='product_pair_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} + {self.other_id}: {self.orders} orders"
+
+
+class Recommendation(models.Model):
+    """Products most often bought together with ``product``, ranked by lift."""
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    orders = models.IntegerField(help_text="Paid orders with both products")
+    lift = models.FloatField(help_text="How much more often they are bought together than by chance")
+
+    class Meta:
+        ordering = ['product', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='recommendation_rank_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.recommended_id} ({self.lift:.2f})"
@@ -0,0 +1,194 @@
+"""
+"Frequently bought together" recommendations.
+
+ProductPair is a sparse product x product co-occurrence matrix of paid
+orders; its diagonal counts the paid orders containing each product.
+Pairs are scored by lift, the share of orders with both products over the
+share expected if they were bought independently::
+
+    lift(a, b) = orders(a, b) * orders / (orders(a) * orders(b))
+
+and the best TOP_N per product are kept in Recommendation, so a page needs
+one indexed lookup on ``product_id`` to show them.
+
+When an order becomes paid (or stops being paid) its pairs are added to
+(taken off) ProductPair with one upsert, and the recommendations of its
+products are recomputed. The lift of recommendations of other products
+drifts slightly as the order count grows; ``rebuild()`` recomputes
+everything from the order items with NumPy, for backfills and a nightly
+run (``manage.py rebuild_recommendations``).
+"""
+import logging
+from itertools import product as cartesian
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Sum
+from django.dispatch import receiver
+from orders.models import Order, OrderItem
+from orders.signals import order_status_changed
+from .models import DailySales, ProductPair, Recommendation
+from .rollups import PAID_STATUSES, increment
+
+logger = logging.getLogger(__name__)
+
+# Recommendations kept per product
+TOP_N = 8
+
+# Pairs bought together fewer times than this are noise, whatever their lift
+MIN_ORDERS = 2
+
+CHUNK_SIZE = 20000
+
+
+def _ranked(pairs, counts, total):
+    """Recommendation objects from (product, other, orders) pairs and the orders per product."""
+    by_product = {}
+    for product_id, other_id, orders in pairs:
+        lift = orders * total / (counts[product_id] * counts[other_id])
+        by_product.setdefault(product_id, []).append((lift, orders, other_id))
+    recommendations = []
+    for product_id, scored in by_product.items():
+        scored.sort(key=lambda row: (-row[0], -row[1], row[2]))
+        recommendations.extend(
+            Recommendation(product_id=product_id, recommended_id=other_id, rank=rank, orders=orders, lift=lift)
+            for rank, (lift, orders, other_id) in enumerate(scored[:TOP_N])
+        )
+    return recommendations
+
+
+def refresh(product_ids):
+    """Recompute the recommendations of ``product_ids`` from ProductPair."""
+    product_ids = set(product_ids)
+    pairs = list(
+        ProductPair.objects.filter(product__in=product_ids, orders__gte=MIN_ORDERS)
+        .exclude(other=F('product'))
+        .values_list('product_id', 'other_id', 'orders')
+    )
+    counted = product_ids | {other_id for _, other_id, _ in pairs}
+    counts = dict(
+        ProductPair.objects.filter(product__in=counted, other=F('product')).values_list('product_id', 'orders')
+    )
+    total = DailySales.objects.aggregate(orders=Sum('orders'))['orders'] or 0
+    Recommendation.objects.filter(product__in=product_ids).delete()
+    Recommendation.objects.bulk_create(_ranked(pairs, counts, total))
+
+
+def add_order(order, sign=1):
+    """Add a paid order's product pairs (``sign=-1`` takes them off) and refresh its products."""
+    product_ids = set(order.items.values_list('product_id', flat=True))
+    increment(ProductPair, ['product', 'other'], [
+        {'product': product_id, 'other': other_id, 'orders': sign}
+        for product_id, other_id in cartesian(product_ids, repeat=2)
+    ])
+    refresh(product_ids)
+
+
+def suggestions(product_ids, limit=4):
+    """
+    Active, in-stock products bought together with ``product_ids`` (and not
+    one of them), best first. One query on the recommendation index.
+    """
+    product_ids = set(product_ids)
+    recommendations = (
+        Recommendation.objects.filter(
+            product__in=product_ids, recommended__is_active=True, recommended__inventory__gt=0,
+        )
+        .exclude(recommended__in=product_ids)
+        .select_related('recommended')
+        .order_by('-lift', 'rank')
+    )
+    products = {}
+    for recommendation in recommendations:
+        products.setdefault(recommendation.recommended_id, recommendation.recommended)
+    return list(products.values())[:limit]
+
+
+@receiver(order_status_changed, sender=Order)
+def update_recommendations(sender, order, previous_status, **kwargs):
+    was_paid, is_paid = previous_status in PAID_STATUSES, order.status in PAID_STATUSES
+    if was_paid != is_paid and order.paid_at:
+        add_order(order, 1 if is_paid else -1)
+
+
+def read_items(chunk_size=CHUNK_SIZE):
+    """(order id, product id) arrays of the paid order items, read in keyset-paginated chunks."""
+    items = OrderItem.objects.filter(
+        order__status__in=PAID_STATUSES, order__paid_at__isnull=False,
+    ).order_by('pk')
+    orders, products = [], []
+    last_pk = 0
+    while rows := list(items.filter(pk__gt=last_pk).values_list('pk', 'order_id', 'product_id')[:chunk_size]):
+        last_pk = rows[-1][0]
+        chunk = np.array(rows, dtype=np.int64)
+        orders.append(chunk[:, 1])
+        products.append(chunk[:, 2])
+    if not orders:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    return np.concatenate(orders), np.concatenate(products)
+
+
+def co_occurrence(orders, products):
+    """
+    The co-occurrence matrix in coordinate form: (product ids, rows,
+    columns, counts) with rows and columns indexing the product ids, and
+    the number of orders.
+    """
+    product_ids, product = np.unique(products, return_inverse=True)
+    size = len(product_ids)
+    if not size:
+        return product_ids, product, product, product, 0
+    # One entry per product and order, sorted by order
+    keys = np.unique(orders * size + product)
+    order, product = keys // size, keys % size
+    _, starts, lengths = np.unique(order, return_index=True, return_counts=True)
+
+    # Every pair of entries within an order, itself included
+    per_entry = np.repeat(lengths, lengths)
+    left = np.repeat(np.arange(len(keys)), per_entry)
+    first_of_order = np.repeat(np.repeat(starts, lengths), per_entry)
+    within = np.arange(len(left)) - np.repeat(np.cumsum(per_entry) - per_entry, per_entry)
+    right = first_of_order + within
+
+    cells, counts = np.unique(product[left] * size + product[right], return_counts=True)
+    return product_ids, cells // size, cells % size, counts, len(starts)
+
+
+def rebuild(chunk_size=CHUNK_SIZE):
+    """Recompute ProductPair and Recommendation from the paid orders; returns the number of recommendations."""
+    product_ids, rows, columns, counts, total = co_occurrence(*read_items(chunk_size))
+    ids = product_ids.tolist()
+    pairs = [
+        ProductPair(product_id=ids[row], other_id=ids[column], orders=count)
+        for row, column, count in zip(rows.tolist(), columns.tolist(), counts.tolist())
+    ]
+
+    diagonal = np.zeros(len(product_ids), dtype=np.int64)
+    on_diagonal = rows == columns
+    diagonal[rows[on_diagonal]] = counts[on_diagonal]
+    candidates = ~on_diagonal & (counts >= MIN_ORDERS)
+    rows, columns, counts = rows[candidates], columns[candidates], counts[candidates]
+    lift = counts * total / (diagonal[rows] * diagonal[columns])
+
+    # Best first within each product: lift, then orders, then the other product
+    order = np.lexsort((product_ids[columns], -counts, -lift, rows))
+    rows, columns, counts, lift = rows[order], columns[order], counts[order], lift[order]
+    _, starts, lengths = np.unique(rows, return_index=True, return_counts=True)
+    rank = np.arange(len(rows)) - np.repeat(starts, lengths)
+    top = rank < TOP_N
+    recommendations = [
+        Recommendation(
+            product_id=ids[row], recommended_id=ids[column], rank=position, orders=count, lift=score,
+        )
+        for row, column, position, count, score in zip(
+            rows[top].tolist(), columns[top].tolist(), rank[top].tolist(), counts[top].tolist(), lift[top].tolist(),
+        )
+    ]
+
+    with transaction.atomic():
+        ProductPair.objects.all().delete()
+        ProductPair.objects.bulk_create(pairs, batch_size=5000)
+        Recommendation.objects.all().delete()
+        Recommendation.objects.bulk_create(recommendations, batch_size=5000)
+    logger.info('Rebuilt recommendations: %s product pairs, %s recommendations', len(pairs), len(recommendations))
+    return len(recommendations)
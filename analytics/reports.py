@@ -0,0 +1,108 @@
+"""
+Reports read from the rollup tables only.
+
+Each query covers the days of the report, never the order history, so a
+report takes the same time for a shop with a month of orders as for one
+with years of them.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Sum
+from .models import DailyCitySales, DailyCodeSales, DailyProductSales, DailySales
+
+TOTALS = ['orders', 'units', 'gross', 'discounts', 'shipping', 'revenue', 'cancelled']
+
+# Fields a campaign report can be grouped by
+CAMPAIGN_GROUPS = {
+    'code': [
+        'discount_code_id', 'discount_code__code', 'discount_code__created_by', 'discount_code__discount_percentage',
+    ],
+    'campaign': ['discount_code__created_by'],
+}
+CAMPAIGN_COLUMNS = [
+    'orders', 'new_customers', 'repeat_customers', 'gross', 'discounts', 'net', 'revenue',
+    'average_basket', 'applied', 'conversion',
+]
+
+
+def _totals(start, end):
+    totals = DailySales.objects.filter(date__range=(start, end)).aggregate(
+        **{name: Sum(name) for name in TOTALS}
+    )
+    totals = {name: value or 0 for name, value in totals.items()}
+    totals['average_basket'] = totals['revenue'] / totals['orders'] if totals['orders'] else Decimal(0)
+    return totals
+
+
+def _change(current, previous):
+    """Percentage change, or None without a previous value."""
+    if not previous:
+        return None
+    return round(float((current - previous) / previous * 100), 1)
+
+
+def sales_summary(start, end, top=10):
+    """KPIs for the local days from ``start`` to ``end``, compared with the period before."""
+    period = end - start + timedelta(days=1)
+    totals = _totals(start, end)
+    previous = _totals(start - period, start - timedelta(days=1))
+
+    by_day = {row.date: row for row in DailySales.objects.filter(date__range=(start, end))}
+    days = []
+    for offset in range(period.days):
+        day = start + timedelta(days=offset)
+        row = by_day.get(day)
+        days.append({
+            'date': day,
+            'orders': row.orders if row else 0,
+            'units': row.units if row else 0,
+            'revenue': row.revenue if row else Decimal(0),
+        })
+    peak = max((day['revenue'] for day in days), default=0)
+    for day in days:
+        day['width'] = round(day['revenue'] / peak * 100) if peak else 0
+
+    def ranking(model, *fields):
+        return list(
+            model.objects.filter(date__range=(start, end))
+            .values(*fields)
+            .annotate(**{name: Sum(name) for name in model.COUNTERS})
+            .order_by('-revenue')[:top]
+        )
+
+    return {
+        'start': start,
+        'end': end,
+        'totals': totals,
+        'changes': {name: _change(totals[name], previous[name]) for name in totals},
+        'days': days,
+        'products': ranking(DailyProductSales, 'product_id', 'product__name'),
+        'cities': ranking(DailyCitySales, 'city'),
+        'codes': ranking(DailyCodeSales, 'discount_code_id', 'discount_code__code', 'discount_code__created_by'),
+    }
+
+
+def campaign_report(start=None, end=None, by='code'):
+    """
+    Discount code performance per code or per campaign (the code's
+    ``created_by``), for the local days from ``start`` to ``end`` (None for
+    no limit). Net revenue is the order subtotals after discounts, without
+    shipping; conversion is paid orders per checkout the code was applied to.
+    """
+    rows = DailyCodeSales.objects.all()
+    if start:
+        rows = rows.filter(date__gte=start)
+    if end:
+        rows = rows.filter(date__lte=end)
+    report = list(
+        rows.values(*CAMPAIGN_GROUPS[by])
+        .annotate(**{name: Sum(name) for name in DailyCodeSales.COUNTERS})
+        .order_by('-revenue')
+    )
+    for row in report:
+        row['net'] = row['gross'] - row['discounts']
+        row['average_basket'] = row['net'] / row['orders'] if row['orders'] else None
+        row['repeat_customers'] = row['orders'] - row['new_customers']
+        row['conversion'] = round(row['orders'] / row['applied'] * 100, 1) if row['applied'] else None
+    return report
@@ -0,0 +1,298 @@
+"""
+Daily sales rollups.
+
+The rollup tables in analytics.models hold one row per day (and product,
+city or discount code) with running totals, so reports never scan the
+order tables:
+
+- when an order becomes paid, its totals are added to the day it was paid;
+  if a paid order is ever cancelled they are taken off that day again
+- ``DailySales.cancelled`` counts cancelled orders by the day they were
+  created
+- CustomerSales counts paid orders per email, so a discount code's orders
+  can be split into first orders and repeat customers; an order counts as
+  a first order while it is the customer's earliest paid one
+- ``DailyCodeSales.applied`` counts checkouts a code was applied to, for
+  the conversion from applying a code to paying
+- the bestseller sort keys of the order's products are updated too (see
+  analytics.bestsellers)
+
+Updates run in the transaction that changes the order status, as one
+``INSERT ... ON CONFLICT DO UPDATE`` per table that adds to the existing
+counters, so concurrent payments on the same day never lose an update and
+the number of queries does not depend on the size of the order.
+
+``rebuild()`` recomputes a date range from the orders, for backfills and
+after status changes made outside orders.lifecycle (such as editing an
+order in the admin).
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import connections, router, transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.dispatch import receiver
+from django.utils import timezone
+from orders.models import DiscountCode, Order, OrderItem
+from orders.signals import discount_code_applied, order_status_changed
+from .bestsellers import add_sales, refresh as refresh_sort_keys
+from .models import CustomerSales, DailyCitySales, DailyCodeSales, DailyProductSales, DailySales
+
+logger = logging.getLogger(__name__)
+
+# Statuses of orders whose payment has been taken
+PAID_STATUSES = ('paid', 'processing', 'shipped', 'delivered')
+
+
+def increment(model, keys, rows, returning=()):
+    """
+    Add the counters in ``rows`` (dicts of field values) to the rows of
+    ``model`` with the same ``keys``, creating the ones that do not exist.
+    Counters left out of a row count as zero. Returns the new values of the
+    ``returning`` columns, one tuple per row.
+    """
+    if not rows:
+        return []
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    fields = [model._meta.get_field(name) for name in keys + model.COUNTERS]
+    columns = ', '.join(quote(field.column) for field in fields)
+    values = ', '.join(['(' + ', '.join(['%s'] * len(fields)) + ')'] * len(rows))
+    updates = ', '.join(
+        f'{quote(field.column)} = {table}.{quote(field.column)} + excluded.{quote(field.column)}'
+        for field in fields[len(keys):]
+    )
+    conflict = ', '.join(quote(model._meta.get_field(name).column) for name in keys)
+    params = [
+        field.get_db_prep_save(row.get(field.name, 0), connection)
+        for row in rows
+        for field in fields
+    ]
+    sql = f'INSERT INTO {table} ({columns}) VALUES {values} ON CONFLICT ({conflict}) DO UPDATE SET {updates}'
+    if returning:
+        sql += ' RETURNING ' + ', '.join(quote(model._meta.get_field(name).column) for name in returning)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall() if returning else []
+
+
+def add_order(order, sign=1):
+    """Add a paid order to the rollups of the day it was paid (``sign=-1`` takes it off)."""
+    day = timezone.localdate(order.paid_at)
+    products = defaultdict(lambda: {'units': 0, 'revenue': 0})
+    for product_id, quantity, price in order.items.values_list('product_id', 'quantity', 'product_price'):
+        products[product_id]['units'] += sign * quantity
+        products[product_id]['revenue'] += sign * quantity * price
+
+    increment(DailySales, ['date'], [{
+        'date': day,
+        'orders': sign,
+        'units': sum(line['units'] for line in products.values()),
+        'gross': sign * order.subtotal,
+        'discounts': sign * order.discount_amount,
+        'shipping': sign * order.shipping_cost,
+        'revenue': sign * order.total,
+    }])
+    increment(DailyProductSales, ['date', 'product'], [
+        {'date': day, 'product': product_id, **line} for product_id, line in products.items()
+    ])
+    add_sales(day, products)
+    increment(DailyCitySales, ['date', 'city'], [
+        {'date': day, 'city': order.shipping_city, 'orders': sign, 'revenue': sign * order.total},
+    ])
+    (customer_orders,), = increment(CustomerSales, ['email'], [
+        {'email': customer_email(order.customer_email), 'orders': sign, 'revenue': sign * order.total},
+    ], returning=['orders'])
+
+    codes = {}
+    if order.discount_code_id:
+        codes[day, order.discount_code_id] = {
+            'orders': sign,
+            'new_customers': 0,
+            'gross': sign * order.subtotal,
+            'discounts': sign * order.discount_amount,
+            'revenue': sign * order.total,
+        }
+    # A customer is new on the day of their earliest paid order, as in
+    # rebuild(). Only repeat customers need a look at their other orders.
+    if customer_orders == (1 if sign == 1 else 0):
+        first, other = True, None
+    else:
+        other = _earliest_other_paid_order(order)
+        first = other is None or (order.paid_at, order.pk) < other[:2]
+    if first:
+        if order.discount_code_id:
+            codes[day, order.discount_code_id]['new_customers'] = sign
+        # The customer's other earliest order stops (or starts again) being their first
+        if other and other[2]:
+            key = (timezone.localdate(other[0]), other[2])
+            codes.setdefault(key, {'new_customers': 0})['new_customers'] -= sign
+    increment(DailyCodeSales, ['date', 'discount_code'], [
+        {'date': date, 'discount_code': code_id, **counters} for (date, code_id), counters in codes.items()
+    ])
+
+
+def _earliest_other_paid_order(order):
+    """paid_at, pk and discount code id of the customer's earliest paid order other than ``order``."""
+    return Order.objects.filter(
+        customer_email__iexact=customer_email(order.customer_email),
+        status__in=PAID_STATUSES, paid_at__isnull=False,
+    ).exclude(pk=order.pk).order_by('paid_at', 'pk').values_list('paid_at', 'pk', 'discount_code_id').first()
+
+
+def customer_email(email):
+    return email.strip().lower()
+
+
+@receiver(order_status_changed, sender=Order)
+def update_rollups(sender, order, previous_status, **kwargs):
+    """Keep the rollups in step with orders.lifecycle status changes."""
+    was_paid, is_paid = previous_status in PAID_STATUSES, order.status in PAID_STATUSES
+    if was_paid != is_paid and order.paid_at:
+        add_order(order, 1 if is_paid else -1)
+
+    was_cancelled, is_cancelled = previous_status == 'cancelled', order.status == 'cancelled'
+    if was_cancelled != is_cancelled:
+        increment(DailySales, ['date'], [
+            {'date': timezone.localdate(order.created_at), 'cancelled': 1 if is_cancelled else -1},
+        ])
+
+
+@receiver(discount_code_applied, sender=DiscountCode)
+def count_code_applied(sender, discount_code, **kwargs):
+    increment(DailyCodeSales, ['date', 'discount_code'], [
+        {'date': timezone.localdate(), 'discount_code': discount_code.pk, 'applied': 1},
+    ])
+
+
+def _day_range(field, date_from, date_to):
+    """Filter on ``field`` for the local days from ``date_from`` to ``date_to``."""
+    filters = {}
+    if date_from:
+        filters[f'{field}__gte'] = timezone.make_aware(datetime.combine(date_from, time.min))
+    if date_to:
+        filters[f'{field}__lt'] = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+    return filters
+
+
+def rebuild(date_from=None, date_to=None, batch_size=5000):
+    """
+    Recompute the rollups for the local days from ``date_from`` to
+    ``date_to`` (both inclusive; None for no limit) from the orders.
+    CustomerSales is always rebuilt from the whole history, and the
+    ``applied`` counts of the discount codes, which orders do not record,
+    are kept. The bestseller sort keys are refreshed from the result.
+    Returns the number of rollup rows written.
+    """
+    with transaction.atomic():
+        written = 0
+        tz = timezone.get_current_timezone()
+        paid = Order.objects.filter(
+            status__in=PAID_STATUSES, paid_at__isnull=False, **_day_range('paid_at', date_from, date_to),
+        ).order_by()
+        paid_day = TruncDate('paid_at', tzinfo=tz)
+        items = OrderItem.objects.filter(order__in=paid.values('pk')).order_by().annotate(
+            day=TruncDate('order__paid_at', tzinfo=tz),
+        )
+        line_revenue = Sum(F('quantity') * F('product_price'), output_field=DecimalField())
+
+        days = defaultdict(DailySales)
+        sales = paid.annotate(day=paid_day).values('day').annotate(
+            orders=Count('pk'), gross=Sum('subtotal'), discounts=Sum('discount_amount'),
+            shipping=Sum('shipping_cost'), revenue=Sum('total'),
+        )
+        for row in sales:
+            day = days[row.pop('day')]
+            for name, value in row.items():
+                setattr(day, name, value)
+        for row in items.values('day').annotate(units=Sum('quantity')):
+            days[row['day']].units = row['units']
+        cancelled = Order.objects.filter(
+            status='cancelled', **_day_range('created_at', date_from, date_to),
+        ).order_by().annotate(day=TruncDate('created_at', tzinfo=tz))
+        for row in cancelled.values('day').annotate(count=Count('pk')):
+            days[row['day']].cancelled = row['count']
+        for day, rollup in days.items():
+            rollup.date = day
+
+        rollups = {
+            DailySales: iter(days.values()),
+            DailyProductSales: (
+                DailyProductSales(date=row.pop('day'), **row)
+                for row in items.values('day', 'product_id')
+                .annotate(units=Sum('quantity'), revenue=line_revenue)
+                .iterator(chunk_size=batch_size)
+            ),
+            DailyCitySales: (
+                DailyCitySales(date=row.pop('day'), city=row.pop('shipping_city'), **row)
+                for row in paid.annotate(day=paid_day).values('day', 'shipping_city')
+                .annotate(orders=Count('pk'), revenue=Sum('total'))
+                .iterator(chunk_size=batch_size)
+            ),
+            DailyCodeSales: _code_rollups(paid, _rebuild_customers(batch_size), date_from, date_to),
+        }
+
+        for model, rows in rollups.items():
+            existing = model.objects.all()
+            if date_from:
+                existing = existing.filter(date__gte=date_from)
+            if date_to:
+                existing = existing.filter(date__lte=date_to)
+            existing.delete()
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    written += len(model.objects.bulk_create(batch))
+                    batch = []
+            written += len(model.objects.bulk_create(batch))
+        refresh_sort_keys()
+    logger.info('Rebuilt sales rollups from %s to %s: %s rows', date_from or 'start', date_to or 'today', written)
+    return written
+
+
+def _rebuild_customers(batch_size):
+    """Rewrite CustomerSales; returns the ids of every customer's first paid order."""
+    customers = {}
+    paid = Order.objects.filter(status__in=PAID_STATUSES, paid_at__isnull=False).order_by('paid_at', 'pk')
+    for pk, email, total in paid.values_list('pk', 'customer_email', 'total').iterator(chunk_size=batch_size):
+        email = customer_email(email)
+        if email not in customers:
+            customers[email] = CustomerSales(email=email, orders=0, revenue=0), pk
+        customer, _ = customers[email]
+        customer.orders += 1
+        customer.revenue += total
+
+    CustomerSales.objects.all().delete()
+    CustomerSales.objects.bulk_create((customer for customer, _ in customers.values()), batch_size=batch_size)
+    return {first_order for _, first_order in customers.values()}
+
+
+def _code_rollups(paid, first_orders, date_from, date_to):
+    """DailyCodeSales rows for the paid orders, keeping the applied counts already recorded."""
+    existing = DailyCodeSales.objects.filter(applied__gt=0)
+    if date_from:
+        existing = existing.filter(date__gte=date_from)
+    if date_to:
+        existing = existing.filter(date__lte=date_to)
+    rows = {}
+    for day, code_id, applied in existing.values_list('date', 'discount_code_id', 'applied'):
+        rows[day, code_id] = DailyCodeSales(date=day, discount_code_id=code_id, applied=applied)
+
+    orders = paid.filter(discount_code__isnull=False).values_list(
+        'pk', 'paid_at', 'discount_code_id', 'subtotal', 'discount_amount', 'total',
+    )
+    for pk, paid_at, code_id, subtotal, discount, total in orders.iterator():
+        day = timezone.localdate(paid_at)
+        row = rows.get((day, code_id))
+        if row is None:
+            row = rows[day, code_id] = DailyCodeSales(date=day, discount_code_id=code_id)
+        row.orders += 1
+        row.new_customers += pk in first_orders
+        row.gross += subtotal
+        row.discounts += discount
+        row.revenue += total
+    return iter(rows.values())
@@ -0,0 +1,372 @@
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from orders.lifecycle import cancel_orders, mark_order_paid
+from orders.models import DiscountCode, Order, OrderItem
+from orders.signals import order_status_changed
+from products.models import Product
+from zlato.testing import create_order, create_products
+from .models import CustomerSales, DailyCitySales, DailyCodeSales, DailyProductSales, DailySales, Recommendation
+from .rollups import rebuild
+from . import bestsellers, cohorts, forecasting, recommendations, reports
+from .forecasting import ALPHA
+
+ROLLUPS = [DailySales, DailyProductSales, DailyCitySales, DailyCodeSales, CustomerSales]
+
+
+class BackgroundJobMixin:
+    def assertStartsInTheBackground(self, url, command):
+        """POSTs to ``url`` start ``manage.py <command>``, once per cooldown."""
+        cache.delete(f'analytics:job:{command}')
+        with mock.patch('analytics.jobs.subprocess.Popen') as popen:
+            response = self.client.post(url, follow=True)
+            self.assertRedirects(response, url)
+            self.assertContains(response, 'in the background')
+            self.assertContains(self.client.post(url, follow=True), 'was started less than 5 minutes ago')
+        popen.assert_called_once()
+        self.assertEqual(popen.call_args.args[0][-1], command)
+
+
+def snapshot():
+    """Rollup rows without their ids, leaving out the all-zero rows a rebuild does not write."""
+    return {
+        model.__name__: sorted(
+            tuple(sorted((key, str(value)) for key, value in row.items() if key != 'id'))
+            for row in model.objects.values()
+            if any(row[counter] for counter in model.COUNTERS)
+        )
+        for model in ROLLUPS
+    }
+
+
+class RollupTests(TestCase):
+    """Status changes keep the rollups equal to a rebuild from the orders."""
+
+    def setUp(self):
+        now = timezone.now()
+        self.code = DiscountCode.objects.create(
+            code='MARIA10', discount_percentage=10,
+            valid_from=now - timedelta(days=1), valid_to=now + timedelta(days=1),
+        )
+
+    def test_paid_and_cancelled_orders(self):
+        first = create_order(2, discount_code=self.code, discount_amount=Decimal('5.00'), total=Decimal('45.00'))
+        second = create_order(3, shipping_city='Варна')
+        stale = create_order(1)
+        mark_order_paid(first)
+        mark_order_paid(second)
+        cancel_orders([stale.pk])
+
+        today = DailySales.objects.get(date=timezone.localdate())
+        self.assertEqual((today.orders, today.units, today.revenue, today.cancelled), (2, 10, Decimal('120.00'), 1))
+        self.assertEqual(DailyCodeSales.objects.get().discounts, Decimal('5.00'))
+        self.assertEqual(
+            dict(DailyCitySales.objects.values_list('city', 'orders')), {'София': 1, 'Варна': 1},
+        )
+
+        # A late payment for a cancelled order moves it out of the cancelled count
+        mark_order_paid(stale)
+        incremental = snapshot()
+        rebuild()
+        self.assertEqual(snapshot(), incremental)
+        self.assertEqual(DailySales.objects.get().cancelled, 0)
+
+    def test_cancelling_a_first_order(self):
+        # The second order becomes the customer's first, on its own day and code
+        other_code = DiscountCode.objects.create(
+            code='NIKI15', discount_percentage=15, valid_from=self.code.valid_from, valid_to=self.code.valid_to,
+        )
+        first = create_order(1, customer_email='anna@example.com', discount_code=self.code)
+        second = create_order(2, customer_email='Anna@example.com', discount_code=other_code)
+        for order, days_ago in [(first, 2), (second, 1)]:
+            mark_order_paid(order)
+            Order.objects.filter(pk=order.pk).update(paid_at=F('paid_at') - timedelta(days=days_ago))
+        rebuild()
+        self.assertEqual(dict(DailyCodeSales.objects.values_list('discount_code', 'new_customers')),
+                         {self.code.pk: 1, other_code.pk: 0})
+
+        Order.objects.filter(pk=first.pk).update(status='cancelled')
+        first.refresh_from_db()
+        order_status_changed.send(sender=Order, order=first, previous_status='paid')
+        self.assertEqual(dict(DailyCodeSales.objects.values_list('discount_code', 'new_customers')),
+                         {self.code.pk: 0, other_code.pk: 1})
+        incremental = snapshot()
+        rebuild()
+        self.assertEqual(snapshot(), incremental)
+
+        # Paid again, it is the first order again
+        Order.objects.filter(pk=first.pk).update(status='paid')
+        first.refresh_from_db()
+        order_status_changed.send(sender=Order, order=first, previous_status='cancelled')
+        incremental = snapshot()
+        rebuild()
+        self.assertEqual(snapshot(), incremental)
+
+    def test_queries_do_not_grow_with_order_size(self):
+        # Two customers: a repeat customer's payment also looks up their first order
+        small = create_order(1, discount_code=self.code)
+        large = create_order(50, discount_code=self.code, customer_email='other@example.com')
+        with self.assertNumQueries(22) as small_queries:
+            mark_order_paid(small)
+        with self.assertNumQueries(len(small_queries.captured_queries)):
+            mark_order_paid(large)
+        self.assertEqual(DailyProductSales.objects.count(), 51)
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+    def test_dashboard(self):
+        mark_order_paid(create_order(2))
+        response = self.client.get(reverse('analytics:dashboard'), {'days': 7})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['summary']['totals']['orders'], 1)
+        self.assertEqual(len(response.context['summary']['days']), 7)
+        self.assertContains(response, 'Test product')
+
+    def test_dashboard_is_cached(self):
+        self.client.get(reverse('analytics:dashboard'))
+        # Session, user and the cart context processor; no rollup queries
+        with self.assertNumQueries(3):
+            self.client.get(reverse('analytics:dashboard'))
+
+
+class CampaignReportTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.code = DiscountCode.objects.create(
+            code='MARIA10', discount_percentage=10, created_by='Maria',
+            valid_from=now - timedelta(days=1), valid_to=now + timedelta(days=1),
+        )
+
+    def test_report(self):
+        for _ in range(2):
+            # Applying the same code again in one session counts once
+            client = self.client_class()
+            client.post(reverse('orders:apply_discount'), {'code': 'maria10'})
+            client.post(reverse('orders:apply_discount'), {'code': 'maria10'})
+        mark_order_paid(create_order(1, customer_email='Ivan@example.com'))
+        for _ in range(2):
+            mark_order_paid(create_order(
+                2, customer_email='ivan@example.com', discount_code=self.code,
+                discount_amount=Decimal('5.00'), total=Decimal('45.00'),
+            ))
+        mark_order_paid(create_order(2, customer_email='new@example.com', discount_code=self.code))
+
+        row, = reports.campaign_report(by='campaign')
+        self.assertEqual(row['discount_code__created_by'], 'Maria')
+        self.assertEqual((row['orders'], row['new_customers'], row['repeat_customers']), (3, 1, 2))
+        self.assertEqual((row['gross'], row['net']), (Decimal('150.00'), Decimal('140.00')))
+        self.assertEqual(row['applied'], 2)
+        self.assertEqual(row['conversion'], 150.0)
+
+    def test_csv_export(self):
+        mark_order_paid(create_order(1, discount_code=self.code))
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        response = self.client.get(reverse('analytics:campaigns'), {'format': 'csv'})
+        header, line = response.content.decode('utf-8-sig').splitlines()
+        self.assertTrue(header.startswith('discount_code_id,code,created_by,discount_percentage,orders'))
+        self.assertIn(',MARIA10,', line)
+        self.assertEqual(self.client.get(reverse('analytics:campaigns')).status_code, 200)
+
+
+class CohortTests(BackgroundJobMixin, TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(ANALYTICS_ARTIFACT_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def pay(self, email, *paid_at):
+        for moment in paid_at:
+            order = create_order(2, customer_email=email)
+            mark_order_paid(order)
+            Order.objects.filter(pk=order.pk).update(paid_at=moment)
+
+    def test_cohorts(self):
+        utc = dt_timezone.utc
+        self.pay('anna@example.com', datetime(2026, 1, 10, tzinfo=utc), datetime(2026, 2, 5, tzinfo=utc),
+                 datetime(2026, 2, 20, tzinfo=utc))
+        self.pay('boris@example.com', datetime(2026, 1, 15, tzinfo=utc))
+        # 01:30 on 1 February in Sofia, so the February cohort
+        self.pay('Chavdar@example.com', datetime(2026, 1, 31, 23, 30, tzinfo=utc))
+        self.pay('chavdar@example.com', datetime(2026, 3, 1, 12, tzinfo=utc))
+        cohorts.build(chunk_size=2)
+        report = cohorts.load()
+
+        january, february = report['cohorts']
+        self.assertEqual((january['month'], january['customers']), ('2026-01', 2))
+        self.assertEqual(january['retention'], [100.0, 50.0, 0.0])
+        self.assertEqual(january['ltv'], [50.0, 100.0, 100.0])
+        self.assertEqual((february['month'], february['customers']), ('2026-02', 1))
+        self.assertEqual(february['retention'], [100.0, 100.0])
+        self.assertEqual((report['customers'], report['orders'], report['revenue']), (3, 6, 300.0))
+        self.assertEqual([row['customers'] for row in report['frequency'][:4]], [1, 1, 1, 0])
+        self.assertEqual(report['repeat_rate'], 66.7)
+        self.assertEqual(report['top_customers'][0]['email'], 'anna@example.com')
+
+    def test_admin_page(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.assertContains(self.client.get(reverse('analytics:cohorts')), 'Not built yet')
+        self.assertStartsInTheBackground(reverse('analytics:cohorts'), 'build_cohorts')
+        cohorts.build()
+        self.assertContains(self.client.get(reverse('analytics:cohorts')), 'No paid orders yet')
+        self.pay('anna@example.com', timezone.now())
+        cohorts.build()
+        self.assertContains(self.client.get(reverse('analytics:cohorts')), 'anna@example.com')
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        self.a, self.b, self.c, self.d = create_products(4)
+        for products in [(self.a, self.b)] * 3 + [(self.a, self.c)] * 2 + [(self.c, self.d), (self.b,)]:
+            order = create_order(0)
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, product=product, product_name=product.name, product_price=product.price)
+                for product in products
+            )
+            mark_order_paid(order)
+
+    def recommended(self):
+        return list(Recommendation.objects.values_list('product_id', 'recommended_id', 'rank', 'orders', 'lift'))
+
+    def test_lift_and_rebuild(self):
+        # Lifts of products outside the last paid order drift until a rebuild, rankings do not here
+        incremental = [row[:4] for row in self.recommended()]
+        recommendations.rebuild(chunk_size=3)
+        # 7 orders: a in 5, b in 4, c in 3; c and d only once together
+        a, b, c = self.a.pk, self.b.pk, self.c.pk
+        self.assertEqual(self.recommended(), [
+            (a, b, 0, 3, 3 * 7 / (5 * 4)),
+            (a, c, 1, 2, 2 * 7 / (5 * 3)),
+            (b, a, 0, 3, 3 * 7 / (4 * 5)),
+            (c, a, 0, 2, 2 * 7 / (3 * 5)),
+        ])
+        self.assertEqual([row[:4] for row in self.recommended()], incremental)
+
+    def test_suggestions(self):
+        self.assertEqual(recommendations.suggestions([self.a.pk]), [self.b, self.c])
+        # Products already in the cart are not suggested
+        self.assertEqual(recommendations.suggestions([self.a.pk, self.b.pk]), [self.c])
+        self.b.is_active = False
+        self.b.save()
+        response = self.client.get(reverse('products:detail', args=[self.a.slug]))
+        self.assertEqual(response.context['suggestions'], [self.c])
+
+
+class BestsellerTests(TestCase):
+    def setUp(self):
+        self.old, self.recent, self.unsold = create_products(3)
+
+    def pay(self, product, quantity, days_ago=0):
+        order = create_order(0)
+        OrderItem.objects.create(
+            order=order, product=product, product_name=product.name, product_price=product.price, quantity=quantity,
+        )
+        mark_order_paid(order)
+        Order.objects.filter(pk=order.pk).update(paid_at=F('paid_at') - timedelta(days=days_ago))
+        DailyProductSales.objects.filter(product=product).update(date=timezone.localdate() - timedelta(days=days_ago))
+
+    def sort_keys(self):
+        return list(Product.objects.filter(pk__in=[self.old.pk, self.recent.pk]).values_list(
+            'units_7d', 'units_30d', 'revenue_30d',
+        ).order_by('pk'))
+
+    def test_paid_orders_and_refresh(self):
+        self.pay(self.old, 5, days_ago=10)
+        self.pay(self.recent, 2)
+        incremental = self.sort_keys()
+        self.assertEqual(incremental, [(5, 5, Decimal('62.50')), (2, 2, Decimal('25.00'))])
+        # The old sale leaves the 7 day window on the next refresh
+        self.assertEqual(bestsellers.refresh(), 1)
+        self.assertEqual(self.sort_keys(), [(0, 5, Decimal('62.50')), (2, 2, Decimal('25.00'))])
+        self.assertEqual(bestsellers.refresh(), 0)
+
+    def test_shop_sort_orders(self):
+        self.pay(self.old, 5, days_ago=10)
+        self.pay(self.recent, 2)
+        bestsellers.refresh()
+        Product.objects.filter(pk=self.old.pk).update(inventory=0)
+
+        def shop(sort):
+            response = self.client.get(reverse('products:shop'), {'sort': sort})
+            return [product.pk for product in response.context['products'] if product.pk in ids]
+
+        ids = {self.old.pk, self.recent.pk, self.unsold.pk}
+        # Sold out products go last
+        self.assertEqual(shop('bestsellers'), [self.recent.pk, self.unsold.pk, self.old.pk])
+        Product.objects.filter(pk=self.old.pk).update(inventory=10)
+        self.assertEqual(shop('bestsellers'), [self.old.pk, self.recent.pk, self.unsold.pk])
+        self.assertEqual(shop('trending'), [self.recent.pk, self.old.pk, self.unsold.pk])
+        self.assertEqual(self.client.get(reverse('products:shop'), {'sort': 'nonsense'}).context['sort'], 'featured')
+
+
+@override_settings(REORDER_LEAD_DAYS=14, REORDER_TARGET_DAYS=30)
+class ForecastTests(BackgroundJobMixin, TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(ANALYTICS_ARTIFACT_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.running_low, self.plenty, self.unsold = create_products(3)
+        Product.objects.filter(pk=self.running_low.pk).update(inventory=20)
+        today = timezone.localdate()
+        DailyProductSales.objects.bulk_create(
+            DailyProductSales(product=product, date=today - timedelta(days=days), units=3, revenue=0)
+            for product in (self.running_low, self.plenty)
+            for days in range(1, 120)
+        )
+
+    def test_alerts(self):
+        self.assertEqual(forecasting.run(), [self.running_low.pk])
+        row, = forecasting.alerts()['products']
+        self.assertEqual(row['product'], self.running_low)
+        self.assertAlmostEqual(row['demand'], 3, places=2)
+        self.assertEqual((row['days_of_cover'], row['quantity']), (6.7, 70))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(self.running_low.name, mail.outbox[0].body)
+
+        # The next run resumes from the artifact and only alerts new products
+        with self.assertNumQueries(1):
+            self.assertEqual(forecasting.run(), [])
+        self.assertEqual(len(mail.outbox), 1)
+        Product.objects.filter(pk=self.plenty.pk).update(inventory=30)
+        self.assertEqual(forecasting.run(), [self.plenty.pk])
+
+    def test_resume_matches_full_fit(self):
+        today = timezone.localdate()
+        DailyProductSales.objects.filter(product=self.plenty, date=today - timedelta(days=1)).update(units=12)
+
+        def levels():
+            with np.load(forecasting.artifact_path()) as artifact:
+                return dict(zip(artifact['product_ids'].tolist(), artifact['level'].tolist()))
+
+        forecasting.run(notify=False, today=today - timedelta(days=1))
+        forecasting.run(notify=False, today=today)
+        resumed = levels()
+        forecasting.run(notify=False, today=today, full=True)
+        self.assertEqual(resumed.keys(), levels().keys())
+        for product_id, level in levels().items():
+            self.assertAlmostEqual(resumed[product_id], level, places=6)
+        self.assertAlmostEqual(levels()[self.plenty.pk], 3 + ALPHA * 9, places=4)
+
+    def test_admin_page(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.assertContains(self.client.get(reverse('analytics:reorder')), 'No forecast yet')
+        self.assertStartsInTheBackground(reverse('analytics:reorder'), 'forecast_demand')
+        forecasting.run()
+        self.assertContains(self.client.get(reverse('analytics:reorder')), self.running_low.name)
@@ -0,0 +1,13 @@
+from django.contrib import admin
+from django.urls import path
+from . import views
+
+app_name = 'analytics'
+
+# Staff-only pages, mounted under /admin/analytics/
+urlpatterns = [
+    path('', admin.site.admin_view(views.dashboard), name='dashboard'),
+    path('campaigns/', admin.site.admin_view(views.campaigns), name='campaigns'),
+    path('cohorts/', admin.site.admin_view(views.cohorts), name='cohorts'),
+    path('reorder/', admin.site.admin_view(views.reorder), name='reorder'),
+]
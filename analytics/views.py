@@ -0,0 +1,139 @@
+import csv
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.shortcuts import redirect, render
+from django.utils import timezone
+from . import cohorts as cohort_artifact
+from . import forecasting, jobs, reports
+
+# Periods offered on the dashboard, in days
+PERIODS = [7, 30, 90, 365]
+DEFAULT_PERIOD = 30
+
+# Dashboard figures are cached this long; the rollups themselves are live
+DASHBOARD_CACHE_SECONDS = 300
+
+# Most recent cohorts shown on the cohort page
+COHORT_ROWS = 24
+
+
+def dashboard(request):
+    """
+    Admin KPI dashboard: revenue, orders and the best products, cities and
+    discount codes of the last ``days`` days, read from the rollup tables.
+    """
+    try:
+        days = int(request.GET.get('days', DEFAULT_PERIOD))
+    except ValueError:
+        days = DEFAULT_PERIOD
+    if days not in PERIODS:
+        days = DEFAULT_PERIOD
+    end = timezone.localdate()
+    start = end - timedelta(days=days - 1)
+
+    summary = cache.get_or_set(
+        f'analytics:dashboard:{start}:{end}',
+        lambda: reports.sales_summary(start, end),
+        DASHBOARD_CACHE_SECONDS,
+    )
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Sales dashboard',
+        'summary': summary,
+        'days': days,
+        'periods': PERIODS,
+        'cache_minutes': DASHBOARD_CACHE_SECONDS // 60,
+    }
+    return render(request, 'analytics/dashboard.html', context)
+
+
+def _date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def campaigns(request):
+    """
+    Admin report of discount code performance per code or per campaign,
+    read from the rollup tables. ``?format=csv`` downloads it.
+    """
+    start, end = _date(request.GET.get('from')), _date(request.GET.get('to'))
+    by = request.GET.get('by') if request.GET.get('by') in reports.CAMPAIGN_GROUPS else 'code'
+    rows = reports.campaign_report(start, end, by)
+
+    if request.GET.get('format') == 'csv':
+        response = HttpResponse(content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="campaigns-{start or "start"}-{end or "today"}.csv"'
+        response.write('\ufeff')
+        columns = reports.CAMPAIGN_GROUPS[by] + reports.CAMPAIGN_COLUMNS
+        writer = csv.writer(response)
+        writer.writerow(column.replace('discount_code__', '') for column in columns)
+        writer.writerows([row[column] for column in columns] for row in rows)
+        return response
+
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Campaign performance',
+        'rows': rows,
+        'by': by,
+        'start': start,
+        'end': end,
+        'query': request.GET.urlencode(),
+    }
+    return render(request, 'analytics/campaigns.html', context)
+
+
+def cohorts(request):
+    """
+    Admin page with monthly cohort retention, order frequency and lifetime
+    value, read from the artifact of ``build_cohorts``. POST starts that
+    command in the background.
+    """
+    if request.method == 'POST':
+        _start(request, 'build_cohorts', 'The customer cohorts are being rebuilt')
+        return redirect('analytics:cohorts')
+
+    report = cohort_artifact.load()
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Customer cohorts',
+        'report': report,
+        'cohorts': report['cohorts'][-COHORT_ROWS:] if report else [],
+        'cohort_rows': COHORT_ROWS,
+    }
+    return render(request, 'analytics/cohorts.html', context)
+
+
+def reorder(request):
+    """
+    Admin page with the products the last demand forecast flagged for
+    reorder, against their current inventory. POST starts
+    ``forecast_demand`` in the background.
+    """
+    if request.method == 'POST':
+        _start(request, 'forecast_demand', 'The demand forecasts are being updated')
+        return redirect('analytics:reorder')
+
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Reorder alerts',
+        'report': forecasting.alerts(),
+        'lead_days': settings.REORDER_LEAD_DAYS,
+        'target_days': settings.REORDER_TARGET_DAYS,
+    }
+    return render(request, 'analytics/reorder.html', context)
+
+
+def _start(request, command, started):
+    if jobs.start(command):
+        messages.success(request, f'{started} in the background; reload this page in a minute.')
+    else:
+        messages.warning(
+            request, f'manage.py {command} was started less than {jobs.JOB_COOLDOWN_SECONDS // 60} minutes ago.',
+        )
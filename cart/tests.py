@@ -1,3 +1,55 @@
 from django.test import TestCase
+from django.urls import reverse
+from products.models import Product
+from zlato.testing import CART_SIZES, QueryBudgetMixin, create_cart
+from . import urls
 
-# Create your tests here.
+
+class CartQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    Cart pages and actions run the same number of queries for 1, 10 or
+    100 cart lines.
+    """
+
+    def post_for_line(self, url_name, data=None):
+        def scenario(lines):
+            client = self.client_class()
+            # One line more, so removing one never leaves the cart empty
+            cart = create_cart(client, lines + 1)
+            item = cart.items.first()
+            return lambda: client.post(
+                reverse(url_name, args=[item.pk]), data or {}, HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+            )
+        return self.assertConstantQueries(scenario, CART_SIZES)
+
+    def test_every_url_is_tested(self):
+        self.assertEveryUrlTested(urls.urlpatterns)
+
+    def test_view(self):
+        def scenario(lines):
+            client = self.client_class()
+            create_cart(client, lines)
+            return lambda: client.get(reverse('cart:view'))
+        for lines, response in zip(CART_SIZES, self.assertConstantQueries(scenario, CART_SIZES)):
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context['cart'].items.all()), lines)
+
+    def test_add(self):
+        product = Product.objects.filter(is_active=True).first()
+
+        def scenario(lines):
+            client = self.client_class()
+            create_cart(client, lines)
+            return lambda: client.post(
+                reverse('cart:add', args=[product.pk]), HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+            )
+        for lines, response in zip(CART_SIZES, self.assertConstantQueries(scenario, CART_SIZES)):
+            self.assertEqual(response.json()['cart_total_items'], lines * 2 + 1)
+
+    def test_update(self):
+        for response in self.post_for_line('cart:update', {'quantity': 3}):
+            self.assertTrue(response.json()['success'])
+
+    def test_remove(self):
+        for response in self.post_for_line('cart:remove'):
+            self.assertTrue(response.json()['success'])
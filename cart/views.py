@@ -1,6 +1,9 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.db.models import prefetch_related_objects
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
+from analytics.recommendations import suggestions
+from monitoring.metrics import CART_ADDS
 from products.models import Product
 from .models import Cart, CartItem
 
@@ -23,8 +26,12 @@ def cart_view(request):
     Display the shopping cart.
     """
     cart = get_or_create_cart(request)
+    # The template, total_items and subtotal all read these items
+    prefetch_related_objects([cart], 'items__product')
+    product_ids = [item.product_id for item in cart.items.all()]
     return render(request, 'cart/cart.html', {
-        'cart': cart
+        'cart': cart,
+        'suggestions': suggestions(product_ids) if product_ids else [],
     })
 
 
@@ -51,6 +58,8 @@ def add_to_cart(request, product_id):
         cart_item.quantity += quantity
         cart_item.save()
 
+    CART_ADDS.inc()
+
     # Return JSON for AJAX requests, redirect for regular requests
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({
@@ -79,6 +88,7 @@ def update_cart_item(request, item_id):
         cart_item.delete()
 
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        prefetch_related_objects([cart], 'items__product')
         return JsonResponse({
             'success': True,
             'cart_total_items': cart.total_items,
@@ -98,6 +108,7 @@ def remove_from_cart(request, item_id):
     cart_item.delete()
 
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        prefetch_related_objects([cart], 'items__product')
         return JsonResponse({
             'success': True,
             'cart_total_items': cart.total_items,
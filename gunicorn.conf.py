@@ -0,0 +1,40 @@
+"""
+Gunicorn settings, loaded from the Procfile.
+
+With METRICS_ENABLED=True, workers share Prometheus metrics through files
+in PROMETHEUS_MULTIPROC_DIR (see monitoring/metrics.py). The variable has to
+be set here, before any worker imports prometheus_client.
+"""
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parent / '.env')
+
+if os.getenv('METRICS_ENABLED', 'False') == 'True':
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'zlato-metrics'))
+
+
+def on_starting(server):
+    # Files left by a previous run would be added to the new counts
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if not directory:
+        return
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    # Write out log records still queued in the worker (see zlato/log.py)
+    from zlato import log
+    log.shutdown()
@@ -0,0 +1,30 @@
+from django.contrib import admin
+from .models import SlowQuery
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    """
+    Read-only view of the slow query log.
+    """
+    list_display = ['short_sql', 'calls', 'total_ms', 'avg_ms', 'max_ms', 'view', 'call_site', 'last_seen']
+    list_filter = ['database', 'view']
+    search_fields = ['sql', 'call_site', 'view']
+    readonly_fields = [
+        'fingerprint', 'sql', 'database', 'view', 'call_site',
+        'calls', 'total_ms', 'max_ms', 'explain', 'first_seen', 'last_seen',
+    ]
+
+    def short_sql(self, obj):
+        return obj.sql[:100]
+    short_sql.short_description = 'SQL'
+
+    def avg_ms(self, obj):
+        return f"{obj.avg_ms:.1f}"
+    avg_ms.short_description = 'Avg ms'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
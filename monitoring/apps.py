@@ -0,0 +1,17 @@
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class MonitoringConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'monitoring'
+
+    def ready(self):
+        if settings.METRICS_ENABLED:
+            from django.core.cache import caches
+            from zlato.perf import instrument_cache
+            instrument_cache(type(caches['default']))
+
+        if settings.SLOW_QUERY_LOG:
+            from . import slow_queries
+            slow_queries.enable()
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from monitoring.models import SlowQuery
+
+SORT_FIELDS = {
+    'total': '-total_ms',
+    'max': '-max_ms',
+    'calls': '-calls',
+}
+
+
+class Command(BaseCommand):
+    help = 'Show the slowest SQL fingerprints recorded by the slow query log'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20, help='Number of fingerprints to show')
+        parser.add_argument('--sort', choices=sorted(SORT_FIELDS), default='total')
+        parser.add_argument('--explain', action='store_true', help='Include captured query plans')
+        parser.add_argument('--reset', action='store_true', help='Delete the log after printing it')
+
+    def handle(self, *args, **options):
+        queries = SlowQuery.objects.order_by(SORT_FIELDS[options['sort']])[:options['top']]
+
+        if not queries:
+            self.stdout.write('No slow queries recorded')
+
+        for rank, query in enumerate(queries, start=1):
+            self.stdout.write(self.style.WARNING(
+                f'#{rank}  {query.calls} calls, total {query.total_ms:.0f} ms, '
+                f'avg {query.avg_ms:.1f} ms, max {query.max_ms:.1f} ms  [{query.database}]'
+            ))
+            self.stdout.write(f'    view: {query.view or "-"}  at {query.call_site or "-"}')
+            self.stdout.write(f'    {query.sql}')
+            if options['explain'] and query.explain:
+                for line in query.explain.splitlines():
+                    self.stdout.write(f'      {line}')
+            self.stdout.write('')
+
+        if options['reset']:
+            deleted, _ = SlowQuery.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS(f'Cleared {deleted} slow query entries'))
@@ -0,0 +1,106 @@
+"""
+Prometheus metrics, served at /metrics when METRICS_ENABLED=True.
+
+Under gunicorn, gunicorn.conf.py points PROMETHEUS_MULTIPROC_DIR at a shared
+directory before the workers start. Each worker then keeps its values in its
+own mmap-backed files there, so an update never waits on another process.
+Whichever worker answers a scrape merges all the files with
+MultiProcessCollector. Without that variable (runserver, management
+commands) the values live in process memory.
+
+While METRICS_ENABLED is off every metric here is a no-op: ``inc()``,
+``observe()`` and ``time()`` record nothing, so requests pay no locking or
+mmap writes for metrics nobody scrapes. The setting is read on each call.
+
+Cache hit ratio is ``rate(zlato_cache_requests_total{result="hit"}[5m])``
+divided by ``rate(zlato_cache_requests_total[5m])``. Email latency and
+failures are the ``service="smtp"`` series of the external call metrics.
+"""
+import os
+from contextlib import nullcontext
+
+from django.conf import settings
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest,
+)
+from prometheus_client.multiprocess import MultiProcessCollector
+
+
+class _Disabled:
+    """Stands in for a metric, or one of its labelled children, while metrics are off."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, amount):
+        pass
+
+    def time(self):
+        return nullcontext()
+
+
+_DISABLED = _Disabled()
+
+
+class _Gated:
+    """A metric that records only while METRICS_ENABLED is on."""
+
+    def __init__(self, metric):
+        self.metric = metric
+
+    def __getattr__(self, name):
+        return getattr(self.metric if settings.METRICS_ENABLED else _DISABLED, name)
+
+
+# Stripe and SMTP calls take from tens of milliseconds to several seconds
+EXTERNAL_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+
+ORDERS_CREATED = _Gated(Counter(
+    'zlato_orders_created_total', 'Orders created at checkout',
+))
+ORDERS_PAID = _Gated(Counter(
+    'zlato_orders_paid_total', 'Orders marked as paid',
+))
+CHECKOUT_SESSION_SECONDS = _Gated(Histogram(
+    'zlato_checkout_session_seconds', 'Time to create a Stripe checkout session',
+    buckets=EXTERNAL_BUCKETS,
+))
+WEBHOOK_SECONDS = _Gated(Histogram(
+    'zlato_stripe_webhook_seconds', 'Time to process a verified Stripe webhook event',
+    ['event'],
+))
+EXTERNAL_SECONDS = _Gated(Histogram(
+    'zlato_external_call_seconds', 'Time spent in calls to external services',
+    ['service'], buckets=EXTERNAL_BUCKETS,
+))
+EXTERNAL_FAILURES = _Gated(Counter(
+    'zlato_external_call_failures_total', 'Calls to external services that raised',
+    ['service'],
+))
+CART_ADDS = _Gated(Counter(
+    'zlato_cart_adds_total', 'Products added to a cart',
+))
+CACHE_REQUESTS = _Gated(Counter(
+    'zlato_cache_requests_total', 'Reads from the default cache',
+    ['result'],
+))
+
+# Webhook events the shop handles; anything else is reported as "other"
+WEBHOOK_EVENTS = ('checkout.session.completed', 'checkout.session.expired')
+
+
+def webhook_event_label(event_type):
+    return event_type if event_type in WEBHOOK_EVENTS else 'other'
+
+
+def export():
+    """Current metrics of all workers in the Prometheus text format."""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
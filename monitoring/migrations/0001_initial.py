@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(help_text='Hash of the normalized SQL', max_length=40, unique=True)),
+                ('sql', models.TextField(help_text='Normalized SQL (literals and parameters replaced with ?)')),
+                ('database', models.CharField(help_text='Database alias', max_length=50)),
+                ('view', models.CharField(blank=True, help_text='URL name of the last view that ran it', max_length=200)),
+                ('call_site', models.CharField(blank=True, help_text='Project code that issued the query', max_length=300)),
+                ('calls', models.PositiveBigIntegerField(default=0)),
+                ('total_ms', models.FloatField(default=0)),
+                ('max_ms', models.FloatField(default=0)),
+                ('explain', models.TextField(blank=True, help_text='Query plan of the slowest recorded run')),
+                ('first_seen', models.DateTimeField(auto_now_add=True)),
+                ('last_seen', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Slow Query',
+                'verbose_name_plural': 'Slow Queries',
+                'ordering': ['-total_ms'],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import models
+
+
+class SlowQuery(models.Model):
+    """
+    Aggregated statistics for one normalized SQL statement that ran slower
+    than SLOW_QUERY_THRESHOLD_MS. Written by monitoring.slow_queries.
+    """
+    fingerprint = models.CharField(max_length=40, unique=True, help_text="Hash of the normalized SQL")
+    sql = models.TextField(help_text="Normalized SQL (literals and parameters replaced with ?)")
+    database = models.CharField(max_length=50, help_text="Database alias")
+    view = models.CharField(max_length=200, blank=True, help_text="URL name of the last view that ran it")
+    call_site = models.CharField(max_length=300, blank=True, help_text="Project code that issued the query")
+    calls = models.PositiveBigIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    explain = models.TextField(blank=True, help_text="Query plan of the slowest recorded run")
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Slow Query"
+        verbose_name_plural = "Slow Queries"
+        ordering = ['-total_ms']
+
+    def __str__(self):
+        return f"{self.sql[:80]} ({self.calls} calls)"
+
+    @property
+    def avg_ms(self):
+        """Average duration per call"""
+        return self.total_ms / self.calls if self.calls else 0
@@ -0,0 +1,224 @@
+"""
+On-demand request profiler.
+
+Enabled with PROFILER_ENABLED=True. A request is profiled when:
+
+- it carries a valid profiling token in the ``X-Profile`` header or the
+  ``_profile`` query parameter (tokens are shown on the admin Profiles page
+  and expire after PROFILER_TOKEN_MAX_AGE seconds);
+- a logged-in staff user adds ``?_profile=1``;
+- or it is picked by PROFILER_SAMPLE_RATE.
+
+ProfilerMiddleware sits last in MIDDLEWARE, so a profile covers URL
+resolution, the view and its template rendering. One request per process
+is profiled at a time; requests arriving meanwhile run unprofiled. PROFILER_MODE selects
+cProfile ('cprofile', stored as .prof for pstats/snakeviz) or a sampling
+profiler ('sampling', stored as collapsed stacks for flame graph tools).
+Each profile has a .json file next to it with the URL and timestamp.
+"""
+import cProfile
+import json
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+TOKEN_SALT = 'monitoring.profiler'
+HEADER = 'X-Profile'
+QUERY_PARAMETER = '_profile'
+
+# Held while a request is profiled. Concurrent profilers would each record
+# the other threads' overhead, and cProfile allows only one active profiler
+# per process from Python 3.12.
+_profiling = threading.Lock()
+
+
+def make_token():
+    """New signed token that lets a request ask to be profiled."""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign('profile')
+
+
+def is_valid_token(token):
+    try:
+        signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=settings.PROFILER_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def profile_dir():
+    path = Path(settings.PROFILER_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+class SamplingProfiler:
+    """
+    Records the stack of one thread every ``interval`` seconds.
+    Stacks are kept in collapsed form ("outer;inner;leaf" -> samples).
+    """
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.stacks = Counter()
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, daemon=True)
+
+    def enable(self):
+        self._sampler.start()
+
+    def disable(self):
+        self._stop.set()
+        self._sampler.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def dump_stats(self, path):
+        with open(path, 'w') as output:
+            for stack, samples in self.stacks.most_common():
+                output.write(f'{stack} {samples}\n')
+
+
+def save_profile(profiler, request, response, duration):
+    """Write a profile and its metadata; keep at most PROFILER_MAX_FILES."""
+    directory = profile_dir()
+    now = timezone.now()
+    view_name = request.resolver_match.view_name if request.resolver_match else ''
+    profile_id = f"{now:%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+    extension = 'folded' if isinstance(profiler, SamplingProfiler) else 'prof'
+
+    profiler.dump_stats(directory / f'{profile_id}.{extension}')
+    (directory / f'{profile_id}.json').write_text(json.dumps({
+        'id': profile_id,
+        'format': extension,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'view': view_name,
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 2),
+        'timestamp': now.isoformat(),
+    }))
+
+    metadata_files = sorted(directory.glob('*.json'))
+    for old in metadata_files[:-settings.PROFILER_MAX_FILES]:
+        for path in directory.glob(f'{old.stem}.*'):
+            path.unlink(missing_ok=True)
+    return profile_id
+
+
+def list_profiles():
+    """Metadata of stored profiles, newest first."""
+    profiles = []
+    for path in sorted(profile_dir().glob('*.json'), reverse=True):
+        try:
+            profiles.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def load_profile(profile_id):
+    """Metadata of one profile, or None if it does not exist."""
+    if not profile_id.replace('-', '').isalnum():
+        return None
+    path = profile_dir() / f'{profile_id}.json'
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def top_functions(profile, sort='cumulative', limit=40):
+    """
+    Most expensive functions of a stored profile as a list of dicts with
+    calls, own time and cumulative time in milliseconds (samples for
+    sampling profiles).
+    """
+    path = profile_dir() / f"{profile['id']}.{profile['format']}"
+
+    if profile['format'] == 'folded':
+        own, inclusive = Counter(), Counter()
+        for line in path.read_text().splitlines():
+            stack, samples = line.rsplit(' ', 1)
+            frames = stack.split(';')
+            own[frames[-1]] += int(samples)
+            for frame in set(frames):
+                inclusive[frame] += int(samples)
+        ranking = inclusive if sort == 'cumulative' else own
+        return [
+            {'function': frame, 'calls': '', 'own': own[frame], 'cumulative': inclusive[frame]}
+            for frame, _ in ranking.most_common(limit)
+        ]
+
+    stats = pstats.Stats(str(path))
+    rows = []
+    for (filename, line, name), (_, calls, own, cumulative, _) in stats.stats.items():
+        rows.append({
+            'function': f'{name} ({Path(filename).name}:{line})',
+            'calls': calls,
+            'own': round(own * 1000, 3),
+            'cumulative': round(cumulative * 1000, 3),
+        })
+    key = 'cumulative' if sort == 'cumulative' else 'own'
+    rows.sort(key=lambda row: row[key], reverse=True)
+    return rows[:limit]
+
+
+class ProfilerMiddleware:
+    """
+    Profile requests that ask for it (see module docstring).
+    Must be the last entry in MIDDLEWARE.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.should_profile(request) or not _profiling.acquire(blocking=False):
+            return self.get_response(request)
+
+        try:
+            if settings.PROFILER_MODE == 'sampling':
+                profiler = SamplingProfiler()
+            else:
+                profiler = cProfile.Profile()
+
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            duration = time.perf_counter() - started
+        finally:
+            _profiling.release()
+
+        response['X-Profile-Id'] = save_profile(profiler, request, response, duration)
+        return response
+
+    def should_profile(self, request):
+        token = request.headers.get(HEADER) or request.GET.get(QUERY_PARAMETER)
+        if token:
+            if is_valid_token(token):
+                return True
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_staff:
+                return True
+        return random.random() < settings.PROFILER_SAMPLE_RATE
@@ -0,0 +1,220 @@
+"""
+Slow query log.
+
+Enabled with SLOW_QUERY_LOG=True. Every database connection gets an
+execute wrapper that times each query. Queries slower than
+SLOW_QUERY_THRESHOLD_MS are grouped by a fingerprint of their normalized
+SQL. Each group keeps the project call site and view that issued the query.
+
+Statistics are buffered per process and flushed to the SlowQuery table at
+the end of each request (and at exit for management commands). Queries
+slower than SLOW_QUERY_EXPLAIN_MS also get their plan captured (EXPLAIN, or
+EXPLAIN QUERY PLAN on SQLite) whenever they beat the stored maximum.
+Parameters are only kept in memory for that EXPLAIN and are never stored.
+
+`manage.py slow_queries` prints the top offenders.
+"""
+import atexit
+import hashlib
+import logging
+import re
+import threading
+import time
+import traceback
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DatabaseError, connections
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_current_view = ContextVar('slow_query_view', default='')
+_local = threading.local()
+_lock = threading.Lock()
+_pending = {}
+
+PROJECT_DIR = str(Path(settings.BASE_DIR).resolve())
+MODULE_FILE = str(Path(__file__).resolve())
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """SQL with literals and parameters replaced by ? and IN lists collapsed."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _IN_LIST.sub('(...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def fingerprint(normalized_sql):
+    return hashlib.sha1(normalized_sql.encode()).hexdigest()
+
+
+def call_site():
+    """Innermost frame of project code (outside site-packages) that ran the query."""
+    for frame in reversed(traceback.extract_stack()):
+        filename = str(Path(frame.filename).resolve())
+        if (
+            filename.startswith(PROJECT_DIR)
+            and filename != MODULE_FILE
+            and 'site-packages' not in filename
+            and not filename.endswith('manage.py')
+        ):
+            return f'{Path(filename).relative_to(PROJECT_DIR)}:{frame.lineno} in {frame.name}'
+    return ''
+
+
+def set_view(view_name):
+    return _current_view.set(view_name)
+
+
+def reset_view(token):
+    _current_view.reset(token)
+
+
+class SlowQueryRecorder:
+    """Execute wrapper recording queries over the threshold for one connection alias."""
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            if duration >= settings.SLOW_QUERY_THRESHOLD_MS and not getattr(_local, 'flushing', False):
+                record(self.alias, sql, params, many, duration)
+
+
+def record(alias, sql, params, many, duration):
+    normalized = normalize_sql(sql)
+    key = fingerprint(normalized)
+    with _lock:
+        entry = _pending.get(key)
+        if entry is None:
+            entry = _pending[key] = {
+                'alias': alias,
+                'sql': normalized,
+                'calls': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'view': '',
+                'call_site': '',
+                'explain_sql': None,
+            }
+        entry['calls'] += 1
+        entry['total_ms'] += duration
+        entry['view'] = _current_view.get() or entry['view']
+        if duration > entry['max_ms']:
+            entry['max_ms'] = duration
+            entry['call_site'] = call_site()
+            if duration >= settings.SLOW_QUERY_EXPLAIN_MS and not many:
+                entry['explain_sql'] = (sql, params)
+
+
+def explain(alias, sql, params):
+    """Query plan of a SELECT, or '' if it cannot be explained."""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return ''
+    connection = connections[alias]
+    prefix = connection.ops.explain_query_prefix()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            rows = cursor.fetchall()
+    except DatabaseError as e:
+        return f'EXPLAIN failed: {e}'
+    return '\n'.join(' | '.join(str(column) for column in row) for row in rows)
+
+
+def flush(**kwargs):
+    """Write buffered statistics to the SlowQuery table."""
+    from .models import SlowQuery
+
+    with _lock:
+        if not _pending:
+            return
+        pending = dict(_pending)
+        _pending.clear()
+
+    _local.flushing = True
+    try:
+        for key, entry in pending.items():
+            updated = SlowQuery.objects.filter(fingerprint=key).update(
+                calls=F('calls') + entry['calls'],
+                total_ms=F('total_ms') + entry['total_ms'],
+                max_ms=Greatest(F('max_ms'), entry['max_ms']),
+                view=entry['view'] or F('view'),
+                call_site=entry['call_site'] or F('call_site'),
+                # update() skips auto_now
+                last_seen=timezone.now(),
+            )
+            if not updated:
+                stored_max = 0
+                SlowQuery.objects.get_or_create(fingerprint=key, defaults={
+                    'sql': entry['sql'],
+                    'database': entry['alias'],
+                    'view': entry['view'],
+                    'call_site': entry['call_site'],
+                    'calls': entry['calls'],
+                    'total_ms': entry['total_ms'],
+                    'max_ms': entry['max_ms'],
+                })
+            else:
+                stored_max = SlowQuery.objects.filter(fingerprint=key).values_list('max_ms', flat=True).first() or 0
+
+            # Re-capture the plan when this process saw a new slowest run
+            if entry['explain_sql'] and entry['max_ms'] >= stored_max:
+                plan = explain(entry['alias'], *entry['explain_sql'])
+                if plan:
+                    SlowQuery.objects.filter(fingerprint=key).update(explain=plan)
+    except DatabaseError as e:
+        logger.warning('Could not save slow query log: %s', e)
+    finally:
+        _local.flushing = False
+
+
+def install_recorder(sender, connection, **kwargs):
+    """connection_created receiver adding the recorder to new connections."""
+    if not any(isinstance(wrapper, SlowQueryRecorder) for wrapper in connection.execute_wrappers):
+        connection.execute_wrappers.append(SlowQueryRecorder(connection.alias))
+
+
+def enable():
+    """Start recording slow queries in this process."""
+    connection_created.connect(install_recorder, dispatch_uid='monitoring.slow_queries')
+    request_finished.connect(flush, dispatch_uid='monitoring.slow_queries')
+    atexit.register(flush)
+    for connection in connections.all(initialized_only=True):
+        install_recorder(sender=None, connection=connection)
+
+
+class SlowQueryViewMiddleware:
+    """Tag slow queries with the URL name of the view that ran them."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = set_view('')
+        try:
+            return self.get_response(request)
+        finally:
+            reset_view(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        set_view(request.resolver_match.view_name if request.resolver_match else '')
@@ -0,0 +1,136 @@
+import io
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, modify_settings, override_settings
+from django.urls import reverse
+from prometheus_client import REGISTRY
+from products.models import Product
+from zlato.perf import external
+from zlato.testing import create_products
+from . import profiling, slow_queries
+from .models import SlowQuery
+
+
+@modify_settings(MIDDLEWARE={'append': 'monitoring.profiling.ProfilerMiddleware'})
+class ProfilerTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(PROFILER_DIR=directory.name, PROFILER_SAMPLE_RATE=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def shop(self, **headers):
+        return self.client.get(reverse('products:shop'), headers=headers)
+
+    def test_requests_with_a_token_are_profiled(self):
+        response = self.shop(**{profiling.HEADER: profiling.make_token()})
+        profile = profiling.load_profile(response['X-Profile-Id'])
+        self.assertEqual((profile['view'], profile['format']), ('products:shop', 'prof'))
+        self.assertTrue(profiling.top_functions(profile))
+
+        self.assertNotIn('X-Profile-Id', self.shop())
+        self.assertNotIn('X-Profile-Id', self.shop(**{profiling.HEADER: 'forged'}))
+
+    @override_settings(PROFILER_MODE='sampling')
+    def test_sampling_profiles_are_listed_for_staff(self):
+        profile_id = self.shop(**{profiling.HEADER: profiling.make_token()})['X-Profile-Id']
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.assertContains(self.client.get(reverse('monitoring:profile_list')), profile_id)
+        response = self.client.get(reverse('monitoring:profile_detail', args=[profile_id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_one_request_is_profiled_at_a_time(self):
+        with profiling._profiling:
+            response = self.shop(**{profiling.HEADER: profiling.make_token()})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        # The lock is released after a profiled request
+        self.assertIn('X-Profile-Id', self.shop(**{profiling.HEADER: profiling.make_token()}))
+        self.assertTrue(profiling._profiling.acquire(blocking=False))
+        profiling._profiling.release()
+
+
+@override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_EXPLAIN_MS=0)
+class SlowQueryTests(TestCase):
+    def setUp(self):
+        slow_queries._pending.clear()
+        self.addCleanup(slow_queries._pending.clear)
+
+    def run_queries(self, *pks):
+        with connection.execute_wrapper(slow_queries.SlowQueryRecorder('default')):
+            for pk in pks:
+                list(Product.objects.filter(pk__in=[pk, pk + 1], name__startswith=f'Zlato {pk}'))
+        slow_queries.flush()
+
+    def test_fingerprint(self):
+        first = slow_queries.normalize_sql("SELECT * FROM t WHERE id IN (1, 2, 3) AND name = 'it''s'")
+        second = slow_queries.normalize_sql("SELECT  *  FROM t WHERE id IN (%s, %s) AND name = %s")
+        self.assertEqual(first, 'SELECT * FROM t WHERE id IN (...) AND name = ?')
+        self.assertEqual(slow_queries.fingerprint(first), slow_queries.fingerprint(second))
+
+    def test_statistics_are_added_up(self):
+        self.run_queries(1, 2)
+        query = SlowQuery.objects.get()
+        self.assertEqual((query.calls, query.database), (2, 'default'))
+        self.assertIn('?', query.sql)
+        self.assertTrue(query.call_site.startswith('monitoring/tests.py:'))
+        self.assertTrue(query.explain)
+        total_ms, last_seen = query.total_ms, query.last_seen
+
+        self.run_queries(3)
+        query.refresh_from_db()
+        self.assertEqual(query.calls, 3)
+        self.assertGreater(query.last_seen, last_seen)
+        self.assertGreaterEqual(query.total_ms, total_ms)
+        self.assertEqual(SlowQuery.objects.count(), 1)
+
+    def test_command(self):
+        self.run_queries(1)
+        stdout = io.StringIO()
+        call_command('slow_queries', '--explain', '--reset', stdout=stdout)
+        self.assertIn('#1  1 calls', stdout.getvalue())
+        self.assertIn('Cleared 1 slow query entries', stdout.getvalue())
+        self.assertFalse(SlowQuery.objects.exists())
+
+
+class MetricsTests(TestCase):
+    def scrape(self, **headers):
+        return self.client.get(reverse('metrics'), headers=headers)
+
+    def external_calls(self, service):
+        return REGISTRY.get_sample_value('zlato_external_call_seconds_count', {'service': service})
+
+    @override_settings(METRICS_ENABLED=True, METRICS_TOKEN='secret')
+    def test_scrapes_need_the_token(self):
+        self.assertEqual(self.scrape().status_code, 401)
+        self.assertEqual(self.scrape(Authorization='Bearer wrong').status_code, 401)
+        response = self.scrape(Authorization='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'zlato_orders_created_total', response.content)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        self.assertEqual(self.scrape().status_code, 404)
+        with external('metrics-test'):
+            pass
+        self.assertIsNone(self.external_calls('metrics-test'))
+
+        with override_settings(METRICS_ENABLED=True), external('metrics-test'):
+            pass
+        self.assertEqual(self.external_calls('metrics-test'), 1)
+
+    def test_business_metrics_follow_the_setting(self):
+        [product] = create_products(1)
+        add = lambda: self.client.post(reverse('cart:add', args=[product.id]))
+        cart_adds = lambda: REGISTRY.get_sample_value('zlato_cart_adds_total')
+        before = cart_adds()
+        with override_settings(METRICS_ENABLED=False):
+            add()
+        self.assertEqual(cart_adds(), before)
+        with override_settings(METRICS_ENABLED=True):
+            add()
+        self.assertEqual(cart_adds(), before + 1)
@@ -0,0 +1,11 @@
+from django.contrib import admin
+from django.urls import path
+from . import views
+
+app_name = 'monitoring'
+
+# Staff-only pages, mounted under /admin/monitoring/
+urlpatterns = [
+    path('profiles/', admin.site.admin_view(views.profile_list), name='profile_list'),
+    path('profiles/<str:profile_id>/', admin.site.admin_view(views.profile_detail), name='profile_detail'),
+]
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.contrib import admin
+from django.http import Http404, HttpResponse
+from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+from . import metrics as prometheus_metrics
+from . import profiling
+
+
+def profile_list(request):
+    """
+    Admin page listing stored request profiles.
+    Also shows a fresh token for profiling requests from outside the browser.
+    """
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Request profiles',
+        'profiles': profiling.list_profiles(),
+        'token': profiling.make_token(),
+        'header': profiling.HEADER,
+        'query_parameter': profiling.QUERY_PARAMETER,
+    }
+    return render(request, 'monitoring/profile_list.html', context)
+
+
+def profile_detail(request, profile_id):
+    """
+    Admin page with the most expensive functions of one profile.
+    """
+    profile = profiling.load_profile(profile_id)
+    if profile is None:
+        raise Http404('Profile not found')
+
+    sort = request.GET.get('sort', 'cumulative')
+    context = {
+        **admin.site.each_context(request),
+        'title': f"Profile of {profile['path']}",
+        'profile': profile,
+        'sort': sort,
+        'functions': profiling.top_functions(profile, sort=sort),
+    }
+    return render(request, 'monitoring/profile_detail.html', context)
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint.
+    Requires ``Authorization: Bearer <METRICS_TOKEN>`` when a token is set.
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404
+
+    if settings.METRICS_TOKEN:
+        authorization = request.headers.get('Authorization', '')
+        if not constant_time_compare(authorization, f'Bearer {settings.METRICS_TOKEN}'):
+            return HttpResponse(status=401)
+
+    body, content_type = prometheus_metrics.export()
+    return HttpResponse(body, content_type=content_type)
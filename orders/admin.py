@@ -3,6 +3,7 @@ from django.utils.html import format_html
 from django.utils import timezone
 from .models import Order, OrderItem, DiscountCode
 from .emails import send_shipping_notification
+from .exports import csv_response
 
 
 class OrderItemInline(admin.TabularInline):
@@ -45,7 +46,7 @@ class OrderAdmin(admin.ModelAdmin):
         'updated_at'
     ]
     inlines = [OrderItemInline]
-    actions = ['mark_as_processing', 'mark_as_shipped']
+    actions = ['mark_as_processing', 'mark_as_shipped', 'export_csv']
     date_hierarchy = 'created_at'
 
     fieldsets = (
@@ -107,6 +108,11 @@ class OrderAdmin(admin.ModelAdmin):
         self.message_user(request, f'{updated} order(s) marked as shipped and customers notified')
     mark_as_shipped.short_description = 'Mark as Shipped (Send Email)'
 
+    def export_csv(self, request, queryset):
+        """Download the lines of the selected orders for accounting"""
+        return csv_response(queryset, f'orders-{timezone.localdate():%Y-%m-%d}.csv')
+    export_csv.short_description = 'Export to CSV (accounting)'
+
     def has_add_permission(self, request):
         """Prevent manual order creation"""
         return False
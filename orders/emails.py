@@ -1,6 +1,7 @@
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.conf import settings
+from zlato.perf import external
 import logging
 
 logger = logging.getLogger(__name__)
@@ -32,12 +33,13 @@ def send_order_confirmation(order):
         email.attach_alternative(html_content, "text/html")
 
         # Send
-        email.send(fail_silently=False)
-        logger.info(f'Order confirmation email sent to {order.customer_email} for order {order.order_number}')
+        with external('smtp'):
+            email.send(fail_silently=False)
+        logger.info('Order confirmation email sent to %s for order %s', order.customer_email, order.order_number)
 
         return True
     except Exception as e:
-        logger.error(f'Failed to send order confirmation email for order {order.order_number}: {str(e)}')
+        logger.error('Failed to send order confirmation email for order %s: %s', order.order_number, e)
         return False
 
 
@@ -67,12 +69,13 @@ def send_shipping_notification(order):
         email.attach_alternative(html_content, "text/html")
 
         # Send
-        email.send(fail_silently=False)
-        logger.info(f'Shipping notification email sent to {order.customer_email} for order {order.order_number}')
+        with external('smtp'):
+            email.send(fail_silently=False)
+        logger.info('Shipping notification email sent to %s for order %s', order.customer_email, order.order_number)
 
         return True
     except Exception as e:
-        logger.error(f'Failed to send shipping notification email for order {order.order_number}: {str(e)}')
+        logger.error('Failed to send shipping notification email for order %s: %s', order.order_number, e)
         return False
 
 
@@ -106,10 +109,11 @@ def send_admin_notification(order):
         email.attach_alternative(html_content, "text/html")
 
         # Send
-        email.send(fail_silently=False)
-        logger.info(f'Admin notification email sent for order {order.order_number}')
+        with external('smtp'):
+            email.send(fail_silently=False)
+        logger.info('Admin notification email sent for order %s', order.order_number)
 
         return True
     except Exception as e:
-        logger.error(f'Failed to send admin notification email for order {order.order_number}: {str(e)}')
+        logger.error('Failed to send admin notification email for order %s: %s', order.order_number, e)
         return False
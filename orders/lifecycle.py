@@ -0,0 +1,158 @@
+"""
+Order status transitions.
+
+The Stripe webhook, the success page and the management commands all move
+orders between statuses through these helpers, so discount usage and stock
+are adjusted in one place and ``order_status_changed`` is always sent.
+
+Stock is only decremented once an order is paid, so a pending order holds
+no inventory and cancelling it only has to give back its discount usage.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from monitoring.metrics import ORDERS_PAID
+from products import bundles
+from products.models import Product
+from .models import Order, DiscountCode
+from .signals import order_status_changed
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Statuses a payment confirmation may arrive in. A cancelled order can still
+# be paid if the sweeper ran before Stripe delivered a late completion.
+PAYABLE_STATUSES = ('pending', 'cancelled')
+
+
+def release_discount_usage(discount_code_ids):
+    """
+    Give back one use per entry in ``discount_code_ids``.
+    Codes are updated with one UPDATE per distinct code, never below zero.
+    """
+    counts = Counter(code_id for code_id in discount_code_ids if code_id)
+    for code_id, count in counts.items():
+        DiscountCode.objects.filter(id=code_id).update(
+            times_used=Greatest(F('times_used') - count, 0)
+        )
+    return sum(counts.values())
+
+
+def mark_order_paid(order, payment_intent_id=''):
+    """
+    Mark an order as paid and take its items out of stock.
+    Returns the updated order, or False if it was already paid so that
+    webhook retries are no-ops.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order.pk)
+        if order.status not in PAYABLE_STATUSES:
+            return False
+
+        previous_status = order.status
+        order.status = 'paid'
+        order.paid_at = timezone.now()
+        if payment_intent_id:
+            order.stripe_payment_intent_id = payment_intent_id
+        order.save()
+
+        # A cancelled order already gave its discount use back
+        if previous_status == 'cancelled' and order.discount_code_id:
+            DiscountCode.objects.filter(id=order.discount_code_id).update(times_used=F('times_used') + 1)
+
+        # Take the items out of stock with one locking read and one update,
+        # whatever the size of the order; bundles take their components
+        ordered = Counter()
+        for product_id, quantity in order.items.values_list('product_id', 'quantity'):
+            ordered[product_id] += quantity
+        quantities = bundles.expand(ordered)
+        products = Product.objects.select_for_update().in_bulk(quantities)
+        in_stock = []
+        for product_id, quantity in quantities.items():
+            product = products[product_id]
+            if product.inventory >= quantity:
+                in_stock.append(product_id)
+                logger.info('Updated inventory for %s: -%s', product.name, quantity)
+            else:
+                logger.warning('Insufficient inventory for %s', product.name)
+        if in_stock:
+            Product.objects.filter(pk__in=in_stock).update(
+                inventory=F('inventory') - Case(*(When(pk=pk, then=quantities[pk]) for pk in in_stock)),
+                updated_at=timezone.now(),
+            )
+            bundles.refresh(in_stock)
+
+        order_status_changed.send(sender=Order, order=order, previous_status=previous_status)
+        transaction.on_commit(ORDERS_PAID.inc)
+
+    return order
+
+
+def cancel_orders(order_ids):
+    """
+    Cancel the pending orders among ``order_ids`` in a single transaction.
+    Returns the number of orders cancelled.
+    """
+    with transaction.atomic():
+        orders = list(
+            Order.objects.select_for_update()
+            .filter(pk__in=list(order_ids), status='pending')
+            .order_by()
+        )
+        if not orders:
+            return 0
+
+        Order.objects.filter(pk__in=[order.pk for order in orders]).update(
+            status='cancelled',
+            updated_at=timezone.now(),
+        )
+        release_discount_usage(order.discount_code_id for order in orders)
+
+        for order in orders:
+            order.status = 'cancelled'
+            order_status_changed.send(sender=Order, order=order, previous_status='pending')
+
+    return len(orders)
+
+
+def cancel_stale_orders(older_than, batch_size=500):
+    """
+    Cancel pending orders created before ``older_than``.
+    Works in batches of ``batch_size`` so each transaction stays short.
+    """
+    cancelled = 0
+    last_pk = 0
+    while True:
+        batch = list(
+            Order.objects.filter(status='pending', created_at__lt=older_than, pk__gt=last_pk)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            break
+        cancelled += cancel_orders(batch)
+        last_pk = batch[-1]
+    return cancelled
+
+
+def purge_cancelled_orders(older_than, batch_size=500):
+    """
+    Delete cancelled orders that were never paid and have not changed since
+    ``older_than``. Order items go with them through the cascade.
+    """
+    deleted = 0
+    while True:
+        batch = list(
+            Order.objects.filter(status='cancelled', paid_at__isnull=True, updated_at__lt=older_than)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            break
+        with transaction.atomic():
+            Order.objects.filter(pk__in=batch).delete()
+        deleted += len(batch)
+    return deleted
@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from orders.lifecycle import cancel_stale_orders, purge_cancelled_orders
+
+
+class Command(BaseCommand):
+    help = 'Cancel abandoned pending orders and release their discount code usage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-hours',
+            type=float,
+            default=settings.PENDING_ORDER_TTL_HOURS,
+            help='Cancel pending orders created more than this many hours ago',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Orders handled per transaction',
+        )
+        parser.add_argument(
+            '--purge-after-days',
+            type=int,
+            default=None,
+            help='Also delete unpaid cancelled orders untouched for this many days',
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        cutoff = now - timedelta(hours=options['older_than_hours'])
+
+        cancelled = cancel_stale_orders(cutoff, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Cancelled {cancelled} stale pending orders'))
+
+        if options['purge_after_days'] is not None:
+            purge_cutoff = now - timedelta(days=options['purge_after_days'])
+            deleted = purge_cancelled_orders(purge_cutoff, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} unpaid cancelled orders'))
@@ -0,0 +1,44 @@
+import sys
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from orders.exports import CHUNK_SIZE, filter_orders, write_csv
+from orders.models import Order
+
+
+def month(value):
+    """First and last day of a YYYY-MM month."""
+    first = date.fromisoformat(f'{value}-01')
+    last = (first + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+    return first, last
+
+
+class Command(BaseCommand):
+    help = 'Export order lines as CSV for accounting'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', type=month, help='YYYY-MM, instead of --from and --to')
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat, help='First day, YYYY-MM-DD')
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat, help='Last day, YYYY-MM-DD')
+        parser.add_argument(
+            '--status', action='append', choices=[status for status, _ in Order.STATUS_CHOICES],
+            help='Repeat for several statuses (default: all)',
+        )
+        parser.add_argument('--discount-code')
+        parser.add_argument('--output', '-o', help='File to write (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        date_from, date_to = options['month'] or (options['date_from'], options['date_to'])
+        if options['month'] and (options['date_from'] or options['date_to']):
+            raise CommandError('Use either --month or --from/--to')
+        orders = filter_orders(
+            Order.objects.all(), date_from, date_to, options['status'], options['discount_code'],
+        )
+
+        if not options['output']:
+            write_csv(orders, sys.stdout.buffer, options['chunk_size'])
+            return
+        with open(options['output'], 'wb') as stream:
+            lines = write_csv(orders, stream, options['chunk_size'])
+        self.stderr.write(self.style.SUCCESS(f'Exported {lines} order lines to {options["output"]}'))
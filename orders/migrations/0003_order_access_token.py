@@ -0,0 +1,41 @@
+import secrets
+
+from django.db import migrations, models
+import orders.order_numbers
+
+
+def fill_access_tokens(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    orders = Order.objects.using(schema_editor.connection.alias)
+    # The ids are read up front, so no cursor stays open on the rows being updated
+    pks = list(orders.filter(access_token__isnull=True).values_list('pk', flat=True))
+    for start in range(0, len(pks), 1000):
+        orders.bulk_update(
+            [Order(pk=pk, access_token=secrets.token_urlsafe(16)) for pk in pks[start:start + 1000]],
+            ['access_token'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_order_status_created_idx'),
+    ]
+
+    operations = [
+        # Nullable first, so existing orders each get a token of their own
+        migrations.AddField(
+            model_name='order',
+            name='access_token',
+            field=models.CharField(editable=False, max_length=32, null=True),
+        ),
+        migrations.RunPython(fill_access_tokens, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='order',
+            name='access_token',
+            field=models.CharField(
+                default=orders.order_numbers.generate_access_token, editable=False,
+                help_text='Secret part of the success and status page URLs', max_length=32, unique=True,
+            ),
+        ),
+    ]
@@ -1,8 +1,12 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.utils import timezone
 from products.models import Product
+from .order_numbers import generate_access_token, generate_order_number
 from decimal import Decimal
 
+# Times Order.save() draws a new order number after a unique-index collision
+ORDER_NUMBER_ATTEMPTS = 5
+
 
 class DiscountCode(models.Model):
     """
@@ -71,6 +75,10 @@ class Order(models.Model):
 
     # Order identification
     order_number = models.CharField(max_length=32, unique=True, editable=False)
+    access_token = models.CharField(
+        max_length=32, unique=True, editable=False, default=generate_access_token,
+        help_text="Secret part of the success and status page URLs",
+    )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
 
     # Customer information (guest checkout)
@@ -116,16 +124,29 @@ class Order(models.Model):
         verbose_name = "Order"
         verbose_name_plural = "Orders"
         ordering = ['-created_at']
+        indexes = [
+            # Used by the pending-order sweeper and status filters in the admin
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ]
 
     def __str__(self):
         return f"Order #{self.order_number} - {self.customer_name}"
 
     def save(self, *args, **kwargs):
-        if not self.order_number:
-            # Generate unique order number
-            import uuid
-            self.order_number = str(uuid.uuid4().hex[:12].upper())
-        super().save(*args, **kwargs)
+        if self.order_number:
+            return super().save(*args, **kwargs)
+
+        # Generate unique order number, retrying on the rare collision
+        for attempt in range(ORDER_NUMBER_ATTEMPTS):
+            self.order_number = generate_order_number()
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                collided = Order.objects.filter(order_number=self.order_number).exists()
+                if not collided or attempt == ORDER_NUMBER_ATTEMPTS - 1:
+                    self.order_number = ''
+                    raise
 
 
 class OrderItem(models.Model):
@@ -0,0 +1,115 @@
+"""
+Order numbers and access tokens.
+
+Order numbers are 14 Crockford base32 characters, short enough to read out
+over the phone or type into the tracking page:
+
+    01J2X8K5  M4QZ7  T
+    timestamp random check
+
+- 8 characters (40 bits) of milliseconds since 2026-01-01 (good until
+  2060), so new numbers sort by creation time and land at the right edge
+  of the unique index instead of on random pages;
+- 5 random characters (25 bits), so numbers of the same millisecond do not
+  collide (Order.save() retries the rare one that does) and are not simply
+  consecutive;
+- 1 Luhn mod 32 check character, which catches every single-character typo
+  and most swapped neighbours before the tracking page touches the database.
+
+The alphabet has no I, L, O or U, and lookups read I/L as 1 and O as 0, so
+numbers copied by hand still match.
+
+An order number is easy to guess from the time of the order, so it is not
+what guards the success and status pages: their URLs carry the order's
+``access_token`` (128 random bits) instead.
+
+Existing orders keep their numbers: 12-character hex numbers and the
+13-character numbers of the first base32 scheme (4 random characters) are
+printed in confirmation emails, so they are never rewritten. The formats
+differ in length, so all stay valid in the same column and no data
+migration is needed.
+"""
+import secrets
+import time
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+ORDER_NUMBER_LENGTH = 14
+LEGACY_ORDER_NUMBER_LENGTH = 12
+# Numbers of the first base32 scheme, with 4 random characters
+SHORT_ORDER_NUMBER_LENGTH = 13
+
+EPOCH_MS = 1767225600000  # 2026-01-01T00:00:00Z
+TIMESTAMP_CHARS = 8
+RANDOM_CHARS = 5
+RANDOM_MAX = 32 ** RANDOM_CHARS
+
+# Bytes of randomness in an order's access token
+ACCESS_TOKEN_BYTES = 16
+
+_DECODE = {char: value for value, char in enumerate(ALPHABET)}
+_DECODE.update({'I': 1, 'L': 1, 'O': 0})
+_TYPO_MAP = str.maketrans({'I': '1', 'L': '1', 'O': '0', '-': None, ' ': None})
+
+
+def _encode(value, length):
+    chars = []
+    for _ in range(length):
+        value, remainder = divmod(value, 32)
+        chars.append(ALPHABET[remainder])
+    return ''.join(reversed(chars))
+
+
+def check_character(body):
+    """Luhn mod 32 check character for ``body``."""
+    total = 0
+    factor = 2
+    for char in reversed(body):
+        addend = factor * _DECODE[char]
+        total += addend // 32 + addend % 32
+        factor = 1 if factor == 2 else 2
+    return ALPHABET[-total % 32]
+
+
+def generate_order_number(now_ms=None):
+    """
+    New time-ordered order number. Numbers of the same millisecond share
+    their timestamp and are in random order among themselves.
+    """
+    if now_ms is None:
+        now_ms = time.time_ns() // 1_000_000
+    return format_order_number(now_ms, secrets.randbelow(RANDOM_MAX))
+
+
+def generate_access_token():
+    """New access token for the success and status pages of an order."""
+    return secrets.token_urlsafe(ACCESS_TOKEN_BYTES)
+
+
+def format_order_number(timestamp_ms, random_part):
+    """
+    Order number for a Unix time in milliseconds (not before EPOCH_MS) and
+    a random part below RANDOM_MAX. Used directly by the data generator.
+    """
+    body = _encode(timestamp_ms - EPOCH_MS, TIMESTAMP_CHARS) + _encode(random_part, RANDOM_CHARS)
+    return body + check_character(body)
+
+
+def normalize_order_number(value):
+    """
+    Canonical form of a typed order number: upper case, no spaces or
+    dashes, I/L read as 1 and O as 0.
+    """
+    return value.strip().upper().translate(_TYPO_MAP)
+
+
+def is_valid_order_number(value):
+    """
+    True if a normalized ``value`` could be an order number, in the
+    current, the short base32 or the legacy hex format.
+    """
+    if len(value) == LEGACY_ORDER_NUMBER_LENGTH:
+        return all(char in '0123456789ABCDEF' for char in value)
+    if len(value) in (ORDER_NUMBER_LENGTH, SHORT_ORDER_NUMBER_LENGTH):
+        body, check = value[:-1], value[-1]
+        return all(char in ALPHABET for char in body) and check_character(body) == check
+    return False
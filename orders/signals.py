@@ -0,0 +1,9 @@
+from django.dispatch import Signal
+
+# Sent by orders.lifecycle whenever an order moves to a new status.
+# Receivers get ``order`` (the saved instance) and ``previous_status``.
+order_status_changed = Signal()
+
+# Sent by the checkout when a visitor applies a valid discount code that
+# their session did not have yet. Receivers get ``discount_code``.
+discount_code_applied = Signal()
@@ -0,0 +1,126 @@
+"""
+Order status notifications for the success and tracking pages.
+
+Every status change sent through ``order_status_changed`` is written to the
+cache once the transaction commits. Browsers wait for it with a long-poll
+request (WSGI) or a Server-Sent Events stream (ASGI). Orders are keyed by
+their access token, which the status URLs carry:
+
+- waiters in the process that handled the webhook are woken immediately;
+- waiters in other worker processes see the change on their next cache
+  check, every ``POLL_INTERVAL`` seconds, when the cache is shared
+  (set REDIS_URL);
+- a waiter that times out re-reads the order from the database once, so a
+  per-process cache never hides a status change for longer than the timeout.
+"""
+import asyncio
+import threading
+import time
+from contextlib import suppress
+
+from django.core.cache import cache
+from django.db import transaction
+from django.dispatch import receiver
+from .models import Order
+from .signals import order_status_changed
+
+# Seconds between cache checks while a request is waiting
+POLL_INTERVAL = 0.25
+
+# How long published statuses stay in the cache
+STATUS_CACHE_TIMEOUT = 60 * 60
+
+_condition = threading.Condition()
+_async_waiters = set()
+
+
+def _cache_key(access_token):
+    return f'order-status:{access_token}'
+
+
+def publish(access_token, status):
+    """
+    Record a status change and wake up every request waiting in this process.
+    """
+    cache.set(_cache_key(access_token), status, STATUS_CACHE_TIMEOUT)
+    with _condition:
+        _condition.notify_all()
+    for loop, event in list(_async_waiters):
+        loop.call_soon_threadsafe(event.set)
+
+
+@receiver(order_status_changed)
+def publish_status_change(sender, order, previous_status, **kwargs):
+    """Publish transitions once they are committed, never before."""
+    access_token, status = order.access_token, order.status
+    transaction.on_commit(lambda: publish(access_token, status))
+
+
+def get_status(access_token):
+    """
+    Current status from the cache, falling back to a single database read.
+    Returns None if the order does not exist.
+    """
+    status = cache.get(_cache_key(access_token))
+    if status is None:
+        status = _read_status(access_token)
+    return status
+
+
+def _read_status(access_token):
+    status = Order.objects.filter(access_token=access_token).values_list('status', flat=True).first()
+    if status is not None:
+        cache.set(_cache_key(access_token), status, STATUS_CACHE_TIMEOUT)
+    return status
+
+
+def wait_for_status_change(access_token, known_status, timeout):
+    """
+    Block until the order's status differs from ``known_status`` or
+    ``timeout`` seconds pass. Returns the latest status either way.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        status = cache.get(_cache_key(access_token))
+        if status is not None and status != known_status:
+            return status
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return _read_status(access_token)
+
+        with _condition:
+            _condition.wait(min(POLL_INTERVAL, remaining))
+
+
+async def astatus_changes(access_token, known_status, timeout):
+    """
+    Async generator yielding each new status of an order until ``timeout``
+    seconds pass. Used by the SSE stream under ASGI.
+    """
+    loop = asyncio.get_running_loop()
+    event = asyncio.Event()
+    waiter = (loop, event)
+    _async_waiters.add(waiter)
+    try:
+        deadline = loop.time() + timeout
+        while True:
+            status = await cache.aget(_cache_key(access_token))
+            if status is not None and status != known_status:
+                known_status = status
+                yield status
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+
+            event.clear()
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(event.wait(), min(POLL_INTERVAL, remaining))
+
+        status = await Order.objects.filter(access_token=access_token).values_list('status', flat=True).afirst()
+        if status is not None and status != known_status:
+            await cache.aset(_cache_key(access_token), status, STATUS_CACHE_TIMEOUT)
+            yield status
+    finally:
+        _async_waiters.discard(waiter)
@@ -1,3 +1,304 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from zlato.testing import CART_SIZES, QueryBudgetMixin, create_cart, create_order
+from .lifecycle import purge_cancelled_orders
+from .order_numbers import (
+    ALPHABET, EPOCH_MS, check_character, generate_order_number, is_valid_order_number, normalize_order_number,
+)
+from .models import DiscountCode, Order
+from .signals import order_status_changed
+from . import exports
+from . import urls
+
+CHECKOUT_FORM = {
+    'customer_name': 'Test Customer',
+    'customer_email': 'customer@example.com',
+    'customer_phone': '0888000000',
+    'shipping_address': 'ul. Test 1',
+    'shipping_city': 'София',
+    'shipping_postal_code': '1000',
+}
+
+
+def fake_checkout_session(**kwargs):
+    return SimpleNamespace(id='cs_test', payment_intent='pi_test')
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET='whsec_test', ORDER_STATUS_WAIT_SECONDS=0)
+class OrderQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    Checkout, payment and order pages run the same number of queries for
+    carts and orders of 1, 10 or 100 lines. Stripe is faked.
+    """
+
+    def test_every_url_is_tested(self):
+        self.assertEveryUrlTested(urls.urlpatterns)
+
+    def test_checkout(self):
+        def scenario(lines):
+            client = self.client_class()
+            create_cart(client, lines)
+            return lambda: client.get(reverse('orders:checkout'))
+        for response in self.assertConstantQueries(scenario, CART_SIZES):
+            self.assertEqual(response.status_code, 200)
+
+    def test_apply_discount(self):
+        now = timezone.now()
+        DiscountCode.objects.create(
+            code='SAVE10', discount_percentage=10,
+            valid_from=now - timedelta(days=1), valid_to=now + timedelta(days=1),
+        )
+
+        def scenario(lines):
+            client = self.client_class()
+            create_cart(client, lines)
+            return lambda: client.post(reverse('orders:apply_discount'), {'code': 'save10'})
+        for response in self.assertConstantQueries(scenario, CART_SIZES):
+            self.assertTrue(response.json()['success'])
+
+    def test_remove_discount(self):
+        def scenario(lines):
+            client = self.client_class()
+            create_cart(client, lines)
+            return lambda: client.post(reverse('orders:remove_discount'))
+        self.assertConstantQueries(scenario, CART_SIZES)
+
+    @mock.patch('stripe.checkout.Session.create', side_effect=fake_checkout_session)
+    def test_create_checkout_session(self, create_session):
+        def scenario(lines):
+            client = self.client_class()
+            create_cart(client, lines)
+            return lambda: client.post(reverse('orders:create_checkout_session'), CHECKOUT_FORM)
+        for response in self.assertConstantQueries(scenario, CART_SIZES):
+            self.assertEqual(response.json(), {'sessionId': 'cs_test'})
+        self.assertEqual(create_session.call_count, len(CART_SIZES))
+
+    def test_success(self):
+        def scenario(items):
+            order = create_order(items)
+            session = SimpleNamespace(
+                client_reference_id=order.order_number, payment_status='paid', payment_intent='pi_test',
+            )
+            url = reverse('orders:success', args=[order.access_token]) + '?session_id=cs_test'
+
+            def request():
+                with mock.patch('stripe.checkout.Session.retrieve', return_value=session):
+                    return self.client.get(url)
+            return request
+        for response in self.assertConstantQueries(scenario, CART_SIZES):
+            self.assertEqual(response.context['order'].status, 'paid')
+
+    def test_status(self):
+        def scenario(items):
+            order = create_order(items)
+            return lambda: self.client.get(reverse('orders:status', args=[order.access_token]))
+        for response in self.assertConstantQueries(scenario, CART_SIZES):
+            self.assertEqual(response.json()['status'], 'pending')
+
+    def test_status_stream(self):
+        async def read_stream(url):
+            response = await self.async_client.get(url)
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        def scenario(items):
+            order = create_order(items)
+            url = reverse('orders:status_stream', args=[order.access_token])
+            return lambda: async_to_sync(read_stream)(url)
+        for body in self.assertConstantQueries(scenario, CART_SIZES):
+            self.assertIn(b'"status": "pending"', body)
+
+    def test_track(self):
+        def scenario(items):
+            order = create_order(items)
+            return lambda: self.client.get(reverse('orders:track'), {'order_number': order.order_number})
+        for response in self.assertConstantQueries(scenario, CART_SIZES):
+            self.assertIsNotNone(response.context['order'])
+
+    def test_stripe_webhook(self):
+        # The view answers 200 even when it finds nothing to do, so check
+        # that each measured request really marked its order as paid
+        paid = []
+
+        def record(order, **kwargs):
+            if order.status == 'paid':
+                paid.append(order.order_number)
+        order_status_changed.connect(record, sender=Order)
+        self.addCleanup(order_status_changed.disconnect, record, sender=Order)
+
+        orders = []
+
+        def scenario(items):
+            order = create_order(items)
+            orders.append(order.order_number)
+            event = {
+                'type': 'checkout.session.completed',
+                'data': {'object': {'client_reference_id': order.order_number, 'payment_intent': 'pi_test'}},
+            }
+
+            def request():
+                with mock.patch('stripe.Webhook.construct_event', return_value=event):
+                    return self.client.post(
+                        reverse('orders:stripe_webhook'), b'{}',
+                        content_type='application/json', HTTP_STRIPE_SIGNATURE='t=0,v1=test',
+                    )
+            return request
+        for response in self.assertConstantQueries(scenario, CART_SIZES):
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(paid, orders)
+
+
+class OrderNumberTests(TestCase):
+    def random_part(self, number):
+        value = 0
+        for char in number[8:13]:
+            value = value * 32 + ALPHABET.index(char)
+        return value
+
+    def test_numbers_of_the_same_millisecond(self):
+        numbers = [generate_order_number(EPOCH_MS + 1000) for _ in range(100)]
+        self.assertTrue(all(len(number) == 14 and is_valid_order_number(number) for number in numbers))
+        self.assertEqual({number[:8] for number in numbers}, {numbers[0][:8]})
+        # Unrelated random parts, not a counter
+        randoms = sorted(self.random_part(number) for number in numbers)
+        self.assertGreater(len(set(randoms)), 95)
+        self.assertLess(sum(b - a == 1 for a, b in zip(randoms, randoms[1:])), 3)
+        self.assertLess(generate_order_number(EPOCH_MS + 1000), generate_order_number(EPOCH_MS + 1001))
+
+    def test_typos_and_older_formats(self):
+        number = generate_order_number()
+        typo = number[:3] + ALPHABET[(ALPHABET.index(number[3]) + 1) % 32] + number[4:]
+        self.assertFalse(is_valid_order_number(typo))
+        self.assertEqual(normalize_order_number(f' {number[:8].lower()}-{number[8:]} '), number)
+        self.assertTrue(is_valid_order_number('0A1B2C3D4E5F'))
+        short = '01J2X8K5M4QZ'
+        self.assertTrue(is_valid_order_number(short + check_character(short)))
+
+    def test_pages_need_the_access_token(self):
+        order = create_order(1)
+        self.assertNotEqual(order.access_token, create_order(1).access_token)
+        self.assertEqual(self.client.get(reverse('orders:success', args=[order.access_token])).status_code, 200)
+        for name in ['orders:success', 'orders:status']:
+            self.assertEqual(self.client.get(reverse(name, args=[order.order_number])).status_code, 404)
+        # The tracking page still finds it by the typed number
+        response = self.client.post(reverse('orders:track'), {'order_number': order.order_number.lower()})
+        self.assertEqual(response.context['order'], order)
+
+
+class OrderLifecycleTests(TestCase):
+    """Abandoned orders are cancelled, give back their discount use and are purged once unpaid."""
+
+    def setUp(self):
+        now = timezone.now()
+        self.code = DiscountCode.objects.create(
+            code='SAVE10', discount_percentage=10, times_used=3,
+            valid_from=now - timedelta(days=1), valid_to=now + timedelta(days=1),
+        )
+
+    def order(self, status='pending', age=timedelta(0), **fields):
+        order = create_order(1, status=status, discount_code=self.code, **fields)
+        then = timezone.now() - age
+        Order.objects.filter(pk=order.pk).update(created_at=then, updated_at=then)
+        return order
+
+    def statuses(self, *orders):
+        return [Order.objects.filter(pk=order.pk).values_list('status', flat=True).first() for order in orders]
+
+    def test_stale_pending_orders_are_cancelled(self):
+        stale, stale_too = self.order(age=timedelta(hours=30)), self.order(age=timedelta(hours=30))
+        recent = self.order(age=timedelta(hours=1))
+        paid = self.order(status='paid', age=timedelta(hours=30), paid_at=timezone.now())
+
+        call_command('expire_pending_orders', '--older-than-hours', '24', '--batch-size', '1', stdout=io.StringIO())
+        self.assertEqual(self.statuses(stale, stale_too, recent, paid), ['cancelled', 'cancelled', 'pending', 'paid'])
+        self.code.refresh_from_db()
+        self.assertEqual(self.code.times_used, 1)
+
+    def test_purge_only_deletes_unpaid_cancelled_orders(self):
+        old = timedelta(days=40)
+        unpaid = self.order(status='cancelled', age=old)
+        refunded = self.order(status='cancelled', age=old, paid_at=timezone.now() - old)
+        recent = self.order(status='cancelled', age=timedelta(days=1))
+        pending = self.order(age=old)
+
+        purge_cancelled_orders(timezone.now() - timedelta(days=30))
+        self.assertEqual(self.statuses(unpaid, refunded, recent, pending), [None, 'cancelled', 'cancelled', 'pending'])
+
+    def test_expired_checkout_session(self):
+        order = self.order()
+        event = {'type': 'checkout.session.expired', 'data': {'object': {'client_reference_id': order.order_number}}}
+        with override_settings(STRIPE_WEBHOOK_SECRET='whsec_test'), \
+                mock.patch('stripe.Webhook.construct_event', return_value=event):
+            for _ in range(2):
+                # A redelivered event changes nothing
+                response = self.client.post(
+                    reverse('orders:stripe_webhook'), b'{}',
+                    content_type='application/json', HTTP_STRIPE_SIGNATURE='t=0,v1=test',
+                )
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.statuses(order), ['cancelled'])
+        self.code.refresh_from_db()
+        self.assertEqual(self.code.times_used, 2)
+
+
+class OrderExportTests(TestCase):
+    """Accounting exports have one row per order line."""
+
+    def setUp(self):
+        now = timezone.now()
+        self.code = DiscountCode.objects.create(
+            code='MARIA10', discount_percentage=10,
+            valid_from=now - timedelta(days=1), valid_to=now + timedelta(days=1),
+        )
+        self.paid = create_order(2, status='paid', discount_code=self.code)
+        self.pending = create_order(1)
+
+    def export(self, orders):
+        return b''.join(exports.stream_csv(exports.export_rows(orders))).decode('utf-8-sig').splitlines()
+
+    def test_rows(self):
+        header, *lines = self.export(Order.objects.filter(pk=self.paid.pk))
+        self.assertEqual(header.split(','), exports.HEADER)
+        self.assertEqual(len(lines), 2)
+        order_number, *_, discount_code, subtotal, shipping, discount, total, product, price, quantity, line_total = (
+            lines[0].split(',')
+        )
+        self.assertEqual(order_number, self.paid.order_number)
+        self.assertEqual([discount_code, subtotal, total], ['MARIA10', '50.00', '50.00'])
+        self.assertEqual([price, quantity, line_total], ['12.50', '2', '25.00'])
+
+    def test_filters(self):
+        today = timezone.localdate()
+        filtered = exports.filter_orders(Order.objects.all(), today, today, ['paid'], 'maria10')
+        self.assertEqual(list(filtered), [self.paid])
+        self.assertFalse(exports.filter_orders(Order.objects.all(), today + timedelta(days=1)).exists())
+
+    def test_command(self):
+        stderr = io.StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'orders.csv')
+            call_command(
+                'export_orders', '--month', f'{timezone.localdate():%Y-%m}', '--status', 'paid',
+                '-o', path, stderr=stderr,
+            )
+            with open(path, encoding='utf-8-sig') as stream:
+                self.assertEqual(len(stream.readlines()), 3)
+        self.assertIn('Exported 2 order lines', stderr.getvalue())
+
+    def test_admin_action(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        response = self.client.post(reverse('admin:orders_order_changelist'), {
+            'action': 'export_csv', '_selected_action': [self.paid.pk, self.pending.pk],
+        })
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(len(b''.join(response.streaming_content).decode('utf-8-sig').splitlines()), 4)
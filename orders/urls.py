@@ -8,7 +8,9 @@ urlpatterns = [
     path('apply-discount/', views.apply_discount_code, name='apply_discount'),
     path('remove-discount/', views.remove_discount_code, name='remove_discount'),
     path('create-checkout-session/', views.create_checkout_session, name='create_checkout_session'),
-    path('success/<str:order_number>/', views.order_success, name='success'),
+    path('success/<str:access_token>/', views.order_success, name='success'),
+    path('status/<str:access_token>/', views.order_status, name='status'),
+    path('status/<str:access_token>/stream/', views.order_status_stream, name='status_stream'),
     path('track/', views.track_order, name='track'),
     path('webhook/stripe/', views.stripe_webhook, name='stripe_webhook'),
 ]
@@ -1,15 +1,24 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse, Http404
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
-from django.utils import timezone
+from django.db.models import F, prefetch_related_objects
+from django.urls import reverse
 from cart.views import get_or_create_cart
 from shipping.models import ShippingRate
 from .models import Order, OrderItem, DiscountCode
 from .emails import send_order_confirmation, send_admin_notification
+from .lifecycle import mark_order_paid, cancel_orders, release_discount_usage
+from .signals import discount_code_applied
+from .order_numbers import normalize_order_number, is_valid_order_number
+from . import status_events
+from asgiref.sync import sync_to_async
+from zlato.perf import external
+from monitoring import metrics
 from decimal import Decimal
 import stripe
+import json
 import logging
 
 stripe.api_key = getattr(settings, 'STRIPE_SECRET_KEY', '')
@@ -24,6 +33,7 @@ def checkout(request):
 
     if not cart.items.exists():
         return redirect('cart:view')
+    prefetch_related_objects([cart], 'items__product')
 
     # Calculate totals
     subtotal = cart.subtotal
@@ -74,6 +84,8 @@ def apply_discount_code(request):
 
         if is_valid:
             # Store in session
+            if request.session.get('discount_code_id') != discount_code.id:
+                discount_code_applied.send(sender=DiscountCode, discount_code=discount_code)
             request.session['discount_code_id'] = discount_code.id
             return JsonResponse({
                 'success': True,
@@ -115,6 +127,7 @@ def create_checkout_session(request):
 
     if not cart.items.exists():
         return JsonResponse({'error': 'Cart is empty'}, status=400)
+    prefetch_related_objects([cart], 'items__product')
 
     # Get form data
     customer_name = request.POST.get('customer_name')
@@ -164,45 +177,48 @@ def create_checkout_session(request):
         discount_code=discount_code,
         status='pending'
     )
+    metrics.ORDERS_CREATED.inc()
 
     # Create order items
-    for cart_item in cart.items.all():
-        OrderItem.objects.create(
+    OrderItem.objects.bulk_create([
+        OrderItem(
             order=order,
             product=cart_item.product,
             product_name=cart_item.product.name,
             product_price=cart_item.product.price,
             quantity=cart_item.quantity
         )
+        for cart_item in cart.items.all()
+    ])
 
-    # Increment discount code usage
+    # Increment discount code usage (released again if the order is cancelled)
     if discount_code:
-        discount_code.times_used += 1
-        discount_code.save()
+        DiscountCode.objects.filter(id=discount_code.id).update(times_used=F('times_used') + 1)
 
     try:
         # Create Stripe checkout session
-        checkout_session = stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            line_items=[
-                {
-                    'price_data': {
-                        'currency': 'bgn',
-                        'unit_amount': int(total * 100),  # Convert to cents
-                        'product_data': {
-                            'name': f'ZLATO Order #{order.order_number}',
-                            'description': f'Order for {customer_name}',
+        with external('stripe'), metrics.CHECKOUT_SESSION_SECONDS.time():
+            checkout_session = stripe.checkout.Session.create(
+                payment_method_types=['card'],
+                line_items=[
+                    {
+                        'price_data': {
+                            'currency': 'bgn',
+                            'unit_amount': int(total * 100),  # Convert to cents
+                            'product_data': {
+                                'name': f'ZLATO Order #{order.order_number}',
+                                'description': f'Order for {customer_name}',
+                            },
                         },
+                        'quantity': 1,
                     },
-                    'quantity': 1,
-                },
-            ],
-            mode='payment',
-            success_url=request.build_absolute_uri(f'/orders/success/{order.order_number}/'),
-            cancel_url=request.build_absolute_uri('/payment-failed/'),
-            client_reference_id=order.order_number,
-            customer_email=customer_email,
-        )
+                ],
+                mode='payment',
+                success_url=request.build_absolute_uri(reverse('orders:success', args=[order.access_token])) + '?session_id={CHECKOUT_SESSION_ID}',
+                cancel_url=request.build_absolute_uri('/payment-failed/'),
+                client_reference_id=order.order_number,
+                customer_email=customer_email,
+            )
 
         # Save Stripe payment intent ID
         order.stripe_payment_intent_id = checkout_session.payment_intent
@@ -218,11 +234,27 @@ def create_checkout_session(request):
         })
 
     except Exception as e:
-        # If Stripe fails, delete the order
+        # If Stripe fails, delete the order and give back its discount use
+        release_discount_usage([order.discount_code_id])
         order.delete()
         return JsonResponse({'error': str(e)}, status=400)
 
 
+def confirm_payment(order, payment_intent_id=''):
+    """
+    Mark an order as paid and send the confirmation emails.
+    Returns False if the order had already been confirmed.
+    """
+    paid_order = mark_order_paid(order, payment_intent_id)
+    if not paid_order:
+        return False
+
+    # Send confirmation emails
+    send_order_confirmation(paid_order)
+    send_admin_notification(paid_order)
+    return True
+
+
 @csrf_exempt
 @require_POST
 def stripe_webhook(request):
@@ -251,64 +283,135 @@ def stripe_webhook(request):
         logger.error('Invalid webhook signature')
         return HttpResponse(status=400)
 
+    with metrics.WEBHOOK_SECONDS.labels(metrics.webhook_event_label(event['type'])).time():
+        handle_webhook_event(event)
+
+    return HttpResponse(status=200)
+
+
+def handle_webhook_event(event):
+    """
+    Apply a verified Stripe event to its order.
+    """
     # Handle the checkout.session.completed event
     if event['type'] == 'checkout.session.completed':
         session = event['data']['object']
 
         # Get order by client_reference_id (order_number)
-        order_number = session.get('client_reference_id')
+        order_number = session['client_reference_id']
 
         if order_number:
             try:
                 order = Order.objects.get(order_number=order_number)
 
-                # Update order status to paid
-                order.status = 'paid'
-                order.paid_at = timezone.now()
-                order.stripe_payment_intent_id = session.get('payment_intent', '')
-                order.save()
-
-                # Update inventory for each product
-                for item in order.items.all():
-                    product = item.product
-                    if product.inventory >= item.quantity:
-                        product.inventory -= item.quantity
-                        product.save()
-                        logger.info(f'Updated inventory for {product.name}: -{item.quantity}')
-                    else:
-                        logger.warning(f'Insufficient inventory for {product.name}')
-
-                logger.info(f'Order {order_number} marked as paid via webhook')
-
-                # Send confirmation emails
-                send_order_confirmation(order)
-                send_admin_notification(order)
+                if confirm_payment(order, session['payment_intent'] or ''):
+                    logger.info('Order %s marked as paid via webhook', order_number)
+                else:
+                    logger.info('Order %s already processed, ignoring webhook', order_number)
 
             except Order.DoesNotExist:
-                logger.error(f'Order {order_number} not found for webhook')
+                logger.error('Order %s not found for webhook', order_number)
         else:
             logger.error('No client_reference_id in webhook session')
 
-    return HttpResponse(status=200)
+    # Handle abandoned checkouts: cancel the order and release its discount code
+    elif event['type'] == 'checkout.session.expired':
+        session = event['data']['object']
+        order_number = session['client_reference_id']
 
+        if order_number:
+            order_ids = Order.objects.filter(order_number=order_number).values_list('pk', flat=True)
+            if cancel_orders(order_ids):
+                logger.info('Order %s cancelled after checkout session expired', order_number)
+        else:
+            logger.error('No client_reference_id in webhook session')
 
-def order_success(request, order_number):
+
+def order_success(request, access_token):
     """
-    Order confirmation page after successful payment.
+    Order confirmation page after successful payment, found by the order's
+    access token. While the webhook is still on its way the page shows the
+    order as pending and subscribes to its status (see orders.status_events).
     """
-    order = get_object_or_404(Order, order_number=order_number)
+    order = get_object_or_404(Order, access_token=access_token)
 
-    # Mark order as paid (fallback if webhook hasn't fired yet)
-    if order.status == 'pending':
-        order.status = 'paid'
-        order.paid_at = timezone.now()
-        order.save()
+    # Verify with Stripe instead of trusting the redirect alone
+    session_id = request.GET.get('session_id')
+    if order.status == 'pending' and session_id:
+        try:
+            with external('stripe'):
+                session = stripe.checkout.Session.retrieve(session_id)
+            if session.client_reference_id == order.order_number and session.payment_status == 'paid':
+                if confirm_payment(order, session.payment_intent or ''):
+                    logger.info('Order %s marked as paid from success page', order.order_number)
+                order.refresh_from_db()
+        except Exception as e:
+            logger.warning('Could not verify checkout session for order %s: %s', order.order_number, e)
 
     return render(request, 'orders/success.html', {
-        'order': order
+        'order': order,
+        'order_status_sse': settings.ORDER_STATUS_SSE,
     })
 
 
+def order_status(request, access_token):
+    """
+    Long-poll endpoint for order status.
+    Returns as soon as the status differs from ``?status=``, or after
+    ORDER_STATUS_WAIT_SECONDS with the current status.
+    """
+    known_status = request.GET.get('status', '')
+
+    status = status_events.get_status(access_token)
+    if status is None:
+        raise Http404('Order not found')
+
+    if status == known_status:
+        status = status_events.wait_for_status_change(
+            access_token, known_status, settings.ORDER_STATUS_WAIT_SECONDS
+        )
+
+    return JsonResponse(_status_payload(status))
+
+
+async def order_status_stream(request, access_token):
+    """
+    Server-Sent Events stream of order status changes (requires ASGI).
+    The stream closes after ORDER_STATUS_WAIT_SECONDS and the browser reconnects.
+    """
+    known_status = request.GET.get('status', '')
+
+    status = await sync_to_async(status_events.get_status)(access_token)
+    if status is None:
+        raise Http404('Order not found')
+
+    async def events():
+        yield 'retry: 1000\n\n'
+        if status != known_status:
+            yield _sse_event(status)
+            return
+        async for new_status in status_events.astatus_changes(
+            access_token, known_status, settings.ORDER_STATUS_WAIT_SECONDS
+        ):
+            yield _sse_event(new_status)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _status_payload(status):
+    return {
+        'status': status,
+        'status_display': dict(Order.STATUS_CHOICES).get(status, status),
+    }
+
+
+def _sse_event(status):
+    return f'event: status\ndata: {json.dumps(_status_payload(status))}\n\n'
+
+
 def track_order(request):
     """
     Order tracking page - lookup order by order number.
@@ -316,18 +419,23 @@ def track_order(request):
     order = None
     error = None
 
-    if request.method == 'POST':
-        order_number = request.POST.get('order_number', '').strip().upper()
+    # GET with ?order_number= lets the page reload itself when the status changes
+    if request.method == 'POST' or 'order_number' in request.GET:
+        order_number = normalize_order_number(request.POST.get('order_number', request.GET.get('order_number', '')))
 
-        if order_number:
+        if not order_number:
+            error = 'Please enter an order number.'
+        elif not is_valid_order_number(order_number):
+            # Typos are caught by the check character without a database lookup
+            error = 'Order not found. Please check your order number and try again.'
+        else:
             try:
                 order = Order.objects.get(order_number=order_number)
             except Order.DoesNotExist:
                 error = 'Order not found. Please check your order number and try again.'
-        else:
-            error = 'Please enter an order number.'
 
     return render(request, 'orders/track.html', {
         'order': order,
-        'error': error
+        'error': error,
+        'order_status_sse': settings.ORDER_STATUS_SSE,
     })
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Product, ProductImage
+from . import bundles, search
+from .models import BundleComponent, Product, ProductImage, StockMovement
+from .stock import record_admin_change
 
 
 class ProductImageInline(admin.TabularInline):
@@ -11,6 +13,17 @@ class ProductImageInline(admin.TabularInline):
     fields = ['image', 'alt_text', 'order']
 
 
+class BundleComponentInline(admin.TabularInline):
+    """
+    Products in a bundle (gift box). A bundle with components takes its
+    stock from them, so its own inventory cannot be edited.
+    """
+    model = BundleComponent
+    fk_name = 'bundle'
+    extra = 0
+    autocomplete_fields = ['component']
+
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     """
@@ -22,7 +35,7 @@ class ProductAdmin(admin.ModelAdmin):
     search_fields = ['name', 'name_bg', 'description', 'description_bg']
     prepopulated_fields = {'slug': ('name',)}
     list_editable = ['is_active', 'featured', 'inventory']
-    inlines = [ProductImageInline]
+    inlines = [BundleComponentInline, ProductImageInline]
 
     fieldsets = (
         ('Product Type', {
@@ -46,6 +59,28 @@ class ProductAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_search_results(self, request, queryset, search_term):
+        # The search index instead of LIKE over search_fields; also used by the component autocomplete
+        if not search_term.strip():
+            return queryset, False
+        return search.search(queryset, search_term), False
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj and obj.components.exists():
+            return ['inventory']
+        return []
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and 'inventory' in form.changed_data:
+            record_admin_change(obj, form.initial['inventory'])
+            bundles.refresh([obj.pk])
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # The components may have changed
+        bundles.refresh([form.instance.pk])
+
     def in_stock(self, obj):
         """Display stock status with color indicator"""
         if obj.in_stock:
@@ -63,3 +98,21 @@ class ProductImageAdmin(admin.ModelAdmin):
     list_display = ['product', 'image', 'order']
     list_filter = ['product']
     search_fields = ['product__name', 'alt_text']
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    """
+    Read-only audit trail of inventory changes from stock feeds and the admin.
+    """
+    list_display = ['product', 'previous', 'inventory', 'delta', 'source', 'created_at']
+    list_filter = ['source', 'created_at']
+    search_fields = ['product__name', 'product__slug', 'source']
+    list_select_related = ['product']
+    date_hierarchy = 'created_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
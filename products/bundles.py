@@ -0,0 +1,59 @@
+"""
+Bundle (gift box) stock.
+
+A bundle with BundleComponent rows is made up from the stock of its
+components. Its ``Product.inventory`` is kept at the number of boxes the
+components make up::
+
+    inventory(bundle) = min(inventory(component) // quantity)
+
+so listing pages, the cart and the shop sort orders read it like any other
+product's stock. ``expand()`` turns ordered quantities into the stock they
+take, which is how paying for a bundle takes its components out of stock.
+``refresh()`` recomputes the bundles affected by a stock change with one
+UPDATE; orders.lifecycle, stock feeds, catalog imports and the admin call
+it in the transaction that changes the stock.
+"""
+from collections import Counter
+
+from django.db.models import F, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Greatest
+from .models import BundleComponent, Product
+
+
+def expand(quantities):
+    """
+    Stock taken by ``quantities`` (product id -> units): bundles are
+    replaced by their components, other products count as themselves.
+    """
+    stock = Counter()
+    components = BundleComponent.objects.filter(bundle__in=list(quantities)).values_list(
+        'bundle_id', 'component_id', 'quantity',
+    )
+    bundles = set()
+    for bundle_id, component_id, quantity in components:
+        bundles.add(bundle_id)
+        stock[component_id] += quantity * quantities[bundle_id]
+    for product_id, quantity in quantities.items():
+        if product_id not in bundles:
+            stock[product_id] += quantity
+    return stock
+
+
+def refresh(product_ids=None):
+    """
+    Recompute the inventory of the bundles that contain or are one of
+    ``product_ids`` (every bundle for None). Returns the number of bundles
+    updated.
+    """
+    affected = BundleComponent.objects.all()
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        affected = affected.filter(Q(component__in=product_ids) | Q(bundle__in=product_ids))
+    boxes = (
+        BundleComponent.objects.filter(bundle=OuterRef('pk'))
+        .values('bundle')
+        .annotate(boxes=Min(Greatest(F('component__inventory'), 0) / F('quantity')))
+        .values('boxes')
+    )
+    return Product.objects.filter(pk__in=affected.values('bundle')).update(inventory=Subquery(boxes))
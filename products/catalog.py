@@ -0,0 +1,329 @@
+"""
+Catalog import and export.
+
+Products are matched by slug (the SKU). One format goes both ways:
+
+- CSV: one row per product with the columns in FIELDS; ``images`` holds the
+  gallery image paths separated by ``|``
+- JSON: a list of objects with the same keys; ``images`` is a list of paths
+  or of ``{"image": ..., "alt_text": ...}`` objects. Django fixtures such as
+  products/fixtures/products.json are read as well.
+
+Importing is two steps. ``plan()`` validates the records and diffs them
+against the database a chunk at a time without writing anything;
+``apply()`` then upserts the new and changed products with
+``bulk_create(update_conflicts=True)`` and replaces changed galleries.
+Columns missing from the file are left as they are.
+"""
+import csv
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_slug
+from django.db import transaction
+from . import bundles, search
+from .models import Product, ProductImage
+
+FIELDS = [
+    'slug', 'name', 'name_bg', 'product_type', 'short_description', 'short_description_bg',
+    'description', 'description_bg', 'price', 'inventory', 'image', 'is_active', 'featured',
+]
+REQUIRED_FIELDS = ['slug', 'name', 'price']
+IMAGE_SEPARATOR = '|'
+
+FORMATS = ['csv', 'json']
+
+_MODEL_FIELDS = {name: Product._meta.get_field(name) for name in FIELDS}
+_CHOICES = {name: dict(field.choices) for name, field in _MODEL_FIELDS.items() if field.choices}
+
+
+class CatalogError(Exception):
+    """Invalid catalog file; ``errors`` lists the problems per record."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f'{len(errors)} invalid records')
+
+
+class CatalogDiff:
+    """What importing a catalog would change."""
+
+    def __init__(self):
+        self.created = []    # records of new products
+        self.updated = []    # (record, changed fields) of existing products
+        self.unchanged = 0
+        self.galleries = {}  # slug -> images, for galleries that change
+        self.missing = []    # slugs in the database but not in the file
+
+    @property
+    def has_changes(self):
+        return bool(self.created or self.updated or self.galleries)
+
+
+def detect_format(path):
+    """'csv' or 'json' from a file name."""
+    return 'csv' if str(path).lower().endswith('.csv') else 'json'
+
+
+# Reading
+
+def read_records(stream, fmt):
+    """Raw records from a CSV or JSON stream."""
+    if fmt == 'csv':
+        return _read_csv(stream)
+    return _read_json(stream)
+
+
+def _read_csv(stream):
+    for row in csv.DictReader(stream):
+        record = {key: value for key, value in row.items() if key in FIELDS}
+        if row.get('images') is not None:
+            record['images'] = [path for path in row['images'].split(IMAGE_SEPARATOR) if path]
+        yield record
+
+
+def _read_json(stream):
+    data = json.load(stream)
+    if data and 'model' in data[0]:
+        yield from _read_fixture(data)
+    else:
+        yield from data
+
+
+def _read_fixture(data):
+    """Products and their gallery images from a Django fixture."""
+    products = {}
+    for entry in data:
+        if entry['model'] == 'products.product':
+            products[entry['pk']] = {key: value for key, value in entry['fields'].items() if key in FIELDS}
+    images = {}
+    for entry in data:
+        if entry['model'] == 'products.productimage':
+            fields = entry['fields']
+            images.setdefault(fields['product'], []).append(fields)
+    for pk, gallery in images.items():
+        if pk in products:
+            gallery.sort(key=lambda fields: fields.get('order', 0))
+            products[pk]['images'] = [
+                {'image': fields['image'], 'alt_text': fields.get('alt_text', '')} for fields in gallery
+            ]
+    return products.values()
+
+
+def clean(record):
+    """
+    Record with values converted to Python types. Raises ValidationError
+    for bad values; required fields are checked in plan() since they only
+    matter for new products.
+    """
+    cleaned, errors = {}, []
+    for name, value in record.items():
+        if name == 'images':
+            cleaned[name] = [_clean_image(image) for image in value or []]
+            continue
+        field = _MODEL_FIELDS[name]
+        if value is None and field.null:
+            value = ''
+        try:
+            value = field.to_python(value)
+            if name == 'slug':
+                validate_slug(value)
+            if field.choices and value not in _CHOICES[name]:
+                raise ValidationError(f'{value!r} is not one of {", ".join(_CHOICES[name])}')
+        except ValidationError as error:
+            errors.extend(f'{name}: {message}' for message in error.messages)
+        cleaned[name] = value
+    if errors:
+        raise ValidationError(errors)
+    return cleaned
+
+
+def _clean_image(image):
+    if isinstance(image, str):
+        return {'image': image, 'alt_text': ''}
+    return {'image': image['image'], 'alt_text': image.get('alt_text', '')}
+
+
+# Diffing
+
+def plan(records, chunk_size=1000):
+    """
+    Validate ``records`` and diff them against the database.
+    Raises CatalogError listing every invalid record.
+    """
+    diff, errors, seen = CatalogDiff(), [], set()
+    chunk = []
+    for number, record in enumerate(records, start=1):
+        try:
+            record = clean(record)
+        except ValidationError as error:
+            errors.append((number, record.get('slug', ''), error.messages))
+            continue
+        slug = record.get('slug')
+        if not slug:
+            errors.append((number, '', ['slug: This field is required.']))
+            continue
+        if slug in seen:
+            errors.append((number, slug, ['slug: Duplicate slug in the file.']))
+            continue
+        seen.add(slug)
+        chunk.append((number, record))
+        if len(chunk) >= chunk_size:
+            _diff_chunk(chunk, diff, errors)
+            chunk = []
+    if chunk:
+        _diff_chunk(chunk, diff, errors)
+    if errors:
+        raise CatalogError(errors)
+
+    existing = Product.objects.values_list('slug', flat=True).order_by('slug')
+    diff.missing = [slug for slug in existing.iterator(chunk_size=chunk_size) if slug not in seen]
+    return diff
+
+
+def _diff_chunk(chunk, diff, errors):
+    slugs = [record['slug'] for _, record in chunk]
+    current = {row['slug']: row for row in Product.objects.filter(slug__in=slugs).values(*FIELDS)}
+    galleries = {}
+    images = ProductImage.objects.filter(product__slug__in=slugs).order_by('order', 'id')
+    for slug, image, alt_text in images.values_list('product__slug', 'image', 'alt_text'):
+        galleries.setdefault(slug, []).append({'image': image, 'alt_text': alt_text})
+
+    for number, record in chunk:
+        slug = record['slug']
+        fields = {name: value for name, value in record.items() if name != 'images'}
+        row = current.get(slug)
+        if row is None:
+            missing = [name for name in REQUIRED_FIELDS if fields.get(name) in (None, '')]
+            if missing:
+                errors.append((number, slug, [f'{name}: This field is required.' for name in missing]))
+                continue
+            diff.created.append(record)
+        else:
+            changed = [name for name, value in fields.items() if value != _stored(row, name)]
+            if changed:
+                diff.updated.append((record, changed))
+        if 'images' in record and _gallery_changed(galleries.get(slug, []), record['images']):
+            diff.galleries[slug] = record['images']
+        elif row is not None and not changed:
+            diff.unchanged += 1
+
+
+def _stored(row, name):
+    # Products without a main image have NULL in the database
+    if name == 'image':
+        return row[name] or ''
+    return row[name]
+
+
+def _gallery_changed(current, images):
+    """Alt texts only count when the file gives them."""
+    if [image['image'] for image in current] != [image['image'] for image in images]:
+        return True
+    return any(new['alt_text'] and new['alt_text'] != old['alt_text'] for old, new in zip(current, images))
+
+
+# Applying
+
+def apply(diff, chunk_size=1000):
+    """Write ``diff`` to the database in one transaction."""
+    with transaction.atomic():
+        _upsert(diff.created + [record for record, _ in diff.updated], chunk_size)
+        _replace_galleries(diff.galleries, chunk_size)
+        # Bundles made up from the imported stock
+        bundles.refresh()
+
+
+def _upsert(records, chunk_size):
+    for start in range(0, len(records), chunk_size):
+        batch = records[start:start + chunk_size]
+        update_fields = sorted({name for record in batch for name in record if name not in ('slug', 'images')})
+        # Rows without a column keep their current value: fill it in from the database
+        current = {}
+        if any(len(record) - ('images' in record) < len(FIELDS) for record in batch):
+            current = {
+                row['slug']: row
+                for row in Product.objects.filter(slug__in=[record['slug'] for record in batch]).values(*FIELDS)
+            }
+        products = []
+        for record in batch:
+            values = {**current.get(record['slug'], {}), **record}
+            values.pop('images', None)
+            product = Product(**values)
+            search.update_document(product)
+            products.append(product)
+        Product.objects.bulk_create(
+            products,
+            update_conflicts=True,
+            unique_fields=['slug'],
+            update_fields=update_fields + ['search_title', 'search_document', 'updated_at'],
+        )
+
+
+def _replace_galleries(galleries, chunk_size):
+    slugs = list(galleries)
+    for start in range(0, len(slugs), chunk_size):
+        batch = slugs[start:start + chunk_size]
+        ids = dict(Product.objects.filter(slug__in=batch).values_list('slug', 'id'))
+        ProductImage.objects.filter(product_id__in=ids.values()).delete()
+        ProductImage.objects.bulk_create(
+            [
+                ProductImage(product_id=ids[slug], image=image['image'], alt_text=image['alt_text'], order=order)
+                for slug in batch
+                for order, image in enumerate(galleries[slug])
+            ],
+            batch_size=chunk_size,
+        )
+
+
+def deactivate(slugs, chunk_size=1000):
+    """Hide products that are no longer in the catalog. They stay for past orders."""
+    updated = 0
+    for start in range(0, len(slugs), chunk_size):
+        updated += Product.objects.filter(slug__in=slugs[start:start + chunk_size], is_active=True).update(is_active=False)
+    return updated
+
+
+# Exporting
+
+def export_records(queryset=None, chunk_size=1000):
+    """
+    Catalog records with their galleries, streamed from the database in
+    chunks of ``chunk_size`` products (keyset pagination on id).
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+    queryset = queryset.order_by('id').values('id', *FIELDS)
+    last_id = 0
+    while rows := list(queryset.filter(id__gt=last_id)[:chunk_size]):
+        last_id = rows[-1]['id']
+        galleries = {}
+        images = ProductImage.objects.filter(product_id__in=[row['id'] for row in rows]).order_by('order', 'id')
+        for product_id, image, alt_text in images.values_list('product_id', 'image', 'alt_text'):
+            galleries.setdefault(product_id, []).append({'image': image, 'alt_text': alt_text})
+        for row in rows:
+            record = {name: row[name] for name in FIELDS}
+            record['image'] = row['image'] or ''
+            record['price'] = str(row['price'])
+            record['images'] = galleries.get(row['id'], [])
+            yield record
+
+
+def write_csv(records, stream):
+    writer = csv.DictWriter(stream, FIELDS + ['images'])
+    writer.writeheader()
+    for record in records:
+        record['images'] = IMAGE_SEPARATOR.join(image['image'] for image in record['images'])
+        writer.writerow(record)
+
+
+def write_json(records, stream):
+    """A JSON list written one record per line, without building it in memory."""
+    stream.write('[')
+    for number, record in enumerate(records):
+        stream.write(',\n' if number else '\n')
+        stream.write(json.dumps(record, ensure_ascii=False))
+    stream.write('\n]\n')
+
+
+WRITERS = {'csv': write_csv, 'json': write_json}
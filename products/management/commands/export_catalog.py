@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from products import catalog
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Stream the product catalog as CSV or JSON in the format import_catalog reads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=catalog.FORMATS, help='Default: from --output, else CSV')
+        parser.add_argument('--output', '-o', help='File to write (default: stdout)')
+        parser.add_argument('--active-only', action='store_true')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = options['format'] or (catalog.detect_format(output) if output else 'csv')
+        products = Product.objects.all()
+        if options['active_only']:
+            products = products.filter(is_active=True)
+        records = catalog.export_records(products, options['chunk_size'])
+
+        if not output:
+            self.stdout.ending = ''
+            catalog.WRITERS[fmt](records, self.stdout)
+            return
+        with open(output, 'w', newline='', encoding='utf-8') as stream:
+            catalog.WRITERS[fmt](records, stream)
+        self.stderr.write(self.style.SUCCESS(f'Exported the catalog to {output}'))
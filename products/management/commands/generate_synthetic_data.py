@@ -0,0 +1,436 @@
+"""
+Generate realistic shop data at scale for benchmarks and query plan checks.
+
+Everything is drawn from one random.Random(seed), so the same --seed and
+--end-date always produce the same rows. --end-date defaults to a fixed
+date, not today. Rows are written with bulk_create
+in chunks of --chunk-size, one transaction per chunk.
+
+- products with gallery images; popularity follows a Zipf-like curve
+- orders spread over --years with growth, weekends, December peaks and
+  evening hours; status follows the order's age; legacy hex order numbers
+  before 2026 and the current format after
+- order items, 1-5 lines per order
+- discount codes with validity windows, redeemed by about one order in eight
+- open carts from the last 30 days
+- customers, addresses and postal codes in Bulgarian cities
+
+Generated rows are marked (slug/code/session prefixes and an email domain),
+so --clear removes them without touching real data.
+"""
+import base64
+import bisect
+import itertools
+import random
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from cart.models import Cart, CartItem
+from orders.models import DiscountCode, Order, OrderItem
+from orders.order_numbers import ACCESS_TOKEN_BYTES, EPOCH_MS, RANDOM_MAX, format_order_number
+from products import search
+from products.models import Product, ProductImage
+from shipping.models import ShippingRate
+
+SLUG_PREFIX = 'synthetic-'
+CODE_PREFIX = 'SYN'
+SESSION_PREFIX = 'synthetic-'
+EMAIL_DOMAIN = 'synthetic.example'
+
+# City, oblast, first postal code, number of postal codes, share of orders
+CITIES = [
+    ('София', 'София-град', 1000, 800, 30),
+    ('Пловдив', 'Пловдив', 4000, 30, 10),
+    ('Варна', 'Варна', 9000, 30, 9),
+    ('Бургас', 'Бургас', 8000, 20, 6),
+    ('Русе', 'Русе', 7000, 20, 4),
+    ('Стара Загора', 'Стара Загора', 6000, 10, 4),
+    ('Плевен', 'Плевен', 5800, 10, 3),
+    ('Велико Търново', 'Велико Търново', 5000, 5, 3),
+    ('Добрич', 'Добрич', 9300, 5, 2),
+    ('Сливен', 'Сливен', 8800, 5, 2),
+    ('Шумен', 'Шумен', 9700, 5, 2),
+    ('Перник', 'Перник', 2300, 5, 2),
+    ('Хасково', 'Хасково', 6300, 5, 2),
+    ('Пазарджик', 'Пазарджик', 4400, 5, 2),
+    ('Благоевград', 'Благоевград', 2700, 5, 2),
+    ('Ямбол', 'Ямбол', 8600, 5, 1.5),
+    ('Враца', 'Враца', 3000, 5, 1.5),
+    ('Габрово', 'Габрово', 5300, 5, 1.5),
+    ('Асеновград', 'Пловдив', 4230, 1, 1),
+    ('Казанлък', 'Стара Загора', 6100, 1, 1),
+    ('Кюстендил', 'Кюстендил', 2500, 1, 1),
+    ('Кърджали', 'Кърджали', 6600, 1, 1),
+    ('Монтана', 'Монтана', 3400, 1, 1),
+    ('Видин', 'Видин', 3700, 1, 1),
+    ('Ловеч', 'Ловеч', 5500, 1, 1),
+    ('Силистра', 'Силистра', 7500, 1, 1),
+    ('Разград', 'Разград', 7200, 1, 1),
+    ('Търговище', 'Търговище', 7700, 1, 1),
+    ('Смолян', 'Смолян', 4700, 1, 0.5),
+    ('Банско', 'Благоевград', 2770, 1, 0.5),
+    ('Созопол', 'Бургас', 8130, 1, 0.5),
+]
+
+MALE_NAMES = ['Георги', 'Иван', 'Димитър', 'Николай', 'Петър', 'Христо', 'Стоян', 'Александър', 'Тодор', 'Васил']
+FEMALE_NAMES = ['Мария', 'Иванка', 'Елена', 'Йорданка', 'Пенка', 'Десислава', 'Виктория', 'Гергана', 'Надежда', 'Цветелина']
+SURNAMES = ['Иванов', 'Георгиев', 'Димитров', 'Петров', 'Николов', 'Христов', 'Стоянов', 'Тодоров', 'Илиев', 'Василев']
+STREETS = ['ул. Витоша', 'бул. България', 'ул. Шипка', 'ул. Раковски', 'бул. Цар Освободител', 'ул. Граф Игнатиев',
+           'ул. Христо Ботев', 'бул. Васил Левски', 'ул. Иван Вазов', 'ж.к. Младост']
+INFLUENCERS = ['MARIA', 'GERGANA', 'NIKI', 'ELENA', 'VIKI', 'DESI', 'IVO', 'CHEF', 'BIO', 'FIT']
+
+VARIETIES = [('Коронейки', 'Koroneiki'), ('Каламата', 'Kalamata'), ('Манаки', 'Manaki'), ('Атинолия', 'Athinolia'),
+             ('Цунати', 'Tsounati'), ('Адрамитини', 'Adramitini')]
+SIZES = [('250 ml', Decimal('0.6')), ('500 ml', Decimal('1.0')), ('750 ml', Decimal('1.4')), ('1 l', Decimal('1.8'))]
+TYPES = [('finishing', 'Finishing'), ('cooking', 'Cooking'), ('bundle', 'Gift Box')]
+
+# Orders per line count: most orders have one or two lines
+LINE_WEIGHTS = [50, 25, 12, 8, 5]
+# Orders per hour of day, peaking in the evening
+HOUR_WEIGHTS = [1, 0.5, 0.3, 0.2, 0.2, 0.3, 0.8, 1.5, 2.5, 3, 3.5, 4, 4.5, 4, 3.5, 3.5, 4, 4.5, 5.5, 6.5, 7, 6, 4, 2]
+
+_TRANSLITERATION = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y',
+    'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sht', 'ъ': 'a', 'ь': 'y', 'ю': 'yu', 'я': 'ya',
+})
+CENT = Decimal('0.01')
+
+# Fixed rather than today, so a seed gives the same rows on any day
+DEFAULT_END_DATE = date(2026, 10, 1)
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the generated created_at/updated_at values."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = 'Generate deterministic synthetic products, orders, carts and discount codes for scale testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--images-per-product', type=int, default=3, help='Average gallery images per product')
+        parser.add_argument('--orders', type=int, default=100000)
+        parser.add_argument('--years', type=float, default=3, help='Time span of the orders')
+        parser.add_argument(
+            '--end-date', type=date.fromisoformat, default=DEFAULT_END_DATE, help='YYYY-MM-DD (default: %(default)s)',
+        )
+        parser.add_argument('--carts', type=int, default=5000)
+        parser.add_argument('--discount-codes', type=int, default=200)
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--clear', action='store_true', help='Delete previously generated data first')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        self.end = datetime.combine(options['end_date'], dt_time(23, 59, 59), dt_timezone.utc)
+        self.start = self.end - timedelta(days=round(options['years'] * 365))
+
+        if options['clear']:
+            self.clear()
+
+        with explicit_timestamps(Product, Order, DiscountCode, Cart):
+            products = self.generate_products(options['products'], options['images_per_product'])
+            codes = self.generate_discount_codes(options['discount_codes'])
+            self.generate_orders(options['orders'], products, codes)
+            self.generate_carts(options['carts'], products)
+
+    def progress(self, label, done, total, started):
+        rate = done / max(time.perf_counter() - started, 1e-9)
+        self.stdout.write(f'{label}: {done}/{total} ({rate:,.0f}/s)')
+
+    # Products
+
+    def generate_products(self, count, images_per_product):
+        rng = self.rng
+        started = time.perf_counter()
+        products = []
+        for number in range(count):
+            variety_bg, variety = rng.choice(VARIETIES)
+            size, size_factor = rng.choice(SIZES)
+            product_type, type_name = rng.choices(TYPES, weights=[45, 45, 10])[0]
+            created = self.start + timedelta(seconds=rng.uniform(0, (self.end - self.start).total_seconds() / 2))
+            product = Product(
+                name=f'ZLATO {variety} {type_name} {size}',
+                name_bg=f'ЗЛАТО {variety_bg} {size}',
+                slug=f'{SLUG_PREFIX}{number}-{variety.lower()}-{product_type}',
+                product_type=product_type,
+                short_description=f'{variety} extra virgin olive oil, {size}',
+                description=f'Cold-pressed {variety} extra virgin olive oil from Greece in a {size} squeezable bottle.',
+                description_bg=f'Студено пресован екстра върджин зехтин от сорт {variety_bg}, {size}.',
+                price=(Decimal(rng.randint(14, 30)) * size_factor).quantize(CENT),
+                inventory=rng.choice([0, rng.randint(1, 20), rng.randint(20, 500)]),
+                image=f'products/{SLUG_PREFIX}{number}.jpg',
+                is_active=rng.random() < 0.95,
+                featured=rng.random() < 0.02,
+                created_at=created,
+                updated_at=created,
+            )
+            search.update_document(product)
+            products.append(product)
+
+        for chunk in chunks(products, self.chunk_size):
+            with transaction.atomic():
+                Product.objects.bulk_create(chunk)
+        self.progress('Products', len(products), count, started)
+
+        images = (
+            ProductImage(product=product, image=f'products/gallery/{product.slug}-{order}.jpg', order=order)
+            for product in products
+            for order in range(rng.randint(0, 2 * images_per_product))
+        )
+        created = 0
+        for chunk in chunks(images, self.chunk_size):
+            with transaction.atomic():
+                ProductImage.objects.bulk_create(chunk)
+            created += len(chunk)
+        self.stdout.write(f'Product images: {created}')
+
+        # Popular products sell far more than the long tail
+        rng.shuffle(products)
+        return products
+
+    # Discount codes
+
+    def generate_discount_codes(self, count):
+        rng = self.rng
+        span = (self.end - self.start).total_seconds()
+        codes = []
+        for number in range(count):
+            percentage = rng.choice([5, 10, 10, 15, 15, 20, 25])
+            valid_from = self.start + timedelta(seconds=rng.uniform(0, span))
+            valid_to = valid_from + timedelta(days=rng.choice([7, 14, 30, 90, 365]))
+            codes.append(DiscountCode(
+                code=f'{CODE_PREFIX}{rng.choice(INFLUENCERS)}{percentage}-{number}',
+                discount_percentage=Decimal(percentage),
+                active=rng.random() < 0.9,
+                valid_from=valid_from,
+                valid_to=valid_to,
+                usage_limit=rng.choice([None, None, 50, 100, 500]),
+                created_by=f'Synthetic {rng.choice(INFLUENCERS).title()}',
+                created_at=valid_from,
+                updated_at=valid_from,
+            ))
+        with transaction.atomic():
+            DiscountCode.objects.bulk_create(codes, batch_size=self.chunk_size)
+        self.stdout.write(f'Discount codes: {len(codes)}')
+        return sorted(codes, key=lambda code: code.valid_from)
+
+    # Orders
+
+    def order_times(self, count):
+        """Sorted creation times with growth, weekly and seasonal patterns."""
+        rng = self.rng
+        days = (self.end.date() - self.start.date()).days + 1
+        weights = []
+        for offset in range(days):
+            day = self.start.date() + timedelta(days=offset)
+            weight = 0.4 + 0.6 * offset / days
+            if day.weekday() >= 5:
+                weight *= 1.2
+            if day.month == 12:
+                weight *= 1.8 if day.day <= 24 else 1.2
+            weights.append(weight)
+        day_offsets = rng.choices(range(days), weights=weights, k=count)
+        hours = rng.choices(range(24), weights=HOUR_WEIGHTS, k=count)
+
+        start = datetime.combine(self.start.date(), dt_time(), dt_timezone.utc)
+        return sorted(
+            start + timedelta(days=day, hours=hour, seconds=rng.uniform(0, 3600))
+            for day, hour in zip(day_offsets, hours)
+        )
+
+    def order_number(self, created, used):
+        timestamp_ms = int(created.timestamp() * 1000)
+        if timestamp_ms >= EPOCH_MS:
+            return format_order_number(timestamp_ms, self.rng.randrange(RANDOM_MAX))
+        # Orders from before 2026 have the legacy 12-character hex numbers
+        while True:
+            number = f'{self.rng.getrandbits(48):012X}'
+            if number not in used:
+                used.add(number)
+                return number
+
+    def order_status(self, created):
+        """Status, paid_at and shipped_at for an order created at ``created``."""
+        rng = self.rng
+        age = self.end - created
+        if rng.random() < 0.06:
+            return 'cancelled', None, None
+        if age < timedelta(hours=24) and rng.random() < 0.3:
+            return 'pending', None, None
+        paid_at = created + timedelta(minutes=rng.uniform(1, 30))
+        shipped_at = paid_at + timedelta(days=rng.uniform(0.5, 3))
+        if age < timedelta(days=1):
+            return rng.choice(['paid', 'processing']), paid_at, None
+        if age < timedelta(days=4):
+            return rng.choice(['processing', 'shipped']), paid_at, shipped_at
+        if age < timedelta(days=7):
+            return rng.choice(['shipped', 'delivered']), paid_at, shipped_at
+        return 'delivered', paid_at, shipped_at
+
+    def customer(self):
+        rng = self.rng
+        if rng.random() < 0.5:
+            first, last = rng.choice(MALE_NAMES), rng.choice(SURNAMES)
+        else:
+            first, last = rng.choice(FEMALE_NAMES), rng.choice(SURNAMES) + 'а'
+        login = f'{first}.{last}'.lower().translate(_TRANSLITERATION)
+        return f'{first} {last}', f'{login}{rng.randint(1, 999)}@{EMAIL_DOMAIN}'
+
+    def generate_orders(self, count, products, codes):
+        rng = self.rng
+        started = time.perf_counter()
+        popularity = list(itertools.accumulate(1 / (rank + 1) ** 1.1 for rank in range(len(products))))
+        city_weights = list(itertools.accumulate(city[4] for city in CITIES))
+        rates = dict(ShippingRate.objects.filter(is_active=True).values_list('region', 'rate'))
+        default_rate = rates.get('Default', Decimal('5.00'))
+        code_starts = [code.valid_from for code in codes]
+        redemptions = Counter()
+        used_numbers = set()
+        done = 0
+
+        for times in chunks(self.order_times(count), self.chunk_size):
+            orders, lines = [], []
+            for created in times:
+                line_count = rng.choices(range(1, 6), weights=LINE_WEIGHTS)[0]
+                picked = {
+                    products[i].pk: products[i]
+                    for i in (bisect.bisect(popularity, rng.random() * popularity[-1]) for _ in range(line_count))
+                }
+                items = [(product, rng.choices([1, 2, 3], weights=[70, 20, 10])[0]) for product in picked.values()]
+                subtotal = sum(product.price * quantity for product, quantity in items)
+
+                city, region, first_code, code_count, _ = rng.choices(CITIES, cum_weights=city_weights)[0]
+                shipping_cost = Decimal(rates.get(city, default_rate))
+
+                discount_code, discount_amount = None, Decimal('0.00')
+                if codes and rng.random() < 0.12:
+                    # Codes valid when the order was placed
+                    candidates = codes[:bisect.bisect(code_starts, created)]
+                    candidates = [code for code in candidates[-20:] if code.valid_to >= created]
+                    if candidates:
+                        discount_code = rng.choice(candidates)
+                        discount_amount = (subtotal * discount_code.discount_percentage / 100).quantize(CENT)
+                        redemptions[discount_code.pk] += 1
+
+                status, paid_at, shipped_at = self.order_status(created)
+                name, email = self.customer()
+                orders.append(Order(
+                    order_number=self.order_number(created, used_numbers),
+                    access_token=base64.urlsafe_b64encode(rng.randbytes(ACCESS_TOKEN_BYTES)).rstrip(b'=').decode(),
+                    status=status,
+                    customer_name=name,
+                    customer_email=email,
+                    customer_phone=f'08{rng.choice("789")}{rng.randint(1000000, 9999999)}',
+                    shipping_address=f'{rng.choice(STREETS)} {rng.randint(1, 150)}',
+                    shipping_city=city,
+                    shipping_postal_code=str(first_code + rng.randrange(code_count)),
+                    shipping_region=region,
+                    subtotal=subtotal,
+                    shipping_cost=shipping_cost,
+                    discount_amount=discount_amount,
+                    total=subtotal + shipping_cost - discount_amount,
+                    discount_code=discount_code,
+                    stripe_payment_intent_id=f'pi_{rng.getrandbits(96):024x}' if paid_at else '',
+                    paid_at=paid_at,
+                    shipped_at=shipped_at,
+                    tracking_number=f'BG{rng.randint(10 ** 9, 10 ** 10 - 1)}' if shipped_at else '',
+                    created_at=created,
+                    updated_at=shipped_at or paid_at or created,
+                ))
+                lines.append(items)
+
+            with transaction.atomic():
+                Order.objects.bulk_create(orders)
+                OrderItem.objects.bulk_create(
+                    [
+                        OrderItem(
+                            order=order, product=product, product_name=product.name,
+                            product_price=product.price, quantity=quantity,
+                        )
+                        for order, items in zip(orders, lines)
+                        for product, quantity in items
+                    ],
+                    batch_size=self.chunk_size,
+                )
+            done += len(orders)
+            self.progress('Orders', done, count, started)
+
+        for code in codes:
+            code.times_used = redemptions[code.pk]
+        with transaction.atomic():
+            DiscountCode.objects.bulk_update(codes, ['times_used'], batch_size=self.chunk_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {done} orders; {sum(redemptions.values())} used a discount code'
+        ))
+
+    # Carts
+
+    def generate_carts(self, count, products):
+        rng = self.rng
+        carts = []
+        for number in range(count):
+            created = self.end - timedelta(seconds=rng.uniform(0, 30 * 86400))
+            carts.append(Cart(session_key=f'{SESSION_PREFIX}{number:020d}', created_at=created, updated_at=created))
+
+        items = 0
+        for chunk in chunks(carts, self.chunk_size):
+            with transaction.atomic():
+                Cart.objects.bulk_create(chunk)
+                cart_items = [
+                    CartItem(cart=cart, product=product, quantity=rng.randint(1, 3))
+                    for cart in chunk
+                    for product in rng.sample(products, min(len(products), rng.randint(1, 4)))
+                ]
+                CartItem.objects.bulk_create(cart_items)
+            items += len(cart_items)
+        self.stdout.write(self.style.SUCCESS(f'Created {count} carts with {items} items'))
+
+    # Cleanup
+
+    def clear(self):
+        """Delete rows created by earlier runs, in batches."""
+        order_ids = Order.objects.filter(
+            customer_email__endswith=f'@{EMAIL_DOMAIN}',
+        ).order_by('pk').values_list('pk', flat=True)
+        deleted = 0
+        # The first chunk_size left each time; no cursor stays open on the rows being deleted
+        while batch := list(order_ids[:self.chunk_size]):
+            with transaction.atomic():
+                OrderItem.objects.filter(order_id__in=batch).delete()
+                Order.objects.filter(pk__in=batch).delete()
+            deleted += len(batch)
+
+        CartItem.objects.filter(cart__session_key__startswith=SESSION_PREFIX).delete()
+        Cart.objects.filter(session_key__startswith=SESSION_PREFIX).delete()
+        # Real orders may reference generated products; those are kept
+        ProductImage.objects.filter(product__slug__startswith=SLUG_PREFIX).delete()
+        Product.objects.filter(slug__startswith=SLUG_PREFIX, orderitem__isnull=True).delete()
+        DiscountCode.objects.filter(code__startswith=CODE_PREFIX).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} synthetic orders and the other generated data'))
@@ -0,0 +1,66 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from products import catalog
+
+
+class Command(BaseCommand):
+    help = 'Create and update products from a CSV or JSON catalog (see products/catalog.py for the format)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSON file, a fixture such as products/fixtures/products.json, or '-' for stdin")
+        parser.add_argument('--format', choices=catalog.FORMATS, help='Default: from the file extension')
+        parser.add_argument('--dry-run', action='store_true', help='Report the changes without writing them')
+        parser.add_argument('--deactivate-missing', action='store_true',
+                            help='Hide products that are not in the file')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path == '-' else catalog.detect_format(path))
+        chunk_size = options['chunk_size']
+        started = time.perf_counter()
+
+        try:
+            if path == '-':
+                diff = catalog.plan(catalog.read_records(sys.stdin, fmt), chunk_size)
+            else:
+                with open(path, newline='', encoding='utf-8') as stream:
+                    diff = catalog.plan(catalog.read_records(stream, fmt), chunk_size)
+        except OSError as error:
+            raise CommandError(error)
+        except catalog.CatalogError as error:
+            for number, slug, messages in error.errors[:50]:
+                self.stderr.write(f'Record {number} ({slug or "no slug"}): {"; ".join(messages)}')
+            raise CommandError(f'{len(error.errors)} invalid records, nothing imported')
+
+        self.report(diff, options['verbosity'], options['deactivate_missing'])
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry run: nothing written'))
+            return
+        catalog.apply(diff, chunk_size)
+        deactivated = catalog.deactivate(diff.missing, chunk_size) if options['deactivate_missing'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported in {time.perf_counter() - started:.1f}s: {len(diff.created)} created, '
+            f'{len(diff.updated)} updated, {len(diff.galleries)} galleries replaced, {deactivated} deactivated'
+        ))
+
+    def report(self, diff, verbosity, deactivate_missing):
+        """Summary of the changes; every change at -v 2, the first 20 of each kind otherwise."""
+        limit = None if verbosity >= 2 else 20
+
+        def listing(title, lines):
+            lines = list(lines)
+            self.stdout.write(f'{title}: {len(lines)}')
+            for line in lines[:limit]:
+                self.stdout.write(f'  {line}')
+            if limit is not None and len(lines) > limit:
+                self.stdout.write(f'  ... and {len(lines) - limit} more (-v 2 lists all)')
+
+        listing('Create', (record['slug'] for record in diff.created))
+        listing('Update', (f'{record["slug"]}: {", ".join(fields)}' for record, fields in diff.updated))
+        listing('Replace gallery', (f'{slug}: {len(images)} images' for slug, images in diff.galleries.items()))
+        self.stdout.write(f'Unchanged: {diff.unchanged}')
+        listing('Deactivate' if deactivate_missing else 'Not in file', diff.missing)
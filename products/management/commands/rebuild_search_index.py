@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from products.search import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the search terms of every product and rebuild the search index'
+
+    def handle(self, *args, **options):
+        changed = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the search index: {changed} products changed'))
@@ -0,0 +1,72 @@
+import shutil
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from products import stock
+from products.catalog import detect_format
+
+FEED_SUFFIXES = ('.csv', '.json')
+
+
+class Command(BaseCommand):
+    help = 'Update product inventory from a supplier or warehouse stock feed (see products/stock.py for the format)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Feed file, or a directory whose feeds are applied oldest first and moved to processed/ or failed/',
+        )
+        parser.add_argument('--watch', action='store_true', help='Keep polling the directory for new feeds')
+        parser.add_argument('--interval', type=float, default=30, help='Seconds between directory checks')
+        parser.add_argument('--dry-run', action='store_true', help='Report the changes without writing them')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if path.is_file():
+            self.sync_file(path, options)
+            return
+        if not path.is_dir():
+            raise CommandError(f'{path} does not exist')
+
+        while True:
+            for feed in self.pending_feeds(path):
+                try:
+                    self.sync_file(feed, options)
+                except CommandError as error:
+                    self.stderr.write(str(error))
+                    self.move(feed, 'failed', options)
+                else:
+                    self.move(feed, 'processed', options)
+            if not options['watch']:
+                return
+            time.sleep(options['interval'])
+
+    def pending_feeds(self, directory):
+        feeds = [path for path in directory.iterdir() if path.is_file() and path.suffix.lower() in FEED_SUFFIXES]
+        return sorted(feeds, key=lambda path: path.stat().st_mtime)
+
+    def move(self, feed, folder, options):
+        if options['dry_run']:
+            return
+        target = feed.parent / folder
+        target.mkdir(exist_ok=True)
+        shutil.move(feed, target / feed.name)
+
+    def sync_file(self, path, options):
+        try:
+            with open(path, newline='', encoding='utf-8') as stream:
+                levels = stock.read_feed(stream, detect_format(path))
+        except stock.FeedError as error:
+            for number, message in error.errors[:50]:
+                self.stderr.write(f'{path.name} row {number}: {message}')
+            raise CommandError(f'{path.name}: {len(error.errors)} invalid rows, nothing applied')
+        except (OSError, ValueError) as error:
+            raise CommandError(f'{path.name}: {error}')
+
+        result = stock.sync(levels, path.name, options['batch_size'], options['dry_run'])
+        for slug in result.unknown[:20]:
+            self.stdout.write(self.style.WARNING(f'  Unknown product {slug}'))
+        prefix = 'Dry run, ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(f'{prefix}{path.name}: {result}'))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_seed_products'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('previous', models.IntegerField(help_text='Inventory before the change')),
+                ('inventory', models.IntegerField(help_text='Inventory after the change')),
+                ('delta', models.IntegerField()),
+                ('source', models.CharField(help_text="Feed file name, or 'admin'", max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Stock Movement',
+                'verbose_name_plural': 'Stock Movements',
+                'ordering': ['-created_at', '-id'],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_stockmovement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='available',
+            field=models.GeneratedField(db_persist=True, expression=models.Q(('inventory__gt', 0)), output_field=models.BooleanField()),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='revenue_30d',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Revenue in the last 30 days', max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='units_30d',
+            field=models.IntegerField(default=0, editable=False, help_text='Units sold in the last 30 days'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='units_7d',
+            field=models.IntegerField(default=0, editable=False, help_text='Units sold in the last 7 days'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-featured', 'name'], name='product_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-available', '-units_30d', 'name'], name='product_bestsellers_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-available', '-units_7d', 'name'], name='product_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-available', '-revenue_30d', 'name'], name='product_revenue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['price', 'name'], name='product_price_idx'),
+        ),
+    ]
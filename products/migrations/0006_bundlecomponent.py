@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:00
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_sort_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BundleComponent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1, help_text='Units of the component in one bundle', validators=[django.core.validators.MinValueValidator(1)])),
+                ('bundle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='components', to='products.product')),
+                ('component', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='bundle_components', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Bundle Component',
+                'verbose_name_plural': 'Bundle Components',
+                'constraints': [models.UniqueConstraint(fields=('bundle', 'component'), name='bundle_component_unique'), models.CheckConstraint(condition=models.Q(('quantity__gte', 1)), name='bundle_component_quantity')],
+            },
+        ),
+    ]
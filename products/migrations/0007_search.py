@@ -0,0 +1,139 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:05
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# The search terms and index as of this migration (see products/search.py).
+# Kept here so later changes to products.search do not change what this
+# migration does; new terms are picked up by `manage.py rebuild_search_index`.
+
+FTS_TABLE = 'products_product_fts'
+COLUMNS = 'search_title, search_document'
+
+TRANSLITERATION = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh', 'з': 'z', 'и': 'i',
+    'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's',
+    'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sht',
+    'ъ': 'a', 'ь': 'y', 'ю': 'yu', 'я': 'ya',
+})
+SUFFIXES = sorted([
+    'ovete', 'ishta', 'ite', 'ata', 'yat', 'ove', 'ta', 'to', 'te', 'at', 'ya',
+    'ing', 'ies', 'es', 'ed', 'ly',
+    'a', 'e', 'i', 'o', 'u', 'y', 's',
+], key=len, reverse=True)
+WORD = re.compile(r'[a-z0-9]+')
+
+
+def stem(word):
+    for _ in range(2):
+        for suffix in SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                word = word[:-len(suffix)]
+                break
+        else:
+            break
+    return word
+
+
+def indexed(text):
+    text = unicodedata.normalize('NFKD', text.casefold().translate(TRANSLITERATION))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    terms = []
+    for word in WORD.findall(text):
+        terms.append(word)
+        if stem(word) != word:
+            terms.append(stem(word))
+    return ' '.join(terms)
+
+
+def sqlite_drop_triggers():
+    return [f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{event}' for event in ('insert', 'delete', 'update')]
+
+
+def sqlite_statements(table):
+    return sqlite_drop_triggers() + [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"{COLUMNS}, content='{table}', content_rowid='id', prefix='2 3 4')",
+        f"CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, {COLUMNS}) VALUES (new.id, new.search_title, new.search_document); END",
+        f"CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {COLUMNS}) "
+        f"VALUES ('delete', old.id, old.search_title, old.search_document); END",
+        f"CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE OF {COLUMNS} ON {table} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {COLUMNS}) "
+        f"VALUES ('delete', old.id, old.search_title, old.search_document); "
+        f"INSERT INTO {FTS_TABLE}(rowid, {COLUMNS}) VALUES (new.id, new.search_title, new.search_document); END",
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+    ]
+
+
+def postgresql_indexes():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+    vector = (
+        SearchVector('search_title', weight='A', config='simple')
+        + SearchVector('search_document', weight='B', config='simple')
+    )
+    return [
+        GinIndex(vector, name='product_search_idx'),
+        GinIndex(fields=['search_title'], opclasses=['gin_trgm_ops'], name='product_search_trgm_idx'),
+    ]
+
+
+def create_index(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    types = dict(Product._meta.get_field('product_type').choices)
+    products = Product.objects.using(schema_editor.connection.alias).order_by('pk')
+    changed = []
+    for product in products.iterator(chunk_size=500):
+        product.search_title = indexed(f'{product.name} {product.name_bg}')
+        product.search_document = indexed(' '.join([
+            product.short_description, product.short_description_bg,
+            product.description, product.description_bg,
+            types.get(product.product_type, product.product_type),
+        ]))
+        changed.append(product)
+    products.bulk_update(changed, ['search_title', 'search_document'], batch_size=500)
+
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for statement in sqlite_statements(Product._meta.db_table):
+            schema_editor.execute(statement)
+    elif vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for index in postgresql_indexes():
+            schema_editor.add_index(Product, index)
+
+
+def drop_index(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for statement in sqlite_drop_triggers() + [f'DROP TABLE IF EXISTS {FTS_TABLE}']:
+            schema_editor.execute(statement)
+    elif vendor == 'postgresql':
+        for index in postgresql_indexes():
+            schema_editor.remove_index(Product, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_bundlecomponent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='search_title',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -1,3 +1,5 @@
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator
 from django.db import models
 
 
@@ -43,24 +45,104 @@ class Product(models.Model):
     is_active = models.BooleanField(default=True, help_text="Show this product on the website?")
     featured = models.BooleanField(default=False, help_text="Show on homepage?")
 
+    # Sort keys for the shop, maintained by analytics.bestsellers
+    available = models.GeneratedField(
+        expression=models.Q(inventory__gt=0), output_field=models.BooleanField(), db_persist=True,
+    )
+    units_7d = models.IntegerField(default=0, editable=False, help_text="Units sold in the last 7 days")
+    units_30d = models.IntegerField(default=0, editable=False, help_text="Units sold in the last 30 days")
+    revenue_30d = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, editable=False, help_text="Revenue in the last 30 days",
+    )
+
+    # Normalized search terms, maintained by products.search
+    search_title = models.TextField(blank=True, default='', editable=False)
+    search_document = models.TextField(blank=True, default='', editable=False)
+
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Fields the search terms are made from
+    SEARCH_FIELDS = {
+        'name', 'name_bg', 'product_type', 'short_description', 'short_description_bg',
+        'description', 'description_bg',
+    }
+
     class Meta:
         ordering = ['-featured', 'name']
         verbose_name = "Product"
         verbose_name_plural = "Products"
+        # One per shop sort order (see products.views.SORTS), over active products only
+        indexes = [
+            models.Index(fields=['-featured', 'name'], condition=models.Q(is_active=True), name='product_featured_idx'),
+            models.Index(
+                fields=['-available', '-units_30d', 'name'], condition=models.Q(is_active=True),
+                name='product_bestsellers_idx',
+            ),
+            models.Index(
+                fields=['-available', '-units_7d', 'name'], condition=models.Q(is_active=True),
+                name='product_trending_idx',
+            ),
+            models.Index(
+                fields=['-available', '-revenue_30d', 'name'], condition=models.Q(is_active=True),
+                name='product_revenue_idx',
+            ),
+            models.Index(fields=['price', 'name'], condition=models.Q(is_active=True), name='product_price_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        from .search import update_document
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or self.SEARCH_FIELDS.intersection(update_fields):
+            update_document(self)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'search_title', 'search_document'}
+        super().save(*args, **kwargs)
+
     @property
     def in_stock(self):
         """Check if product is in stock"""
         return self.inventory > 0
 
 
+class BundleComponent(models.Model):
+    """
+    A product in a bundle (gift box), ``quantity`` times per box.
+    A bundle with components has no stock of its own: its inventory is the
+    number of boxes the component stock makes up, kept up to date by
+    products.bundles whenever a component's stock changes.
+    """
+    bundle = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='components')
+    component = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='bundle_components')
+    quantity = models.PositiveIntegerField(
+        default=1, validators=[MinValueValidator(1)], help_text="Units of the component in one bundle",
+    )
+
+    class Meta:
+        verbose_name = "Bundle Component"
+        verbose_name_plural = "Bundle Components"
+        constraints = [
+            models.UniqueConstraint(fields=['bundle', 'component'], name='bundle_component_unique'),
+            models.CheckConstraint(condition=models.Q(quantity__gte=1), name='bundle_component_quantity'),
+        ]
+
+    def __str__(self):
+        return f"{self.bundle.name}: {self.quantity} × {self.component.name}"
+
+    def clean(self):
+        # Bundles are expanded one level when their stock is taken
+        if self.bundle_id and self.bundle_id == self.component_id:
+            raise ValidationError({'component': "A bundle cannot contain itself."})
+        if self.component_id and self.component.components.exists():
+            raise ValidationError({'component': "A bundle cannot contain another bundle."})
+        if self.bundle_id and self.bundle.bundle_components.exists():
+            raise ValidationError({'bundle': "A product in a bundle cannot be a bundle itself."})
+
+
 class ProductImage(models.Model):
     """
     Additional images for products.
@@ -78,3 +160,24 @@ class ProductImage(models.Model):
 
     def __str__(self):
         return f"{self.product.name} - Image {self.order}"
+
+
+class StockMovement(models.Model):
+    """
+    One change of a product's inventory, from a stock feed or the admin.
+    Written by products.stock.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    previous = models.IntegerField(help_text="Inventory before the change")
+    inventory = models.IntegerField(help_text="Inventory after the change")
+    delta = models.IntegerField()
+    source = models.CharField(max_length=200, help_text="Feed file name, or 'admin'")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        verbose_name = "Stock Movement"
+        verbose_name_plural = "Stock Movements"
+
+    def __str__(self):
+        return f"{self.product.name}: {self.previous} → {self.inventory} ({self.source})"
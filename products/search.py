@@ -0,0 +1,276 @@
+"""
+Product search.
+
+Product names and descriptions are indexed in both languages as
+normalized terms. ``normalize()`` case-folds the text, transliterates
+Bulgarian Cyrillic to Latin, strips accents and reduces each word to a
+stem with a small suffix stripper for both languages. So "ЗЛАТО", "zlato"
+and "Злато" are the same term, and so are "маслини"/"маслините" and
+"olive"/"olives". Words are indexed both as typed and as stems. Every
+word of a query matches as a prefix of either, which is what the
+typeahead needs: "zlat" finds "zlato" although its stem is "zla".
+
+The normalized text is stored on the product (``search_title`` for the
+names, ``search_document`` for the rest). ``Product.save()`` keeps it up
+to date; bulk writes (catalog imports, generated data) call
+``update_document()`` themselves, and ``manage.py rebuild_search_index``
+recomputes everything. The index over it depends on the database:
+
+- SQLite: an FTS5 table (external content, prefix indexes) kept in sync by
+  triggers on products_product. A migration that rebuilds
+  products_product on SQLite drops the triggers; ``restore_triggers()``
+  recreates them after ``migrate``.
+- PostgreSQL: a GIN index on the weighted tsvector of both columns, and a
+  trigram index on ``search_title`` for the typo-tolerant fallback used
+  when the full-text query finds nothing.
+- Other databases: substring matches on the stored terms, unindexed.
+
+The SQLite and PostgreSQL indexes are created by migration 0007_search.
+"""
+import logging
+import re
+import unicodedata
+
+from django.db import connections, transaction
+from django.db.models import F, FloatField, Q, Value
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'products_product_fts'
+
+# Weight of a title match against a description match, in both rankings
+TITLE_WEIGHT = 10.0
+
+# Streamlined System, the official Bulgarian romanization
+TRANSLITERATION = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh', 'з': 'z', 'и': 'i',
+    'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's',
+    'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sht',
+    'ъ': 'a', 'ь': 'y', 'ю': 'yu', 'я': 'ya',
+})
+
+# Inflectional endings of transliterated Bulgarian (plurals, definite
+# articles) and English, longest first
+SUFFIXES = sorted([
+    'ovete', 'ishta', 'ite', 'ata', 'yat', 'ove', 'ta', 'to', 'te', 'at', 'ya',
+    'ing', 'ies', 'es', 'ed', 'ly',
+    'a', 'e', 'i', 'o', 'u', 'y', 's',
+], key=len, reverse=True)
+MIN_STEM = 3
+
+WORD = re.compile(r'[a-z0-9]+')
+
+# Shorter typeahead queries match most of the catalog; the box waits for more
+SUGGEST_MIN_LENGTH = 2
+
+
+def transliterate(text):
+    """Case-folded ``text`` in Latin letters without accents."""
+    text = unicodedata.normalize('NFKD', text.casefold().translate(TRANSLITERATION))
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+def stem(word):
+    """``word`` without up to two inflectional endings, keeping MIN_STEM letters."""
+    for _ in range(2):
+        for suffix in SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM:
+                word = word[:-len(suffix)]
+                break
+        else:
+            break
+    return word
+
+
+def words(text):
+    """The words of ``text``, transliterated, in order."""
+    return WORD.findall(transliterate(text or ''))
+
+
+def normalize(text):
+    """The search terms (stems) of ``text``, in order."""
+    return [stem(word) for word in words(text)]
+
+
+def _indexed(text):
+    # Words are indexed as typed too, so a prefix longer than the stem still matches
+    terms = []
+    for word in words(text):
+        terms.append(word)
+        if stem(word) != word:
+            terms.append(stem(word))
+    return ' '.join(terms)
+
+
+def update_document(product):
+    """Set the search fields of ``product`` from its names and descriptions."""
+    types = dict(Product.PRODUCT_TYPE_CHOICES)
+    product.search_title = _indexed(f'{product.name} {product.name_bg}')
+    product.search_document = _indexed(' '.join([
+        product.short_description, product.short_description_bg,
+        product.description, product.description_bg,
+        types.get(product.product_type, product.product_type),
+    ]))
+
+
+def search(queryset, text):
+    """
+    Products of ``queryset`` matching every word of ``text``, as typed or
+    stemmed and as a prefix, annotated with ``search_rank``, higher is
+    better.
+    """
+    terms = [(word, stem(word)) for word in words(text)]
+    if not terms:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())).none()
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        return _search_sqlite(queryset, terms)
+    if vendor == 'postgresql':
+        return _search_postgresql(queryset, terms)
+    condition = Q()
+    for word, stemmed in terms:
+        condition &= (
+            Q(search_title__contains=stemmed) | Q(search_document__contains=stemmed)
+            | Q(search_title__contains=word) | Q(search_document__contains=word)
+        )
+    return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def suggest(text, limit=8):
+    """The best ``limit`` active products for the typeahead."""
+    if len(text.strip()) < SUGGEST_MIN_LENGTH:
+        return []
+    products = Product.objects.filter(is_active=True).only('pk', 'name', 'name_bg', 'slug', 'price', 'image')
+    return list(search(products, text).order_by('-search_rank', 'name')[:limit])
+
+
+def _search_sqlite(queryset, terms):
+    match = ' AND '.join(f'("{word}"* OR "{stemmed}"*)' for word, stemmed in terms)
+    table = Product._meta.db_table
+    # A join with the FTS table, which the ORM cannot express otherwise;
+    # bm25() only works in the query that runs the MATCH
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = "{table}"."id"', f'{FTS_TABLE} MATCH %s'],
+        params=[match],
+        select={'search_rank': f'-bm25({FTS_TABLE}, %s, 1.0)'},
+        select_params=[TITLE_WEIGHT],
+    )
+
+
+def _vector():
+    from django.contrib.postgres.search import SearchVector
+    return (
+        SearchVector('search_title', weight='A', config='simple')
+        + SearchVector('search_document', weight='B', config='simple')
+    )
+
+
+def _search_postgresql(queryset, terms):
+    from django.contrib.postgres.lookups import TrigramWordSimilar
+    from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+
+    query = SearchQuery(
+        ' & '.join(f'({word}:* | {stemmed}:*)' for word, stemmed in terms), search_type='raw', config='simple',
+    )
+    matches = queryset.annotate(search_vector=_vector()).filter(search_vector=query)
+    if matches.exists():
+        # D, C, B, A: descriptions weigh 1, titles TITLE_WEIGHT
+        return matches.annotate(search_rank=SearchRank(
+            _vector(), query, weights=[0, 0, 1 / TITLE_WEIGHT, 1.0],
+        ))
+    # Misspelled names: titles over pg_trgm.word_similarity_threshold, on the trigram index
+    typed = ' '.join(word for word, _ in terms)
+    return queryset.filter(TrigramWordSimilar(F('search_title'), Value(typed))).annotate(
+        search_rank=TrigramWordSimilarity(typed, 'search_title'),
+    )
+
+
+# Index maintenance
+
+def _sqlite_drop_triggers():
+    return [f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{event}' for event in ('insert', 'delete', 'update')]
+
+
+def _sqlite_statements(table):
+    # The FTS table is kept (dropping a virtual table inside a savepoint
+    # does not roll back cleanly); the triggers are recreated and the
+    # index is rebuilt from products_product
+    columns = 'search_title, search_document'
+    return _sqlite_drop_triggers() + [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"{columns}, content='{table}', content_rowid='id', prefix='2 3 4')",
+        f"CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, new.search_title, new.search_document); END",
+        f"CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) "
+        f"VALUES ('delete', old.id, old.search_title, old.search_document); END",
+        f"CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE OF {columns} ON {table} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) "
+        f"VALUES ('delete', old.id, old.search_title, old.search_document); "
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, new.search_title, new.search_document); END",
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+    ]
+
+
+def restore_triggers(using='default', **kwargs):
+    """
+    Recreate the SQLite triggers and refill the FTS table when a migration
+    that rebuilt products_product dropped them. Connected to post_migrate;
+    returns True if the triggers were missing.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    triggers = [f'{FTS_TABLE}_{event}' for event in ('insert', 'delete', 'update')]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT name FROM sqlite_master WHERE name IN ({', '.join(['%s'] * 4)})", [FTS_TABLE, *triggers],
+        )
+        existing = {name for name, in cursor.fetchall()}
+    # No FTS table: the search migration has not run (or was reversed)
+    if FTS_TABLE not in existing or existing.issuperset(triggers):
+        return False
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        for statement in _sqlite_statements(Product._meta.db_table):
+            cursor.execute(statement)
+    logger.warning('Recreated the product search triggers on %s', using)
+    return True
+
+
+def update_documents(queryset, chunk_size=500):
+    """Recompute the search fields of the products of ``queryset``; returns the number changed."""
+    fields = ['search_title', 'search_document']
+    products = queryset.only(
+        'pk', 'name', 'name_bg', 'product_type', 'short_description', 'short_description_bg',
+        'description', 'description_bg', *fields,
+    ).order_by('pk')
+    changed = []
+    updated = 0
+    for product in products.iterator(chunk_size=chunk_size):
+        current = (product.search_title, product.search_document)
+        update_document(product)
+        if (product.search_title, product.search_document) != current:
+            changed.append(product)
+        if len(changed) >= chunk_size:
+            updated += queryset.bulk_update(changed, fields)
+            changed = []
+    return updated + queryset.bulk_update(changed, fields)
+
+
+def rebuild(using='default', chunk_size=500):
+    """
+    Recompute the search fields of every product and rebuild the index
+    (recreating the SQLite triggers). Returns the number of products whose
+    terms changed.
+    """
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        changed = update_documents(Product.objects.using(using), chunk_size)
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                for statement in _sqlite_statements(Product._meta.db_table):
+                    cursor.execute(statement)
+    logger.info('Rebuilt the product search index: %s products changed', changed)
+    return changed
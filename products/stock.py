@@ -0,0 +1,137 @@
+"""
+Stock sync from supplier and warehouse feeds.
+
+A feed gives the current stock level per product, matched by slug:
+
+- CSV with a ``slug`` (or ``sku``) column and an ``inventory`` (or
+  ``quantity``) column; other columns are ignored
+- JSON, either a list of such objects or one ``{"slug": inventory}`` object
+
+``sync()`` compares the levels with Product.inventory a batch at a time and
+writes only the products whose stock changed: one UPDATE per batch with a
+CASE over the product ids, plus one insert of StockMovement rows as the
+audit trail. Changed products get a new ``updated_at``; unchanged ones are
+not written, so theirs stays as it was. The rows of
+a batch are locked while it is applied, so checkouts running at the same
+time are not overwritten with stale levels.
+"""
+import csv
+import json
+import logging
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.utils import timezone
+from . import bundles
+from .models import Product, StockMovement
+
+logger = logging.getLogger(__name__)
+
+SLUG_COLUMNS = ['slug', 'sku']
+INVENTORY_COLUMNS = ['inventory', 'quantity']
+
+
+class FeedError(Exception):
+    """Invalid stock feed; ``errors`` lists the bad rows."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f'{len(errors)} invalid rows')
+
+
+class SyncResult:
+    def __init__(self):
+        self.changed = 0
+        self.unchanged = 0
+        self.unknown = []  # slugs not in the catalog
+        self.movements = []
+
+    def __str__(self):
+        return f'{self.changed} changed, {self.unchanged} unchanged, {len(self.unknown)} unknown'
+
+
+def read_feed(stream, fmt):
+    """
+    Stock levels from a feed as a dict of slug -> inventory.
+    Raises FeedError listing every bad row.
+    """
+    if fmt == 'csv':
+        rows = list(csv.DictReader(stream))
+    else:
+        rows = json.load(stream)
+        if isinstance(rows, dict):
+            rows = [{'slug': slug, 'inventory': inventory} for slug, inventory in rows.items()]
+
+    levels, errors = {}, []
+    for number, row in enumerate(rows, start=1):
+        slug = next((row[column] for column in SLUG_COLUMNS if row.get(column)), None)
+        value = next((row[column] for column in INVENTORY_COLUMNS if row.get(column) not in (None, '')), None)
+        try:
+            inventory = int(value)
+        except (TypeError, ValueError):
+            inventory = None
+        if not slug or inventory is None or inventory < 0:
+            errors.append((number, f'needs a slug and a non-negative inventory, got {row!r}'))
+        elif slug in levels and levels[slug] != inventory:
+            errors.append((number, f'{slug} appears twice with different levels'))
+        else:
+            levels[slug] = inventory
+    if errors:
+        raise FeedError(errors)
+    return levels
+
+
+def sync(levels, source, batch_size=1000, dry_run=False):
+    """Apply the stock levels in ``levels`` (slug -> inventory)."""
+    result = SyncResult()
+    slugs = list(levels)
+    for start in range(0, len(slugs), batch_size):
+        _sync_batch({slug: levels[slug] for slug in slugs[start:start + batch_size]}, source, dry_run, result)
+    if result.unknown:
+        logger.warning(
+            'Stock feed %s has %s unknown products, e.g. %s', source, len(result.unknown), result.unknown[:5],
+        )
+    logger.info('Stock sync from %s: %s', source, result)
+    return result
+
+
+def _sync_batch(levels, source, dry_run, result):
+    with transaction.atomic():
+        current = Product.objects.filter(slug__in=levels).values_list('id', 'slug', 'inventory')
+        if not dry_run:
+            current = current.select_for_update()
+        current = list(current)
+        movements = []
+        for product_id, slug, inventory in current:
+            if levels[slug] == inventory:
+                result.unchanged += 1
+                continue
+            movements.append(StockMovement(
+                product_id=product_id, previous=inventory, inventory=levels[slug],
+                delta=levels[slug] - inventory, source=source,
+            ))
+        found = {slug for _, slug, _ in current}
+        result.unknown += [slug for slug in levels if slug not in found]
+
+        if movements and not dry_run:
+            Product.objects.filter(id__in=[movement.product_id for movement in movements]).update(
+                inventory=Case(
+                    *[When(id=movement.product_id, then=Value(movement.inventory)) for movement in movements],
+                    output_field=IntegerField(),
+                ),
+                # QuerySet.update() skips auto_now
+                updated_at=timezone.now(),
+            )
+            StockMovement.objects.bulk_create(movements)
+            bundles.refresh(movement.product_id for movement in movements)
+        result.changed += len(movements)
+        result.movements += movements
+
+
+def record_admin_change(product, previous):
+    """Audit trail entry for an inventory edited by hand in the admin."""
+    if product.inventory != previous:
+        StockMovement.objects.create(
+            product=product, previous=previous, inventory=product.inventory,
+            delta=product.inventory - previous, source='admin',
+        )
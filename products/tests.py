@@ -1,3 +1,352 @@
+import io
+import json
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from django.core.exceptions import ValidationError
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
+from django.urls import reverse
+from orders.lifecycle import mark_order_paid
+from orders.models import Order, OrderItem
+from zlato.testing import CART_SIZES, CATALOG_SIZES, QueryBudgetMixin, create_cart, create_order, create_products
+from .management.commands.generate_synthetic_data import DEFAULT_END_DATE
+from .models import BundleComponent, Product, ProductImage, StockMovement
+from . import bundles, search, stock
+from . import urls
+from .views import SEARCH_RESULTS
+
+
+class StorefrontQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    Product pages run the same number of queries for 10 or 1000 products.
+    """
+
+    def get(self, url_name, *args):
+        def scenario(size):
+            create_products(size)
+            return lambda: self.client.get(reverse(url_name, args=args))
+        for response in self.assertConstantQueries(scenario, CATALOG_SIZES):
+            self.assertEqual(response.status_code, 200)
+
+    def test_every_url_is_tested(self):
+        self.assertEveryUrlTested(urls.urlpatterns)
+
+    def test_homepage(self):
+        self.get('homepage')
+
+    def test_shop(self):
+        self.get('products:shop')
+
+    def get_search(self, url_name):
+        def scenario(size):
+            create_products(size)
+            return lambda: self.client.get(reverse(url_name), {'q': 'test prod'})
+        return self.assertConstantQueries(scenario, CATALOG_SIZES)
+
+    def test_search(self):
+        for size, response in zip(CATALOG_SIZES, self.get_search('products:search')):
+            self.assertEqual(len(response.context['products']), min(size, SEARCH_RESULTS))
+
+    def test_suggest(self):
+        for response in self.get_search('products:suggest'):
+            self.assertEqual(len(response.json()['results']), 8)
+
+    def test_detail(self):
+        product = Product.objects.filter(is_active=True).first()
+
+        def scenario(size):
+            create_products(size)
+            ProductImage.objects.bulk_create(
+                ProductImage(product=product, image=f'products/gallery/test-{i}.jpg', order=i)
+                for i in range(size // 10)
+            )
+            return lambda: self.client.get(reverse('products:detail', args=[product.slug]))
+        for response in self.assertConstantQueries(scenario, CATALOG_SIZES):
+            self.assertEqual(response.status_code, 200)
+
+    def test_detail_with_cart(self):
+        # The cart badge in the header is on every page
+        product = Product.objects.filter(is_active=True).first()
+
+        def scenario(lines):
+            client = self.client_class()
+            create_cart(client, lines)
+            return lambda: client.get(reverse('products:detail', args=[product.slug]))
+        self.assertConstantQueries(scenario, CART_SIZES)
+
+    def test_about(self):
+        self.get('products:about')
+
+    def test_contact(self):
+        self.get('products:contact')
+
+    def test_contact_submit(self):
+        def scenario(size):
+            create_products(size)
+            return lambda: self.client.post(reverse('products:contact'), {
+                'name': 'Test', 'email': 'test@example.com', 'subject': 'Hi', 'message': 'Hello',
+            })
+        self.assertConstantQueries(scenario, CATALOG_SIZES)
+
+    def test_payment_failed(self):
+        self.get('products:payment_failed')
+
+    def test_out_of_stock(self):
+        self.get('products:out_of_stock')
+
+    def test_shipping_policy(self):
+        self.get('products:shipping_policy')
+
+    def test_returns_policy(self):
+        self.get('products:returns_policy')
+
+
+class CatalogImportExportTests(TestCase):
+    """import_catalog and export_catalog read and write the same format."""
+
+    def run_command(self, *args):
+        stdout = io.StringIO()
+        call_command(*args, stdout=stdout)
+        return stdout.getvalue()
+
+    def import_csv(self, text, *args):
+        with mock.patch('sys.stdin', io.StringIO(text)):
+            return self.run_command('import_catalog', '-', *args)
+
+    def test_fixture_round_trip(self):
+        self.run_command('import_catalog', 'products/fixtures/products.json')
+        self.assertEqual(Product.objects.count(), 3)
+
+        exported = self.run_command('export_catalog')
+        output = self.import_csv(exported)
+        self.assertIn('Unchanged: 3', output)
+        self.assertIn('0 created, 0 updated', output)
+
+    def test_upsert_and_galleries(self):
+        product, = create_products(1)
+        output = self.import_csv(
+            'slug,name,price,images\n'
+            f'{product.slug},Renamed,12.50,gallery/a.jpg|gallery/b.jpg\n'
+            'new-oil,New oil,9.90,\n'
+        )
+        self.assertIn('1 created, 1 updated, 1 galleries replaced', output)
+        product.refresh_from_db()
+        self.assertEqual(product.name, 'Renamed')
+        self.assertEqual(product.inventory, 1000)
+        self.assertEqual(
+            list(product.images.values_list('image', 'order')), [('gallery/a.jpg', 0), ('gallery/b.jpg', 1)],
+        )
+        self.assertEqual(Product.objects.get(slug='new-oil').price, Decimal('9.90'))
+
+    def test_dry_run_writes_nothing(self):
+        product, = create_products(1)
+        output = self.import_csv(f'slug,inventory\n{product.slug},5\n', '--dry-run')
+        self.assertIn(f'{product.slug}: inventory', output)
+        product.refresh_from_db()
+        self.assertEqual(product.inventory, 1000)
+
+    def test_invalid_file_imports_nothing(self):
+        with self.assertRaisesMessage(CommandError, '2 invalid records'):
+            self.import_csv('slug,name,price\nvalid,Valid,1\nbad slug,Bad,1\nno-price,No price,\n')
+        self.assertFalse(Product.objects.filter(slug='valid').exists())
+
+
+class StockSyncTests(TestCase):
+    """Stock feeds write only the products whose inventory changed."""
+
+    def setUp(self):
+        self.products = create_products(3)
+
+    def test_only_changed_rows_are_written(self):
+        changed, unchanged, _ = self.products
+        levels = {changed.slug: 7, unchanged.slug: 1000, 'no-such-product': 1}
+        with self.assertNumQueries(6):  # savepoint, select, update, insert, bundles, release
+            result = stock.sync(levels, 'feed.csv')
+
+        self.assertEqual((result.changed, result.unchanged, result.unknown), (1, 1, ['no-such-product']))
+        changed_before, unchanged_before = changed.updated_at, unchanged.updated_at
+        changed.refresh_from_db()
+        unchanged.refresh_from_db()
+        self.assertEqual(changed.inventory, 7)
+        self.assertGreater(changed.updated_at, changed_before)
+        self.assertEqual(unchanged.updated_at, unchanged_before)
+        movement = StockMovement.objects.get()
+        self.assertEqual((movement.product, movement.previous, movement.delta), (changed, 1000, -993))
+
+    def test_directory_feeds(self):
+        first, second, third = self.products
+        with tempfile.TemporaryDirectory() as directory:
+            directory = Path(directory)
+            (directory / 'warehouse.csv').write_text(f'sku,quantity,name\n{first.slug},3,First\n')
+            (directory / 'supplier.json').write_text(json.dumps({second.slug: 4}))
+            (directory / 'broken.csv').write_text(f'slug,inventory\n{third.slug},-1\n')
+            call_command('sync_stock', str(directory), stdout=io.StringIO(), stderr=io.StringIO())
+
+            self.assertEqual(sorted(path.name for path in (directory / 'processed').iterdir()),
+                             ['supplier.json', 'warehouse.csv'])
+            self.assertEqual([path.name for path in (directory / 'failed').iterdir()], ['broken.csv'])
+        self.assertEqual(
+            dict(Product.objects.filter(pk__in=[first.pk, second.pk, third.pk]).values_list('slug', 'inventory')),
+            {first.slug: 3, second.slug: 4, third.slug: 1000},
+        )
+
+
+class BundleTests(TestCase):
+    def setUp(self):
+        self.finishing, self.cooking = create_products(2)
+        self.box, = create_products(1, product_type='bundle')
+        BundleComponent.objects.bulk_create([
+            BundleComponent(bundle=self.box, component=self.finishing, quantity=2),
+            BundleComponent(bundle=self.box, component=self.cooking, quantity=1),
+        ])
+        Product.objects.filter(pk=self.finishing.pk).update(inventory=10)
+        Product.objects.filter(pk=self.cooking.pk).update(inventory=3)
+        bundles.refresh()
+
+    def inventory(self):
+        return dict(Product.objects.filter(
+            pk__in=[self.finishing.pk, self.cooking.pk, self.box.pk],
+        ).values_list('pk', 'inventory'))
+
+    def test_availability_is_the_minimum_over_components(self):
+        self.assertEqual(self.inventory()[self.box.pk], 3)
+        stock.sync({self.cooking.slug: 0}, 'feed.csv')
+        self.box.refresh_from_db()
+        self.assertEqual((self.box.inventory, self.box.available), (0, False))
+
+    def test_paid_bundle_takes_its_components(self):
+        order = create_order(0)
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=product, product_name=product.name, product_price=product.price,
+                      quantity=quantity)
+            for product, quantity in [(self.box, 2), (self.finishing, 1)]
+        )
+        mark_order_paid(order)
+        self.assertEqual(self.inventory(), {self.finishing.pk: 5, self.cooking.pk: 1, self.box.pk: 1})
+
+    def test_bundles_cannot_be_nested(self):
+        other, = create_products(1)
+        with self.assertRaises(ValidationError):
+            BundleComponent(bundle=other, component=self.box).full_clean()
+        with self.assertRaises(ValidationError):
+            BundleComponent(bundle=self.box, component=self.box).full_clean()
+        # A component cannot become a bundle either
+        with self.assertRaises(ValidationError):
+            BundleComponent(bundle=self.finishing, component=other).full_clean()
+
+    def test_quantity_is_at_least_one(self):
+        other, = create_products(1)
+        with self.assertRaises(ValidationError):
+            BundleComponent(bundle=self.box, component=other, quantity=0).full_clean()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            BundleComponent.objects.create(bundle=self.box, component=other, quantity=0)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.finishing = Product.objects.get(slug='zlato-finishing')
+
+    def names(self, text, queryset=None):
+        products = search.search(queryset or Product.objects.all(), text).order_by('-search_rank', 'name')
+        return [product.slug for product in products]
+
+    def test_normalize(self):
+        self.assertEqual(len(set(search.normalize('ЗЛАТО Злато zlato'))), 1)
+        self.assertEqual(search.normalize('маслини маслините'), ['maslin'] * 2)
+        self.assertEqual(search.normalize('Olive olives, Oils'), ['oliv', 'oliv', 'oil'])
+        self.assertEqual(search.normalize('Финиш finishing'), ['finish', 'finish'])
+
+    def test_both_languages_and_prefixes(self):
+        for text in ['zlato finishing', 'ЗЛАТО Финиш', 'злато фин', 'Zlat', 'маслинови горички']:
+            self.assertIn(self.finishing.slug, self.names(text), text)
+        self.assertEqual(self.names('zlato no-such-word'), [])
+        self.assertEqual(self.names('!!'), [])
+
+    def test_titles_rank_first(self):
+        other, = create_products(1)
+        other.description = 'Pairs well with ZLATO Finishing'
+        other.save()
+        names = self.names('finishing')
+        self.assertEqual(names[0], self.finishing.slug)
+        self.assertIn(other.slug, names)
+
+    def test_save_keeps_the_index_in_sync(self):
+        product, = create_products(1)
+        old_name = product.name
+        self.assertEqual(self.names(old_name), [product.slug])
+        product.name = 'Golden quokka'
+        product.save()
+        self.assertEqual(self.names('quokk'), [product.slug])
+        self.assertEqual(self.names(old_name), [])
+        product.delete()
+        self.assertEqual(self.names('quokk'), [])
+
+    def test_catalog_import_and_rebuild(self):
+        with mock.patch('sys.stdin', io.StringIO('slug,name,price\nnew-oil,Koroneiki harvest,9.90\n')):
+            call_command('import_catalog', '-', stdout=io.StringIO())
+        self.assertEqual(self.names('koron'), ['new-oil'])
+
+        Product.objects.filter(slug='new-oil').update(search_title='', search_document='')
+        self.assertEqual(self.names('koron'), [])
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(self.names('koron'), ['new-oil'])
+
+    def test_migrate_restores_dropped_triggers(self):
+        # As a migration rebuilding products_product leaves them
+        with connection.cursor() as cursor:
+            for statement in search._sqlite_drop_triggers():
+                cursor.execute(statement)
+        product, = create_products(1)
+        self.assertEqual(self.names(product.name), [])
+
+        with self.assertLogs('products.search', 'WARNING'):
+            emit_post_migrate_signal(verbosity=0, interactive=False, db='default')
+        self.assertEqual(self.names(product.name), [product.slug])
+        self.assertFalse(search.restore_triggers())
+
+    def test_suggest_and_admin(self):
+        Product.objects.filter(slug='zlato-cooking').update(is_active=False)
+        response = self.client.get(reverse('products:suggest'), {'q': 'злато'})
+        self.assertNotIn(reverse('products:detail', args=['zlato-cooking']), [
+            result['url'] for result in response.json()['results']
+        ])
+        self.assertIn(reverse('products:detail', args=[self.finishing.slug]), [
+            result['url'] for result in response.json()['results']
+        ])
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        response = self.client.get(reverse('admin:products_product_changelist'), {'q': 'финиш'})
+        self.assertEqual([product.slug for product in response.context['cl'].result_list], [self.finishing.slug])
+
+
+class SyntheticDataTests(TestCase):
+    def generate(self, *args):
+        call_command(
+            'generate_synthetic_data', '--products', '6', '--orders', '25', '--carts', '3', '--discount-codes', '4',
+            '--chunk-size', '7', *args, stdout=io.StringIO(),
+        )
+        orders = Order.objects.filter(customer_email__endswith='@synthetic.example').order_by('order_number')
+        return (
+            list(Product.objects.filter(slug__startswith='synthetic-').order_by('slug').values_list(
+                'slug', 'price', 'inventory', 'created_at',
+            )),
+            list(orders.values_list('order_number', 'customer_email', 'status', 'total', 'created_at')),
+            list(OrderItem.objects.filter(order__in=orders).order_by('order__order_number', 'product__slug').values_list(
+                'order__order_number', 'product__slug', 'quantity',
+            )),
+        )
 
-# Create your tests here.
+    def test_same_seed_same_rows(self):
+        first = self.generate()
+        self.assertEqual(len(first[1]), 25)
+        # Orders span the years up to the fixed default end date, whatever day the test runs
+        self.assertLessEqual(max(row[4] for row in first[1]).date(), DEFAULT_END_DATE)
+        # --clear deletes the previous run in chunks of 7
+        self.assertEqual(self.generate('--clear'), first)
+        self.assertNotEqual(self.generate('--clear', '--seed', '2'), first)
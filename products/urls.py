@@ -5,6 +5,8 @@ app_name = 'products'
 
 urlpatterns = [
     path('shop/', views.shop, name='shop'),
+    path('search/', views.search, name='search'),
+    path('search/suggest/', views.suggest, name='suggest'),
     path('product/<slug:slug>/', views.product_detail, name='detail'),
     path('about/', views.about, name='about'),
     path('contact/', views.contact, name='contact'),
@@ -1,13 +1,32 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
+from django.http import JsonResponse
+from django.urls import reverse
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.conf import settings
+from analytics.recommendations import suggestions
+from zlato.perf import external
+from . import search as product_search
 from .models import Product
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Shop sort orders (?sort=), each covered by an index on Product;
+# the bestseller keys are maintained by analytics.bestsellers
+SORTS = {
+    'featured': ['-featured', 'name'],
+    'bestsellers': ['-available', '-units_30d', 'name'],
+    'trending': ['-available', '-units_7d', 'name'],
+    'revenue': ['-available', '-revenue_30d', 'name'],
+    'price': ['price', 'name'],
+    '-price': ['-price', '-name'],
+}
+
+# Products shown on the search results page
+SEARCH_RESULTS = 48
+
 
 def homepage(request):
     """
@@ -23,11 +42,51 @@ def homepage(request):
 def shop(request):
     """
     Display dedicated shop page with all active products.
-    Shows only the product catalog for browsing and purchasing.
+    Shows only the product catalog for browsing and purchasing,
+    in one of the SORTS orders.
     """
-    products = Product.objects.filter(is_active=True)
+    sort = request.GET.get('sort') if request.GET.get('sort') in SORTS else 'featured'
+    products = Product.objects.filter(is_active=True).order_by(*SORTS[sort])
     return render(request, 'products/shop.html', {
-        'products': products
+        'products': products,
+        'sort': sort,
+    })
+
+
+def search(request):
+    """
+    Display the products matching the ?q= search, best match first.
+    """
+    query = request.GET.get('q', '').strip()
+    products = []
+    if query:
+        products = (
+            product_search.search(Product.objects.filter(is_active=True), query)
+            .order_by('-search_rank', 'name')[:SEARCH_RESULTS]
+        )
+    return render(request, 'products/search.html', {
+        'query': query,
+        'products': products,
+    })
+
+
+def suggest(request):
+    """
+    Typeahead suggestions for the ?q= search box, as JSON.
+    The query is echoed back so the page can drop late responses.
+    """
+    query = request.GET.get('q', '').strip()
+    bulgarian = request.LANGUAGE_CODE == 'bg'
+    return JsonResponse({
+        'q': query,
+        'results': [
+            {
+                'name': bulgarian and product.name_bg or product.name,
+                'url': reverse('products:detail', args=[product.slug]),
+                'price': str(product.price),
+            }
+            for product in product_search.suggest(query)
+        ],
     })
 
 
@@ -48,6 +107,7 @@ def product_detail(request, slug):
         'product': product,
         'gallery_images': gallery_images,
         'language': language,
+        'suggestions': suggestions([product.id]),
     })
 
 
@@ -73,12 +133,12 @@ def contact(request):
         # Validate required fields
         if not all([name, email, subject, message_text]):
             messages.error(request, 'All fields are required.')
-            return redirect('contact')
+            return redirect('products:contact')
 
         # Basic email validation
         if '@' not in email or '.' not in email:
             messages.error(request, 'Please enter a valid email address.')
-            return redirect('contact')
+            return redirect('products:contact')
 
         try:
             # Send email to admin
@@ -143,16 +203,17 @@ Sent via ZLATO Contact Form
                 reply_to=[email]
             )
             email_message.attach_alternative(html_content, "text/html")
-            email_message.send(fail_silently=False)
+            with external('smtp'):
+                email_message.send(fail_silently=False)
 
-            logger.info(f'Contact form submitted by {name} ({email})')
+            logger.info('Contact form submitted by %s (%s)', name, email)
             messages.success(request, 'Thank you for your message! We\'ll get back to you soon.')
-            return redirect('contact')
+            return redirect('products:contact')
 
         except Exception as e:
-            logger.error(f'Failed to send contact form email: {str(e)}')
+            logger.error('Failed to send contact form email: %s', e)
             messages.error(request, 'Sorry, there was an error sending your message. Please try again or email us directly.')
-            return redirect('contact')
+            return redirect('products:contact')
 
     return render(request, 'products/contact.html')
 
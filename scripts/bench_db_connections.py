@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+"""
+Benchmark PostgreSQL connection handling at different worker counts.
+
+Starts N worker processes, each running the Django app in-process and
+sending requests through the test client, so every request goes through
+the same request_started/request_finished connection handling as gunicorn.
+For each connection mode and worker count it reports throughput, latency
+percentiles, new physical connections (churn) and the peak number of
+Postgres backends.
+
+Modes:
+    none        CONN_MAX_AGE=0, a new connection per request
+    persistent  CONN_MAX_AGE=600, one connection per worker (current default)
+    pooled      DATABASE_POOL=True, psycopg 3 pool per worker
+
+Usage:
+    createdb zlato_bench
+    DATABASE_URL=postgres://localhost/zlato_bench python manage.py migrate
+    python scripts/bench_db_connections.py --database-url postgres://localhost/zlato_bench
+    python scripts/bench_db_connections.py --database-url ... --workers 1,4,16 --modes persistent,pooled
+"""
+
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+MODES = {
+    'none': {'DATABASE_CONN_MAX_AGE': '0', 'DATABASE_POOL': 'False'},
+    'persistent': {'DATABASE_CONN_MAX_AGE': '600', 'DATABASE_POOL': 'False'},
+    'pooled': {'DATABASE_CONN_MAX_AGE': '0', 'DATABASE_POOL': 'True'},
+}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def worker(env, path, requests, start, results):
+    """Run ``requests`` GETs against ``path`` and report latencies and churn."""
+    try:
+        results.put(_worker(env, path, requests, start))
+    except Exception as e:
+        start.wait()
+        results.put(e)
+
+
+def _worker(env, path, requests, start):
+    os.environ.update(env)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'zlato.settings')
+
+    import django
+    django.setup()
+
+    from django.db import connection
+    from django.db.backends.signals import connection_created
+    from django.test import Client
+
+    opened = []
+    connection_created.connect(lambda sender, connection, **kwargs: opened.append(1), weak=False)
+
+    client = Client()
+    client.get(path)  # warm up templates and the pool
+    opened.clear()
+    start.wait()
+
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get(path)
+        latencies.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f'{path} returned {response.status_code}')
+
+    # With a pool, connection_created fires on every checkout; the pool
+    # itself knows how many physical connections it opened
+    pool = getattr(connection, 'pool', None)
+    if pool is not None:
+        connections_opened = pool.get_stats().get('connections_num', 0)
+    else:
+        connections_opened = len(opened)
+
+    return latencies, connections_opened
+
+
+def sample_backends(database_url, stop, peak):
+    """Track the highest number of backends connected to the benchmark database."""
+    import psycopg
+
+    with psycopg.connect(database_url, autocommit=True) as monitor:
+        while not stop.is_set():
+            count, = monitor.execute(
+                'SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() AND pid <> pg_backend_pid()'
+            ).fetchone()
+            peak[0] = max(peak[0], count)
+            time.sleep(0.05)
+
+
+def run(mode, workers, args):
+    env = {
+        **MODES[mode],
+        'DATABASE_URL': args.database_url,
+        'ALLOWED_HOSTS': 'testserver',
+        'DEBUG': 'False',
+    }
+    context = multiprocessing.get_context('spawn')
+    start = context.Event()
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(env, args.path, args.requests, start, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    stop = threading.Event()
+    peak = [0]
+    monitor = threading.Thread(target=sample_backends, args=(args.database_url, stop, peak))
+    monitor.start()
+
+    # Give workers time to import Django and warm up before the clock starts
+    time.sleep(args.warmup)
+    started = time.perf_counter()
+    start.set()
+
+    latencies = []
+    connections_opened = 0
+    for _ in processes:
+        result = results.get()
+        if isinstance(result, Exception):
+            stop.set()
+            raise result
+        worker_latencies, worker_connections = result
+        latencies.extend(worker_latencies)
+        connections_opened += worker_connections
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    monitor.join()
+    for process in processes:
+        process.join()
+
+    return {
+        'mode': mode,
+        'workers': workers,
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'connections_opened': connections_opened,
+        'peak_backends': peak[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database-url', required=True, help='PostgreSQL URL of a migrated database')
+    parser.add_argument('--workers', default='1,2,4,8', help='Comma-separated worker counts')
+    parser.add_argument('--modes', default='none,persistent,pooled', help='Comma-separated modes')
+    parser.add_argument('--requests', type=int, default=500, help='Requests per worker')
+    parser.add_argument('--path', default='/en/shop/', help='URL to request')
+    parser.add_argument('--warmup', type=float, default=3.0, help='Seconds to wait for workers to start')
+    args = parser.parse_args()
+
+    print(f"{'mode':<11} {'workers':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'new conns':>10} {'peak backends':>14}")
+    for mode in args.modes.split(','):
+        for workers in [int(count) for count in args.workers.split(',')]:
+            result = run(mode, workers, args)
+            print(
+                f"{result['mode']:<11} {result['workers']:>7} {result['rps']:>9.0f} "
+                f"{result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+                f"{result['connections_opened']:>10} {result['peak_backends']:>14}"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+"""
+Benchmark logging latency under log bursts.
+
+Worker threads act as requests: each one logs a burst of records the way
+the webhook and email code does, then pauses. Records go to a stream that
+takes --write-delay-ms per write, like a slow stdout pipe. Setups:
+
+- sync:     StreamHandler with the JSON formatter, writes on the caller
+- queue:    zlato.log.NonBlockingHandler, writes on the listener thread
+- sampled:  the queue handler with SamplingFilter keeping 10% of INFO records
+
+The script reports the latency of a logging call and of a whole burst,
+the records dropped because the queue was full and the time shutdown()
+took to drain the queue.
+
+Usage:
+    python scripts/bench_logging.py
+    python scripts/bench_logging.py --threads 16 --bursts 50 --burst-size 20 --write-delay-ms 0.5
+"""
+
+import argparse
+import logging
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from zlato import log  # noqa: E402
+
+
+class SlowStream:
+    """Discards output after sleeping ``delay`` seconds per write."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def write(self, text):
+        # A pipe accepts one writer at a time
+        with self.lock:
+            time.sleep(self.delay)
+
+    def flush(self):
+        pass
+
+
+def make_handler(setup, stream, queue_size):
+    if setup == 'sync':
+        handler = logging.StreamHandler(stream)
+    else:
+        handler = log.NonBlockingHandler(stream, maxsize=queue_size)
+    if setup == 'sampled':
+        handler.addFilter(log.SamplingFilter({'bench': 0.1}))
+    handler.setFormatter(log.JsonFormatter())
+    return handler
+
+
+def worker(logger, args, start, call_latencies, burst_latencies):
+    start.wait()
+    for burst in range(args.bursts):
+        burst_started = time.perf_counter()
+        for i in range(args.burst_size):
+            started = time.perf_counter()
+            logger.info('Order %s marked as paid via webhook (item %s)', burst, i)
+            call_latencies.append(time.perf_counter() - started)
+        burst_latencies.append(time.perf_counter() - burst_started)
+        time.sleep(args.pause_ms / 1000)
+
+
+def run(setup, args):
+    stream = SlowStream(args.write_delay_ms / 1000)
+    handler = make_handler(setup, stream, args.queue_size)
+    logger = logging.getLogger('bench')
+    logger.handlers = [handler]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    start = threading.Event()
+    call_latencies, burst_latencies = [], []
+    threads = [
+        threading.Thread(target=worker, args=(logger, args, start, call_latencies, burst_latencies))
+        for _ in range(args.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    started = time.perf_counter()
+    start.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    dropped = getattr(handler, 'dropped', 0)
+    drain_started = time.perf_counter()
+    handler.close()
+    drain = time.perf_counter() - drain_started
+
+    call_latencies.sort()
+    burst_latencies.sort()
+    return {
+        'setup': setup,
+        'call_p50_us': statistics.median(call_latencies) * 1e6,
+        'call_p99_us': call_latencies[int(0.99 * (len(call_latencies) - 1))] * 1e6,
+        'burst_p99_ms': burst_latencies[int(0.99 * (len(burst_latencies) - 1))] * 1000,
+        'elapsed_s': elapsed,
+        'dropped': dropped,
+        'records': len(call_latencies),
+        'drain_s': drain,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--bursts', type=int, default=30)
+    parser.add_argument('--burst-size', type=int, default=20, help='Records per burst')
+    parser.add_argument('--pause-ms', type=float, default=5.0, help='Pause between bursts')
+    parser.add_argument('--write-delay-ms', type=float, default=0.2, help='Time the stream takes per write')
+    parser.add_argument('--queue-size', type=int, default=10000)
+    parser.add_argument('--setups', default='sync,queue,sampled')
+    args = parser.parse_args()
+
+    print(
+        f"{'setup':<8} {'call p50 us':>12} {'call p99 us':>12} {'burst p99 ms':>13} "
+        f"{'elapsed s':>10} {'dropped':>13} {'drain s':>8}"
+    )
+    for setup in args.setups.split(','):
+        row = run(setup, args)
+        print(
+            f"{row['setup']:<8} {row['call_p50_us']:>12.1f} {row['call_p99_us']:>12.1f} "
+            f"{row['burst_p99_ms']:>13.2f} {row['elapsed_s']:>10.2f} "
+            f"{row['dropped']:>6}/{row['records']:<6} {row['drain_s']:>8.2f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
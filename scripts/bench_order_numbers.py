@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Benchmark order number schemes: insert throughput and unique index size.
+
+Compares the legacy random scheme (uuid4().hex[:12]) with the time-ordered
+numbers from orders/order_numbers.py by inserting rows into a SQLite table
+shaped like orders_order's unique order_number index. The page cache is
+kept smaller than the index so random inserts pay for their poor locality,
+as they do on a production database that does not fit in memory.
+
+Usage:
+    python scripts/bench_order_numbers.py
+    python scripts/bench_order_numbers.py --rows 5000000 --cache-mb 16
+
+Index size is read from SQLite's dbstat table when it is available.
+"""
+
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from orders.order_numbers import generate_order_number  # noqa: E402
+
+SCHEMES = {
+    'uuid4-hex12': lambda now_ms: uuid.uuid4().hex[:12].upper(),
+    'sortable': generate_order_number,
+}
+
+
+def run(scheme, rows, batch_size, cache_mb, directory):
+    """Insert ``rows`` order numbers and return timing and index statistics."""
+    path = Path(directory) / f'{scheme}.sqlite3'
+    connection = sqlite3.connect(path)
+    connection.execute(f'PRAGMA cache_size = -{cache_mb * 1024}')
+    connection.execute('PRAGMA journal_mode = WAL')
+    connection.execute('PRAGMA synchronous = NORMAL')
+    connection.execute(
+        'CREATE TABLE orders_order (id INTEGER PRIMARY KEY, order_number VARCHAR(32) NOT NULL)'
+    )
+    connection.execute('CREATE UNIQUE INDEX order_number_idx ON orders_order (order_number)')
+
+    generate = SCHEMES[scheme]
+    # Spread sortable numbers over time the way real orders arrive
+    now_ms = int(time.time() * 1000)
+    inserted = 0
+    elapsed = 0.0
+    while inserted < rows:
+        count = min(batch_size, rows - inserted)
+        batch = []
+        for _ in range(count):
+            now_ms += 1
+            batch.append((generate(now_ms),))
+
+        # Only the inserts are timed, not number generation
+        started = time.perf_counter()
+        connection.executemany('INSERT INTO orders_order (order_number) VALUES (?)', batch)
+        connection.commit()
+        elapsed += time.perf_counter() - started
+        inserted += count
+
+    try:
+        index_bytes, = connection.execute(
+            "SELECT SUM(pgsize) FROM dbstat WHERE name = 'order_number_idx'"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        index_bytes = None
+    connection.close()
+
+    return {
+        'scheme': scheme,
+        'rows': rows,
+        'seconds': elapsed,
+        'rows_per_second': rows / elapsed,
+        'index_mb': index_bytes / 1024 / 1024 if index_bytes else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--batch-size', type=int, default=10_000)
+    parser.add_argument('--cache-mb', type=int, default=8, help='SQLite page cache size')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for scheme in SCHEMES:
+            result = run(scheme, args.rows, args.batch_size, args.cache_mb, directory)
+            index = f"{result['index_mb']:.1f} MB" if result['index_mb'] else 'n/a'
+            print(
+                f"{result['scheme']:<12} {result['rows']:>10,} rows  "
+                f"{result['seconds']:7.2f}s  {result['rows_per_second']:>10,.0f} rows/s  index {index}"
+            )
+
+
+if __name__ == '__main__':
+    main()
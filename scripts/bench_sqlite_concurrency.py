@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""
+Benchmark concurrent SQLite writes with and without the tuned profile.
+
+Runs cart workers, which POST to /cart/add/ through the Django test client
+with session, cart and cart item writes, next to payment workers. The
+payment workers confirm pending orders through orders.lifecycle the way the
+Stripe webhook does. Each profile gets a fresh database file. The script
+reports throughput, latency percentiles and how many operations failed
+with "database is locked".
+
+Usage:
+    python scripts/bench_sqlite_concurrency.py
+    python scripts/bench_sqlite_concurrency.py --cart-workers 8 --payment-workers 4 --operations 300
+"""
+
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+PROFILES = {
+    'default': {'SQLITE_TUNED': 'False'},
+    'tuned': {'SQLITE_TUNED': 'True'},
+}
+
+
+def setup_django(env):
+    os.environ.update(env)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'zlato.settings')
+    import django
+    django.setup()
+
+
+def prepare_database(env, orders):
+    """Migrate a fresh database and create the pending orders to confirm."""
+    setup_django(env)
+    from django.core.management import call_command
+    from orders.models import Order, OrderItem
+    from products.models import Product
+
+    call_command('migrate', verbosity=0)
+    Product.objects.update(inventory=10 ** 9)
+    product = Product.objects.first()
+    order_ids = []
+    for _ in range(orders):
+        order = Order.objects.create(
+            customer_name='Bench', customer_email='bench@example.com', customer_phone='0',
+            shipping_address='Bench', shipping_city='София', shipping_postal_code='1000',
+            subtotal=product.price, total=product.price,
+        )
+        OrderItem.objects.create(
+            order=order, product=product, product_name=product.name,
+            product_price=product.price, quantity=1,
+        )
+        order_ids.append(order.pk)
+    return product.pk, order_ids
+
+
+def cart_worker(env, product_id, operations, start, results):
+    """Add a product to a session cart ``operations`` times."""
+    setup_django(env)
+    from django.db import OperationalError
+    from django.test import Client
+
+    client = Client()
+    latencies, locked = [], 0
+    start.wait()
+    for _ in range(operations):
+        started = time.perf_counter()
+        try:
+            client.post(f'/en/cart/add/{product_id}/')
+        except OperationalError:
+            locked += 1
+        latencies.append(time.perf_counter() - started)
+    results.put(('cart', latencies, locked))
+
+
+def payment_worker(env, order_ids, start, results):
+    """Confirm each order as the Stripe webhook would."""
+    setup_django(env)
+    from django.db import OperationalError
+    from orders.lifecycle import mark_order_paid
+    from orders.models import Order
+
+    latencies, locked = [], 0
+    start.wait()
+    for order_id in order_ids:
+        started = time.perf_counter()
+        try:
+            mark_order_paid(Order(pk=order_id))
+        except OperationalError:
+            locked += 1
+        latencies.append(time.perf_counter() - started)
+    results.put(('payment', latencies, locked))
+
+
+def run(profile, args, directory):
+    env = {
+        **PROFILES[profile],
+        'DATABASE_URL': f'sqlite:///{directory}/{profile}.sqlite3',
+        'ALLOWED_HOSTS': 'testserver',
+        'DEBUG': 'False',
+    }
+    context = multiprocessing.get_context('spawn')
+
+    with context.Pool(1) as pool:
+        product_id, order_ids = pool.apply(
+            prepare_database, (env, args.payment_workers * args.operations)
+        )
+
+    start = context.Event()
+    results = context.Queue()
+    processes = [
+        context.Process(target=cart_worker, args=(env, product_id, args.operations, start, results))
+        for _ in range(args.cart_workers)
+    ] + [
+        context.Process(
+            target=payment_worker,
+            args=(env, order_ids[i::args.payment_workers], start, results),
+        )
+        for i in range(args.payment_workers)
+    ]
+    for process in processes:
+        process.start()
+    time.sleep(args.warmup)
+
+    started = time.perf_counter()
+    start.set()
+    latencies = {'cart': [], 'payment': []}
+    locked = {'cart': 0, 'payment': 0}
+    for _ in processes:
+        kind, worker_latencies, worker_locked = results.get()
+        latencies[kind].extend(worker_latencies)
+        locked[kind] += worker_locked
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join()
+
+    rows = []
+    for kind, values in latencies.items():
+        if not values:
+            continue
+        values.sort()
+        rows.append({
+            'profile': profile,
+            'kind': kind,
+            'ops_per_second': len(values) / elapsed,
+            'p50_ms': statistics.median(values) * 1000,
+            'p99_ms': values[min(len(values) - 1, int(0.99 * len(values)))] * 1000,
+            'locked': locked[kind],
+            'operations': len(values),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cart-workers', type=int, default=4)
+    parser.add_argument('--payment-workers', type=int, default=2)
+    parser.add_argument('--operations', type=int, default=200, help='Operations per worker')
+    parser.add_argument('--profiles', default='default,tuned')
+    parser.add_argument('--warmup', type=float, default=3.0, help='Seconds to wait for workers to start')
+    args = parser.parse_args()
+
+    print(f"{'profile':<8} {'writer':<8} {'ops/s':>8} {'p50 ms':>8} {'p99 ms':>9} {'locked':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        for profile in args.profiles.split(','):
+            for row in run(profile, args, directory):
+                print(
+                    f"{row['profile']:<8} {row['kind']:<8} {row['ops_per_second']:>8.0f} "
+                    f"{row['p50_ms']:>8.2f} {row['p99_ms']:>9.2f} "
+                    f"{row['locked']:>5}/{row['operations']:<5}"
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,413 @@
+#!/usr/bin/env python
+"""
+End-to-end storefront benchmark with JSON results that can be compared across commits.
+
+`run` migrates a fresh SQLite database in a temporary directory. It then
+drives the storefront through Django's in-process test client, with the
+full middleware stack and templates. Stripe is replaced by a local HTTP fake
+(stripe.api_base) and email goes to a local SMTP sink, so the checkout,
+success and webhook paths run their real client code without network
+access. Webhook events are signed with the webhook secret and verified as
+in production.
+
+Each scenario runs warm-up iterations first, then --iterations timed
+requests, --repeat times. Throughput is the median over the repeats and
+latency percentiles are taken over all timed requests.
+
+`compare` prints the change per scenario between two result files. It exits
+with status 1 when a latency percentile grew, or throughput dropped, by more
+than --threshold percent.
+
+Usage:
+    python scripts/bench_storefront.py run
+    python scripts/bench_storefront.py run --iterations 500 --output benchmarks/before.json
+    python scripts/bench_storefront.py compare benchmarks/before.json benchmarks/after.json --threshold 10
+"""
+
+import argparse
+import gc
+import hashlib
+import hmac
+import json
+import os
+import platform
+import socketserver
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+WEBHOOK_SECRET = 'whsec_bench'
+SCENARIOS = (
+    'homepage', 'shop', 'product_detail', 'cart_add', 'cart_update', 'cart_remove',
+    'checkout', 'create_checkout_session', 'webhook_burst',
+)
+CHECKOUT_FORM = {
+    'customer_name': 'Bench Customer',
+    'customer_email': 'bench@example.com',
+    'customer_phone': '0888000000',
+    'shipping_address': 'ul. Bench 1',
+    'shipping_city': 'София',
+    'shipping_postal_code': '1000',
+}
+
+
+class FakeStripe(BaseHTTPRequestHandler):
+    """Answers the checkout session calls the shop makes."""
+
+    sessions = {}
+    lock = threading.Lock()
+
+    def do_POST(self):
+        form = parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode())
+        with self.lock:
+            session_id = f'cs_bench_{len(self.sessions) + 1}'
+            self.sessions[session_id] = {
+                'id': session_id,
+                'object': 'checkout.session',
+                'client_reference_id': form.get('client_reference_id', [''])[0],
+                'payment_intent': f'pi_bench_{len(self.sessions) + 1}',
+                'payment_status': 'paid',
+            }
+        self.reply(self.sessions[session_id])
+
+    def do_GET(self):
+        session = self.sessions.get(self.path.rstrip('/').rsplit('/', 1)[-1])
+        self.reply(session or {'error': {'message': 'No such session'}}, 200 if session else 404)
+
+    def reply(self, body, status=200):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class SMTPSink(socketserver.StreamRequestHandler):
+    """Minimal SMTP server that accepts and discards every message."""
+
+    received = 0
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 bench SMTP sink')
+        while line := self.rfile.readline():
+            command = line.decode(errors='replace').strip().upper()
+            if command.startswith('EHLO'):
+                self.wfile.write(b'250-bench\r\n250 8BITMIME\r\n')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                SMTPSink.received += 1
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+def start_server(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_address[1]
+
+
+def setup_django(directory, stripe_port, smtp_port):
+    os.environ.update({
+        'DATABASE_URL': f'sqlite:///{directory}/bench.sqlite3',
+        'DEBUG': 'False',
+        'ALLOWED_HOSTS': 'testserver',
+        'STRIPE_SECRET_KEY': 'sk_test_bench',
+        'STRIPE_WEBHOOK_SECRET': WEBHOOK_SECRET,
+        'EMAIL_HOST': '127.0.0.1',
+        'EMAIL_PORT': str(smtp_port),
+        'EMAIL_USE_TLS': 'False',
+        'EMAIL_HOST_USER': '',
+        'LOG_LEVEL': 'WARNING',
+        'PROFILER_ENABLED': 'False',
+        'SLOW_QUERY_LOG': 'False',
+    })
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'zlato.settings')
+    import django
+    django.setup()
+
+    import stripe
+    stripe.api_base = f'http://127.0.0.1:{stripe_port}'
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def signed_webhook(event):
+    """Payload and Stripe-Signature header for an event, as Stripe sends them."""
+    payload = json.dumps(event)
+    timestamp = int(time.time())
+    signature = hmac.new(WEBHOOK_SECRET.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return payload, f't={timestamp},v1={signature}'
+
+
+class Storefront:
+    """Scenario steps. Each returns a callable making the timed request."""
+
+    def __init__(self, products):
+        from django.test import Client
+        from zlato.testing import create_products
+
+        self.client_class = Client
+        self.products = create_products(products)
+        self.product = self.products[0]
+
+    def new_client(self, lines=0):
+        from django.urls import reverse
+
+        client = self.client_class()
+        for product in self.products[:lines]:
+            client.post(reverse('cart:add', args=[product.pk]))
+        return client
+
+    def first_item_id(self, client):
+        from cart.models import CartItem
+        return CartItem.objects.filter(cart__session_key=client.session.session_key).values_list('pk', flat=True).first()
+
+    def homepage(self):
+        from django.urls import reverse
+        client = self.new_client()
+        return lambda: client.get(reverse('homepage'))
+
+    def shop(self):
+        from django.urls import reverse
+        client = self.new_client()
+        return lambda: client.get(reverse('products:shop'))
+
+    def product_detail(self):
+        from django.urls import reverse
+        client = self.new_client()
+        return lambda: client.get(reverse('products:detail', args=[self.product.slug]))
+
+    def cart_add(self):
+        from django.urls import reverse
+        client = self.new_client(lines=3)
+        return lambda: client.post(reverse('cart:add', args=[self.product.pk]))
+
+    def cart_update(self):
+        from django.urls import reverse
+        client = self.new_client(lines=3)
+        url = reverse('cart:update', args=[self.first_item_id(client)])
+        return lambda: client.post(url, {'quantity': 2})
+
+    def cart_remove(self):
+        from django.urls import reverse
+        client = self.new_client(lines=3)
+        url = reverse('cart:remove', args=[self.first_item_id(client)])
+        return lambda: client.post(url)
+
+    def checkout(self):
+        from django.urls import reverse
+        client = self.new_client(lines=3)
+        return lambda: client.get(reverse('orders:checkout'))
+
+    def create_checkout_session(self):
+        from django.urls import reverse
+        client = self.new_client(lines=3)
+        return lambda: client.post(reverse('orders:create_checkout_session'), CHECKOUT_FORM)
+
+    def webhook(self):
+        from django.urls import reverse
+        from zlato.testing import create_order
+
+        order = create_order(3)
+        payload, signature = signed_webhook({
+            'id': f'evt_bench_{order.pk}',
+            'object': 'event',
+            'type': 'checkout.session.completed',
+            'data': {'object': {
+                'object': 'checkout.session',
+                'client_reference_id': order.order_number,
+                'payment_intent': f'pi_bench_{order.pk}',
+            }},
+        })
+        client = self.client_class()
+        return lambda: client.post(
+            reverse('stripe_webhook'), payload,
+            content_type='application/json', HTTP_STRIPE_SIGNATURE=signature,
+        )
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def measure(step, iterations, warmup):
+    """Latencies of ``iterations`` sequential requests, each prepared untimed."""
+    for _ in range(warmup):
+        step()()
+    gc.collect()
+    latencies = []
+    for _ in range(iterations):
+        request = step()
+        started = time.perf_counter()
+        response = request()
+        latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{step.__name__} returned {response.status_code}')
+    return latencies, sum(latencies)
+
+
+def measure_burst(storefront, iterations, threads):
+    """Webhooks for ``iterations`` orders sent by ``threads`` concurrent senders."""
+    from django.db import connections
+
+    requests = [storefront.webhook() for _ in range(iterations)]
+
+    def send(request):
+        started = time.perf_counter()
+        try:
+            response = request()
+        finally:
+            connections.close_all()
+        if response.status_code >= 400:
+            raise RuntimeError(f'webhook returned {response.status_code}')
+        return time.perf_counter() - started
+
+    gc.collect()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        latencies = list(executor.map(send, requests))
+    return latencies, time.perf_counter() - started
+
+
+def run_scenario(storefront, name, args):
+    latencies, throughputs = [], []
+    for _ in range(args.repeat):
+        if name == 'webhook_burst':
+            values, elapsed = measure_burst(storefront, args.iterations, args.burst_threads)
+        else:
+            step = getattr(storefront, name)
+            values, elapsed = measure(step, args.iterations, args.warmup)
+        latencies.extend(values)
+        throughputs.append(len(values) / elapsed)
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'throughput_rps': round(statistics.median(throughputs), 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(args):
+    stripe_port = start_server(ThreadingHTTPServer(('127.0.0.1', 0), FakeStripe))
+    smtp_port = start_server(socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPSink))
+    scenarios = args.scenarios.split(',')
+    commit = git_commit()
+
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(directory, stripe_port, smtp_port)
+        storefront = Storefront(args.products)
+
+        results = {}
+        print(f"{'scenario':<24} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for name in scenarios:
+            results[name] = row = run_scenario(storefront, name, args)
+            print(
+                f"{name:<24} {row['throughput_rps']:>9.1f} {row['p50_ms']:>9.2f} "
+                f"{row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f}"
+            )
+
+    output = Path(args.output or BASE_DIR / 'benchmarks' / f'{commit}.json')
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        'commit': commit,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+            'repeat': args.repeat,
+            'products': args.products,
+            'burst_threads': args.burst_threads,
+        },
+        'emails_sent': SMTPSink.received,
+        'scenarios': results,
+    }, indent=2))
+    print(f'\nSaved {output}')
+
+
+def compare(args):
+    base = json.loads(Path(args.base).read_text())
+    new = json.loads(Path(args.new).read_text())
+    print(f"Comparing {base['commit']} -> {new['commit']} (threshold {args.threshold:g}%)\n")
+    print(f"{'scenario':<24} {'metric':<15} {'base':>10} {'new':>10} {'change':>9}")
+
+    regressions = 0
+    for name, base_row in base['scenarios'].items():
+        new_row = new['scenarios'].get(name)
+        if new_row is None:
+            continue
+        for metric in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+            change = (new_row[metric] - base_row[metric]) / base_row[metric] * 100 if base_row[metric] else 0
+            # Lower throughput or higher latency is worse
+            worse = -change if metric == 'throughput_rps' else change
+            flag = '  REGRESSION' if worse > args.threshold else ''
+            regressions += bool(flag)
+            print(f"{name:<24} {metric:<15} {base_row[metric]:>10.2f} {new_row[metric]:>10.2f} {change:>+8.1f}%{flag}")
+
+    print(f'\n{regressions} regression(s) over {args.threshold:g}%')
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Run the benchmark and save the results as JSON')
+    run_parser.add_argument('--iterations', type=int, default=200, help='Timed requests per scenario and repeat')
+    run_parser.add_argument('--warmup', type=int, default=20)
+    run_parser.add_argument('--repeat', type=int, default=3)
+    run_parser.add_argument('--products', type=int, default=50, help='Products in the catalog')
+    run_parser.add_argument('--burst-threads', type=int, default=8, help='Concurrent webhook senders')
+    run_parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    run_parser.add_argument('--output', help='Result file (default: benchmarks/<commit>.json)')
+
+    compare_parser = subparsers.add_parser('compare', help='Compare two result files')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=10.0, help='Allowed change in percent')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == '__main__':
+    main()
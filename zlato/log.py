@@ -0,0 +1,144 @@
+"""
+Non-blocking logging.
+
+Loggers hand their records to NonBlockingHandler, which only puts them on
+a queue. A QueueListener thread formats them (JSON by default) and writes
+them to stdout, so slow log I/O never lands on the request path. When the
+queue is full records are dropped and counted instead of blocking the
+caller. shutdown() drains the queue; it runs at exit and from gunicorn's
+worker_exit hook.
+
+SamplingFilter keeps only a fraction of the DEBUG and INFO records of noisy
+loggers (LOG_SAMPLE_RATES). It runs before the record is queued or its
+message is formatted, so dropped records cost almost nothing.
+"""
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else was passed with extra={...}
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+_handlers = []
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any ``extra`` fields."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a fraction of the records below WARNING from the loggers in
+    ``rates`` (logger name -> fraction, matching child loggers too).
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self._resolved = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1 or random.random() < rate
+
+    def rate_for(self, name):
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate, parent = 1.0, name
+            while parent:
+                if parent in self.rates:
+                    rate = self.rates[parent]
+                    break
+                parent = parent.rpartition('.')[0]
+            self._resolved[name] = rate
+        return rate
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room so records queued before shutdown are still written
+        self.queue.put(self._sentinel)
+
+
+class NonBlockingHandler(QueueHandler):
+    """
+    Queue records for a background thread that writes them to ``stream``.
+    The formatter configured for this handler is used by that thread.
+    """
+
+    def __init__(self, stream=None, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.target = logging.StreamHandler(stream or sys.stdout)
+        self.dropped = 0
+        self.listener = _Listener(self.queue, self.target)
+        self.listener.start()
+        if not _handlers:
+            atexit.register(shutdown)
+        _handlers.append(self)
+
+    def setFormatter(self, fmt):
+        # Formatting happens on the listener thread, not in the caller
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Resolve the message now, since its arguments may change after the
+        # call, but leave formatting and exception rendering to the listener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        if self in _handlers:
+            _handlers.remove(self)
+            self.listener.stop()
+            if self.dropped:
+                sys.stderr.write(f'{self.dropped} log records dropped, the log queue was full\n')
+            self.target.flush()
+        super().close()
+
+
+def shutdown():
+    """Write out all queued records and stop the listener threads."""
+    for handler in list(_handlers):
+        handler.close()
+
+
+def parse_sample_rates(value):
+    """'orders.lifecycle=0.1,django.server=0.5' -> {'orders.lifecycle': 0.1, ...}"""
+    rates = {}
+    for item in value.split(','):
+        name, _, rate = item.partition('=')
+        if name.strip() and rate.strip():
+            rates[name.strip()] = float(rate)
+    return rates
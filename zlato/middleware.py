@@ -0,0 +1,132 @@
+from contextlib import ExitStack
+import json
+import logging
+import random
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, connections
+from . import perf, routers
+
+perf_logger = logging.getLogger('zlato.perf')
+
+# Cookie that keeps a browser on the primary database right after it wrote
+REPLICA_PIN_COOKIE = 'db_primary'
+
+# What a PERF_BUDGETS entry may limit
+BUDGET_MEASURES = ('queries', 'db_ms', 'total_ms')
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Decide per request whether reads may go to the read replica.
+    Must run before SessionMiddleware so session writes pin the browser too.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response, state = self.respond(request, self.can_use_replica(request))
+        if state.replica_failed and not state.wrote:
+            # Nothing was written, so the request can be answered again from the primary
+            response, state = self.respond(request, use_replica=False)
+
+        if state.wrote:
+            response.set_cookie(
+                REPLICA_PIN_COOKIE,
+                '1',
+                max_age=settings.DATABASE_REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    def respond(self, request, use_replica):
+        state = routers.RoutingState(use_replica=use_replica)
+        token = routers.activate(state)
+        request.db_routing = state
+        try:
+            return self.get_response(request), state
+        finally:
+            routers.deactivate(token)
+
+    def can_use_replica(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        if REPLICA_PIN_COOKIE in request.COOKIES or '/admin/' in request.path_info:
+            return False
+        return routers.replica_available()
+
+    def process_exception(self, request, exception):
+        # A failing replica is taken out of rotation for the next requests
+        state = getattr(request, 'db_routing', None)
+        if state and state.replica_used and isinstance(exception, DatabaseError):
+            routers.mark_replica_down(exception)
+            state.replica_failed = True
+
+
+class ServerTimingMiddleware:
+    """
+    Measure each request (see zlato.perf) and report it in a Server-Timing
+    header, a sampled log line and warnings for views over their budget.
+    Installed first in MIDDLEWARE when PERF_INSTRUMENTATION is enabled.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        perf.instrument_cache(type(caches['default']))
+        for view_name, budget in settings.PERF_BUDGETS.items():
+            unknown = set(budget) - set(BUDGET_MEASURES)
+            if unknown:
+                raise ImproperlyConfigured(
+                    f'PERF_BUDGETS[{view_name!r}] has unknown measures {sorted(unknown)}; '
+                    f'use {", ".join(BUDGET_MEASURES)}'
+                )
+
+    def __call__(self, request):
+        metrics = perf.RequestMetrics()
+        token = perf.activate(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            perf.deactivate(token)
+
+        response['Server-Timing'] = metrics.server_timing()
+
+        view_name = request.resolver_match.view_name if request.resolver_match else ''
+        violations = self.budget_violations(view_name, metrics)
+        if violations or random.random() < settings.PERF_LOG_SAMPLE_RATE:
+            line = json.dumps({
+                'event': 'request_timing',
+                'method': request.method,
+                'path': request.path,
+                'view': view_name,
+                'status': response.status_code,
+                **metrics.as_dict(),
+                'budget_violations': violations,
+            })
+            if violations:
+                perf_logger.warning(line)
+            else:
+                perf_logger.info(line)
+        return response
+
+    def budget_violations(self, view_name, metrics):
+        budget = settings.PERF_BUDGETS.get(view_name)
+        if not budget:
+            return []
+        measured = {
+            'queries': metrics.queries,
+            'db_ms': metrics.db_ms,
+            'total_ms': metrics.total_ms,
+        }
+        return [
+            f'{name} {measured[name]:g} > {limit}'
+            for name, limit in budget.items()
+            if measured[name] > limit
+        ]
@@ -0,0 +1,167 @@
+"""
+Per-request performance instrumentation.
+
+Enabled with PERF_INSTRUMENTATION=True, which installs ServerTimingMiddleware
+and the TimedDjangoTemplates backend. While a request is being handled its
+RequestMetrics collects:
+
+- database query count and time (connection.execute_wrapper, all aliases);
+- template render time (top-level templates only, includes are inside them);
+- cache hits and misses on the default cache backend;
+- time spent in external calls wrapped with ``external('stripe')`` etc.
+
+When instrumentation is disabled none of this is installed. ``external()``
+and the cache counters also feed the Prometheus metrics in
+monitoring.metrics, which are process-wide rather than per request and
+record nothing unless METRICS_ENABLED is on.
+"""
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.template.backends.django import DjangoTemplates
+from monitoring import metrics as prometheus_metrics
+
+_current = ContextVar('request_metrics', default=None)
+_MISSING = object()
+
+
+class RequestMetrics:
+    """Timings collected while handling one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_ms = 0.0
+        self.template_ms = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.external_ms = defaultdict(float)
+        self.external_calls = defaultdict(int)
+
+    @property
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def __call__(self, execute, sql, params, many, context):
+        # Used as a connection.execute_wrapper
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_ms += (time.perf_counter() - started) * 1000
+
+    def server_timing(self):
+        """Value for the Server-Timing response header."""
+        entries = [
+            f'db;dur={self.db_ms:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_ms:.1f}',
+            f'cache;desc="{self.cache_hits} hits {self.cache_misses} misses"',
+        ]
+        for name, duration in self.external_ms.items():
+            entries.append(f'{name};dur={duration:.1f}')
+        entries.append(f'total;dur={self.total_ms:.1f}')
+        return ', '.join(entries)
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'db_ms': round(self.db_ms, 2),
+            'template_ms': round(self.template_ms, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'external_ms': {name: round(value, 2) for name, value in self.external_ms.items()},
+            'total_ms': round(self.total_ms, 2),
+        }
+
+
+def current():
+    """RequestMetrics of the request being handled, or None."""
+    return _current.get()
+
+
+def activate(metrics):
+    return _current.set(metrics)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+@contextmanager
+def external(name):
+    """
+    Time a call to an external service, e.g. ``with external('stripe'):``.
+    """
+    metrics = _current.get()
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        prometheus_metrics.EXTERNAL_FAILURES.labels(name).inc()
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        prometheus_metrics.EXTERNAL_SECONDS.labels(name).observe(duration)
+        if metrics is not None:
+            metrics.external_ms[name] += duration * 1000
+            metrics.external_calls[name] += 1
+
+
+class TimedTemplate:
+    """Wraps a backend template to add its render time to the request metrics."""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return self.template.render(context, request)
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            metrics.template_ms += (time.perf_counter() - started) * 1000
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend whose templates report their render time."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+def instrument_cache(backend_class):
+    """
+    Count hits and misses of ``backend_class.get`` for the current request
+    and, with METRICS_ENABLED, in the process-wide metrics. Safe to call
+    more than once.
+    """
+    if getattr(backend_class.get, 'instrumented', False):
+        return
+    original_get = backend_class.get
+
+    def get(self, key, default=None, version=None):
+        metrics = _current.get()
+        value = original_get(self, key, _MISSING, version)
+        if value is _MISSING:
+            prometheus_metrics.CACHE_REQUESTS.labels('miss').inc()
+            if metrics is not None:
+                metrics.cache_misses += 1
+            return default
+        prometheus_metrics.CACHE_REQUESTS.labels('hit').inc()
+        if metrics is not None:
+            metrics.cache_hits += 1
+        return value
+
+    get.instrumented = True
+    backend_class.get = get
@@ -0,0 +1,101 @@
+"""
+Database routing between the primary and an optional read replica.
+
+Enabled when DATABASE_REPLICA_URL is set. ReplicaRoutingMiddleware decides
+per request whether reads may use the replica:
+
+- only GET/HEAD storefront requests (not the admin) read from the replica,
+  and only for models in DATABASE_REPLICA_APPS;
+- any request that writes sets a short-lived cookie that pins the browser
+  to the primary for DATABASE_REPLICA_PIN_SECONDS, so a visitor always sees
+  their own cart, session and order right after changing them;
+- if the replica cannot be reached it is skipped for
+  DATABASE_REPLICA_RETRY_SECONDS and every query goes to the primary; a
+  read-only request whose replica query fails is answered again from the
+  primary.
+
+Writes, migrations and anything outside a request always use ``default``.
+
+To try it locally with two SQLite files, migrate, copy db.sqlite3 to
+replica.sqlite3 and run with DATABASE_REPLICA_URL=sqlite:///replica.sqlite3.
+"""
+import logging
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = 'default'
+REPLICA = 'replica'
+
+_routing = ContextVar('db_routing', default=None)
+_replica_down_until = 0.0
+
+
+class RoutingState:
+    """Per-request routing decision, filled in by the router as queries run."""
+
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.replica_used = False
+        self.replica_failed = False
+        self.wrote = False
+
+
+def activate(state):
+    return _routing.set(state)
+
+
+def deactivate(token):
+    _routing.reset(token)
+
+
+def replica_available():
+    """
+    True if the replica is configured and answered recently.
+    A failed connection takes it out of rotation for a while.
+    """
+    if not settings.DATABASE_REPLICA_URL or time.monotonic() < _replica_down_until:
+        return False
+    try:
+        connections[REPLICA].ensure_connection()
+    except DatabaseError as e:
+        mark_replica_down(e)
+        return False
+    return True
+
+
+def mark_replica_down(error):
+    global _replica_down_until
+    _replica_down_until = time.monotonic() + settings.DATABASE_REPLICA_RETRY_SECONDS
+    logger.warning('Read replica unavailable, using primary: %s', error)
+
+
+class PrimaryReplicaRouter:
+    """
+    Send storefront reads to the replica when the current request allows it.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state and state.use_replica and model._meta.app_label in settings.DATABASE_REPLICA_APPS:
+            state.replica_used = True
+            return REPLICA
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both databases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary and is never migrated directly
+        return db == PRIMARY
@@ -12,8 +12,10 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
 import dj_database_url
+from zlato.log import parse_sample_rates
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -50,6 +52,8 @@ INSTALLED_APPS = [
     'cart',
     'orders',
     'shipping',
+    'monitoring',
+    'analytics',
 ]
 
 MIDDLEWARE = [
@@ -89,13 +93,107 @@ WSGI_APPLICATION = 'zlato.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+DATABASE_CONN_MAX_AGE = int(os.getenv('DATABASE_CONN_MAX_AGE', '600'))
+
 DATABASES = {
     'default': dj_database_url.config(
         default='sqlite:///' + str(BASE_DIR / 'db.sqlite3'),
-        conn_max_age=600,
+        conn_max_age=DATABASE_CONN_MAX_AGE,
     )
 }
 
+# Optional read replica for storefront reads (see zlato/routers.py)
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL', '')
+# Orders always read the primary: the success, tracking and status pages are
+# opened after a Stripe redirect, when the pin cookie has usually expired
+DATABASE_REPLICA_APPS = ['products', 'shipping', 'cart']
+DATABASE_REPLICA_PIN_SECONDS = int(os.getenv('DATABASE_REPLICA_PIN_SECONDS', '10'))
+DATABASE_REPLICA_RETRY_SECONDS = int(os.getenv('DATABASE_REPLICA_RETRY_SECONDS', '30'))
+
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = dj_database_url.parse(DATABASE_REPLICA_URL, conn_max_age=DATABASE_CONN_MAX_AGE)
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_ROUTERS = ['zlato.routers.PrimaryReplicaRouter']
+    # Before SessionMiddleware, so session writes also pin the browser to the primary
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('django.contrib.sessions.middleware.SessionMiddleware'),
+        'zlato.middleware.ReplicaRoutingMiddleware',
+    )
+
+# PostgreSQL connection handling
+# Set DATABASE_POOL=True to use psycopg 3's connection pool instead of one
+# persistent connection per worker. Each gunicorn worker process has its own
+# pool, so the server sees up to workers x DATABASE_POOL_MAX_SIZE backends.
+DATABASE_POOL = os.getenv('DATABASE_POOL', 'False') == 'True'
+DATABASE_POOL_MIN_SIZE = int(os.getenv('DATABASE_POOL_MIN_SIZE', '2'))
+DATABASE_POOL_MAX_SIZE = int(os.getenv('DATABASE_POOL_MAX_SIZE', '10'))
+DATABASE_POOL_TIMEOUT = float(os.getenv('DATABASE_POOL_TIMEOUT', '10'))
+DATABASE_POOL_MAX_IDLE = float(os.getenv('DATABASE_POOL_MAX_IDLE', '300'))
+DATABASE_CONNECT_TIMEOUT = int(os.getenv('DATABASE_CONNECT_TIMEOUT', '5'))
+DATABASE_CONN_HEALTH_CHECKS = os.getenv('DATABASE_CONN_HEALTH_CHECKS', 'True') == 'True'
+
+for database in DATABASES.values():
+    if database['ENGINE'] != 'django.db.backends.postgresql':
+        continue
+    database['CONN_HEALTH_CHECKS'] = DATABASE_CONN_HEALTH_CHECKS
+    database.setdefault('OPTIONS', {})['connect_timeout'] = DATABASE_CONNECT_TIMEOUT
+    if DATABASE_POOL:
+        # Django requires persistent connections to be off when pooling
+        database['CONN_MAX_AGE'] = 0
+        database['OPTIONS']['pool'] = {
+            'min_size': DATABASE_POOL_MIN_SIZE,
+            'max_size': DATABASE_POOL_MAX_SIZE,
+            'timeout': DATABASE_POOL_TIMEOUT,
+            'max_idle': DATABASE_POOL_MAX_IDLE,
+        }
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Per-process memory cache by default; set REDIS_URL (requires the `redis`
+# package) to share cached data, such as order status updates, between workers.
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
+# SQLite connection tuning for single-node deploys
+# WAL lets readers run alongside the single writer, busy_timeout makes
+# writers wait for the lock instead of failing with "database is locked",
+# and BEGIN IMMEDIATE takes the write lock up front so transactions that
+# read before writing cannot deadlock. Set SQLITE_TUNED=False to disable.
+SQLITE_TUNED = os.getenv('SQLITE_TUNED', 'True') == 'True'
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', '5'))  # seconds
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(128 * 1024 * 1024)))  # bytes
+SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', str(-32 * 1024)))  # pages, or KiB if negative
+
+for database in DATABASES.values():
+    if database['ENGINE'] != 'django.db.backends.sqlite3' or not SQLITE_TUNED:
+        continue
+    database.setdefault('OPTIONS', {}).update({
+        # sqlite3's timeout sets the connection's busy_timeout
+        'timeout': SQLITE_BUSY_TIMEOUT,
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': (
+            'PRAGMA journal_mode=WAL;'
+            'PRAGMA synchronous=NORMAL;'
+            f'PRAGMA mmap_size={SQLITE_MMAP_SIZE};'
+            f'PRAGMA cache_size={SQLITE_CACHE_SIZE};'
+            'PRAGMA temp_store=MEMORY;'
+        ),
+    })
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -162,6 +260,15 @@ STRIPE_PUBLIC_KEY = os.getenv('STRIPE_PUBLIC_KEY', '')
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY', '')
 STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET', '')
 
+# Pending orders older than this are cancelled by `manage.py expire_pending_orders`.
+# Stripe Checkout sessions expire after 24 hours by default.
+PENDING_ORDER_TTL_HOURS = float(os.getenv('PENDING_ORDER_TTL_HOURS', '25'))
+
+# Order status updates on the success and tracking pages.
+# Long-poll by default; set ORDER_STATUS_SSE=True when serving zlato.asgi.
+ORDER_STATUS_SSE = os.getenv('ORDER_STATUS_SSE', 'False') == 'True'
+ORDER_STATUS_WAIT_SECONDS = int(os.getenv('ORDER_STATUS_WAIT_SECONDS', '20'))
+
 # Email Configuration
 if DEBUG:
     # In development, print emails to console
@@ -177,3 +284,97 @@ else:
 
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'noreply@zlato.bg')
 ADMIN_EMAIL = os.getenv('ADMIN_EMAIL', 'orders@zlato.bg')
+
+# Logging (see zlato/log.py)
+# Records are queued and written to stdout by a background thread.
+# LOG_FORMAT is 'json' (one object per line) or 'text' for local development.
+# LOG_SAMPLE_RATES keeps a share of the DEBUG/INFO records of noisy loggers,
+# e.g. 'orders.lifecycle=0.1'; warnings and errors are always kept.
+# `manage.py test` only shows warnings unless LOG_LEVEL is set.
+TESTING = sys.argv[1:2] == ['test']
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'WARNING' if TESTING else 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+LOG_SAMPLE_RATES = parse_sample_rates(os.getenv('LOG_SAMPLE_RATES', ''))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'zlato.log.JsonFormatter'},
+        'text': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'},
+    },
+    'filters': {
+        'sampling': {'()': 'zlato.log.SamplingFilter', 'rates': LOG_SAMPLE_RATES},
+    },
+    'handlers': {
+        'queue': {
+            'class': 'zlato.log.NonBlockingHandler',
+            'maxsize': LOG_QUEUE_SIZE,
+            'formatter': LOG_FORMAT,
+            'filters': ['sampling'],
+        },
+    },
+    'root': {'handlers': ['queue'], 'level': LOG_LEVEL},
+    'loggers': {
+        # Replaces Django's own console and mail_admins handlers
+        'django': {'handlers': ['queue'], 'level': LOG_LEVEL, 'propagate': False},
+    },
+}
+
+# Per-request performance instrumentation (see zlato/perf.py)
+# Adds a Server-Timing header, logs a sample of requests to the `zlato.perf`
+# logger and warns when a view goes over its budget. Nothing is installed
+# while PERF_INSTRUMENTATION is off.
+PERF_INSTRUMENTATION = os.getenv('PERF_INSTRUMENTATION', 'False') == 'True'
+PERF_LOG_SAMPLE_RATE = float(os.getenv('PERF_LOG_SAMPLE_RATE', '0.01'))
+
+# Budgets per URL name: 'queries', 'db_ms' and 'total_ms' limits
+PERF_BUDGETS = {
+    'homepage': {'queries': 2},
+    'products:shop': {'queries': 2},
+    'products:search': {'queries': 2},
+    'products:suggest': {'queries': 1},
+    'products:detail': {'queries': 4},
+    'cart:view': {'queries': 4},
+    'orders:checkout': {'queries': 5},
+    'orders:status': {'queries': 1},
+}
+
+if PERF_INSTRUMENTATION:
+    MIDDLEWARE.insert(0, 'zlato.middleware.ServerTimingMiddleware')
+    TEMPLATES[0]['BACKEND'] = 'zlato.perf.TimedDjangoTemplates'
+
+# On-demand request profiler (see monitoring/profiling.py)
+# Staff trigger it per request; PROFILER_SAMPLE_RATE also profiles a random share.
+PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', 'False') == 'True'
+PROFILER_MODE = os.getenv('PROFILER_MODE', 'cprofile')  # or 'sampling'
+PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', '0'))
+PROFILER_DIR = os.getenv('PROFILER_DIR', str(BASE_DIR / 'profiles'))
+PROFILER_MAX_FILES = int(os.getenv('PROFILER_MAX_FILES', '200'))
+PROFILER_TOKEN_MAX_AGE = int(os.getenv('PROFILER_TOKEN_MAX_AGE', str(60 * 60)))
+
+# Slow query log (see monitoring/slow_queries.py, `manage.py slow_queries`)
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', 'False') == 'True'
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', '100'))
+SLOW_QUERY_EXPLAIN_MS = float(os.getenv('SLOW_QUERY_EXPLAIN_MS', '250'))
+
+if SLOW_QUERY_LOG:
+    MIDDLEWARE.append('monitoring.slow_queries.SlowQueryViewMiddleware')
+
+# The profiler goes last, closest to the view
+if PROFILER_ENABLED:
+    MIDDLEWARE.append('monitoring.profiling.ProfilerMiddleware')
+
+# Prometheus metrics at /metrics (see monitoring/metrics.py and gunicorn.conf.py)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'False') == 'True'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Cohort artifacts built by `manage.py build_cohorts` (see analytics/cohorts.py)
+ANALYTICS_ARTIFACT_DIR = os.getenv('ANALYTICS_ARTIFACT_DIR', str(BASE_DIR / 'artifacts'))
+
+# Reorder alerts from the demand forecasts (see analytics/forecasting.py, `manage.py forecast_demand`)
+# Products whose stock lasts fewer than REORDER_LEAD_DAYS days are flagged; the
+# suggested quantity lasts REORDER_TARGET_DAYS days.
+REORDER_LEAD_DAYS = int(os.getenv('REORDER_LEAD_DAYS', '14'))
+REORDER_TARGET_DAYS = int(os.getenv('REORDER_TARGET_DAYS', '45'))
@@ -0,0 +1,115 @@
+"""
+Query budget assertions for the storefront view tests.
+
+A view passes when it runs the same number of queries whatever the size of
+the data it shows (cart lines, order items, products). An N+1 shows up as a
+count that grows with the size; the failure message is a diff of the
+normalized SQL of the smallest and the failing run.
+"""
+import difflib
+import itertools
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from cart.models import Cart, CartItem
+from monitoring.slow_queries import normalize_sql
+from orders.models import Order, OrderItem
+from products.models import Product
+from products.search import update_document
+
+# Data sizes the view tests run at
+CART_SIZES = (1, 10, 100)
+CATALOG_SIZES = (10, 1000)
+
+_sequence = itertools.count()
+
+
+class QueryBudgetMixin:
+    """TestCase mixin with assertConstantQueries and assertEveryUrlTested."""
+
+    def assertConstantQueries(self, scenario, sizes):
+        """
+        Run ``scenario(size)`` for each size and compare the queries of the
+        request it returns. ``scenario`` creates the data for that size and
+        returns a callable making the request; only that call is measured.
+        Data of each size is rolled back before the next one.
+        Returns the responses, one per size.
+        """
+        runs = []
+        for size in sizes:
+            with transaction.atomic():
+                request = scenario(size)
+                with CaptureQueriesContext(connection) as context:
+                    response = request()
+                transaction.set_rollback(True)
+            runs.append((size, [normalize_sql(query['sql']) for query in context.captured_queries], response))
+
+        base_size, base_queries, _ = runs[0]
+        for size, queries, _ in runs[1:]:
+            if len(queries) != len(base_queries):
+                diff = '\n'.join(difflib.unified_diff(
+                    base_queries, queries, f'size {base_size}', f'size {size}', lineterm='',
+                ))
+                self.fail(
+                    f'{len(base_queries)} queries at size {base_size} but {len(queries)} '
+                    f'at size {size}:\n{diff}'
+                )
+        return [response for _, _, response in runs]
+
+    def assertEveryUrlTested(self, urlpatterns):
+        """Each named URL needs a ``test_<name>`` method on this test case."""
+        missing = [
+            pattern.name for pattern in urlpatterns
+            if pattern.name and not hasattr(self, f'test_{pattern.name}')
+        ]
+        self.assertEqual(missing, [], 'URLs without a query budget test')
+
+
+def create_products(count, **fields):
+    """Bulk-create ``count`` active products in stock."""
+    products = []
+    for _ in range(count):
+        number = next(_sequence)
+        product = Product(
+            name=f'Test product {number}',
+            slug=f'test-product-{number}',
+            description='Test product',
+            price=Decimal('12.50'),
+            inventory=1000,
+            **fields,
+        )
+        update_document(product)
+        products.append(product)
+    return Product.objects.bulk_create(products)
+
+
+def create_cart(client, lines):
+    """Give the session of ``client`` a cart with ``lines`` different products."""
+    client.get(reverse('cart:view'))
+    cart = Cart.objects.get(session_key=client.session.session_key)
+    CartItem.objects.bulk_create(
+        CartItem(cart=cart, product=product, quantity=2) for product in create_products(lines)
+    )
+    return cart
+
+
+def create_order(items, **fields):
+    """Pending order with ``items`` different products."""
+    order = Order.objects.create(**{
+        'customer_name': 'Test Customer',
+        'customer_email': 'customer@example.com',
+        'customer_phone': '0888000000',
+        'shipping_address': 'ul. Test 1',
+        'shipping_city': 'София',
+        'shipping_postal_code': '1000',
+        'subtotal': Decimal('25.00') * items,
+        'total': Decimal('25.00') * items,
+        **fields,
+    })
+    OrderItem.objects.bulk_create(
+        OrderItem(order=order, product=product, product_name=product.name, product_price=product.price, quantity=2)
+        for product in create_products(items)
+    )
+    return order
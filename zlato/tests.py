@@ -0,0 +1,186 @@
+import json
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError, connections
+from django.test import Client, TestCase, modify_settings, override_settings
+from django.urls import reverse
+from orders.models import Order
+from products.models import Product
+from zlato.testing import create_order
+from . import log, perf, routers
+from .middleware import REPLICA_PIN_COOKIE, ServerTimingMiddleware
+
+
+@override_settings(
+    DATABASE_REPLICA_URL='sqlite:///replica.sqlite3', DATABASE_ROUTERS=['zlato.routers.PrimaryReplicaRouter'],
+)
+@modify_settings(MIDDLEWARE={'prepend': 'zlato.middleware.ReplicaRoutingMiddleware'})
+class ReplicaRoutingTests(TestCase):
+    """
+    The test database as the primary and a copy of it in a second SQLite
+    file as the replica. The copy's product names differ, so each page
+    shows which database it read.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # Copied before TestCase opens its transactions, which would block the backup
+        cls.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(cls.directory.name, 'replica.sqlite3')
+        connections[routers.PRIMARY].ensure_connection()
+        replica = sqlite3.connect(path)
+        connections[routers.PRIMARY].connection.backup(replica)
+        with replica:
+            replica.execute("UPDATE products_product SET name = 'Replica ' || name")
+        replica.close()
+        connections.settings[routers.REPLICA] = {**connections.settings[routers.PRIMARY], 'NAME': path}
+        # Set here rather than on the class: the runner checks (and would
+        # create) the test databases of every class before the replica exists
+        cls.databases = {routers.PRIMARY, routers.REPLICA}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[routers.REPLICA].close()
+        del connections[routers.REPLICA]
+        del connections.settings[routers.REPLICA]
+        cls.directory.cleanup()
+
+    def setUp(self):
+        routers._replica_down_until = 0.0
+        self.addCleanup(setattr, routers, '_replica_down_until', 0.0)
+        self.product = Product.objects.filter(is_active=True).first()
+
+    def shop(self):
+        return self.client.get(reverse('products:shop'))
+
+    def test_reads_use_the_replica(self):
+        response = self.shop()
+        self.assertContains(response, f'Replica {self.product.name}')
+        self.assertNotIn(REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_writes_go_to_the_primary_and_pin_the_browser(self):
+        response = self.client.post(
+            reverse('cart:add', args=[self.product.pk]), HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(REPLICA_PIN_COOKIE, response.cookies)
+        with connections[routers.REPLICA].cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM cart_cartitem')
+            self.assertEqual(cursor.fetchone(), (0,))
+
+        # The test client sends the pin cookie back: the primary is read
+        response = self.shop()
+        self.assertContains(response, self.product.name)
+        self.assertNotContains(response, f'Replica {self.product.name}')
+
+    def test_orders_read_the_primary(self):
+        order = create_order(1)
+        Order.objects.filter(pk=order.pk).update(status='paid')
+        response = self.client.get(reverse('orders:status', args=[order.access_token]))
+        self.assertEqual(response.json()['status'], 'paid')
+
+    def test_failing_replica_falls_back_to_the_primary(self):
+        with connections[routers.REPLICA].cursor() as cursor:
+            cursor.execute('ALTER TABLE products_product RENAME TO products_product_gone')
+
+        # The failed attempt is still reported like any other exception
+        client = Client(raise_request_exception=False)
+        with self.assertLogs('zlato.routers', 'WARNING'), self.assertLogs('django.request', 'ERROR'):
+            response = client.get(reverse('products:shop'))
+        # The request that hit the error is answered again from the primary
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self.product.name)
+        self.assertNotContains(response, 'Replica ')
+        self.assertFalse(routers.replica_available())
+
+    def test_unreachable_replica_is_skipped(self):
+        error = OperationalError('unable to open database file')
+        with mock.patch.object(connections[routers.REPLICA], 'ensure_connection', side_effect=error), \
+                self.assertLogs('zlato.routers', 'WARNING'):
+            response = self.shop()
+        self.assertContains(response, self.product.name)
+        self.assertNotContains(response, 'Replica ')
+
+
+@modify_settings(MIDDLEWARE={'prepend': 'zlato.middleware.ServerTimingMiddleware'})
+@override_settings(PERF_LOG_SAMPLE_RATE=0)
+class ServerTimingTests(TestCase):
+    def shop(self):
+        return self.client.get(reverse('products:shop'))
+
+    def test_header(self):
+        with self.assertNoLogs('zlato.perf'):
+            response = self.shop()
+        entries = dict(entry.split(';', 1) for entry in response['Server-Timing'].split(', '))
+        self.assertEqual(list(entries), ['db', 'tpl', 'cache', 'total'])
+        self.assertRegex(entries['db'], r'^dur=[0-9.]+;desc="[1-9][0-9]* queries"$')
+
+    @override_settings(PERF_BUDGETS={'products:shop': {'queries': 0, 'total_ms': 60000}})
+    def test_requests_over_budget_are_logged(self):
+        with self.assertLogs('zlato.perf', 'WARNING') as logs:
+            self.shop()
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line['view'], line['status']), ('products:shop', 200))
+        self.assertEqual(line['budget_violations'], [f"queries {line['queries']} > 0"])
+
+    @override_settings(PERF_BUDGETS={'products:shop': {'querys': 0}})
+    def test_unknown_budget_measures_are_rejected_at_startup(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, "unknown measures ['querys']"):
+            ServerTimingMiddleware(lambda request: None)
+
+    @override_settings(PERF_LOG_SAMPLE_RATE=1)
+    def test_sampled_requests_are_logged(self):
+        with self.assertLogs('zlato.perf', 'INFO') as logs:
+            self.shop()
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+        self.assertEqual(json.loads(logs.records[0].getMessage())['budget_violations'], [])
+
+    def test_external_calls(self):
+        metrics = perf.RequestMetrics()
+        token = perf.activate(metrics)
+        try:
+            with perf.external('stripe'):
+                pass
+            with self.assertRaises(ValueError), perf.external('stripe'):
+                raise ValueError
+        finally:
+            perf.deactivate(token)
+        self.assertEqual(metrics.external_calls, {'stripe': 2})
+        self.assertIn('stripe;dur=', metrics.server_timing())
+
+
+class LoggingTests(TestCase):
+    def record(self, name='orders.lifecycle', level=logging.INFO, **fields):
+        return logging.makeLogRecord({'name': name, 'levelno': level, 'levelname': logging.getLevelName(level),
+                                      'msg': 'Order %s paid', 'args': ('ZL1',), **fields})
+
+    def test_sampling(self):
+        sampling = log.SamplingFilter({'orders': 0, 'orders.lifecycle.emails': 1})
+        self.assertFalse(sampling.filter(self.record()))
+        self.assertTrue(sampling.filter(self.record(level=logging.WARNING)))
+        self.assertTrue(sampling.filter(self.record('orders.lifecycle.emails')))
+        self.assertTrue(sampling.filter(self.record('products.stock')))
+        self.assertTrue(log.SamplingFilter().filter(self.record()))
+        self.assertEqual(log.parse_sample_rates('orders=0.1, django.server=0.5,'),
+                         {'orders': 0.1, 'django.server': 0.5})
+
+    def test_json_lines(self):
+        try:
+            raise ValueError('card declined')
+        except ValueError:
+            record = self.record(level=logging.ERROR, order_id=7, exc_info=sys.exc_info())
+        line = json.loads(log.JsonFormatter().format(record))
+        self.assertEqual(
+            {key: line[key] for key in ('level', 'logger', 'message', 'order_id')},
+            {'level': 'ERROR', 'logger': 'orders.lifecycle', 'message': 'Order ZL1 paid', 'order_id': 7},
+        )
+        self.assertIn('ValueError: card declined', line['exception'])
+        self.assertRegex(line['time'], r'^\d{4}-\d\d-\d\dT.*\+00:00$')
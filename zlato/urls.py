@@ -21,14 +21,18 @@ from django.conf.urls.static import static
 from django.conf.urls.i18n import i18n_patterns
 from products import views
 from orders.views import stripe_webhook
+from monitoring.views import metrics
 
 urlpatterns = [
     path('i18n/', include('django.conf.urls.i18n')),
     # Stripe webhook must be outside i18n_patterns for consistent URL
     path('webhook/stripe/', stripe_webhook, name='stripe_webhook'),
+    path('metrics', metrics, name='metrics'),
 ]
 
 urlpatterns += i18n_patterns(
+    path('admin/monitoring/', include('monitoring.urls')),
+    path('admin/analytics/', include('analytics.urls')),
     path('admin/', admin.site.urls),
     path('', views.homepage, name='homepage'),
     path('', include('products.urls')),